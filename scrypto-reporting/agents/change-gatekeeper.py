@@ -7,17 +7,25 @@ impact analysis, and medical safety before implementation
 """
 
 import os
+import sys
 import json
 import sqlite3
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from pathlib import Path
-import openai
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "embeddings"))
+
+from openai_client import get_shared_client
 
 class ScryptoChangeGatekeeper:
-    def __init__(self, db_path: str = "scrypto-intelligence.db"):
+    # Statuses still waiting on a human decision
+    PENDING_STATUSES = ('submitted', 'ai_reviewed')
+    
+    def __init__(self, db_path: str = "scrypto-intelligence.db", openai_client=None):
         self.db_path = db_path
-        self.openai_client = openai.OpenAI()
+        # Shared wrapper: rate limits, retries and circuit breaker for every OpenAI call
+        self.openai_client = openai_client or get_shared_client()
         
         # Change approval criteria
         self.approval_criteria = {
@@ -268,28 +276,35 @@ class ScryptoChangeGatekeeper:
         
         return success
     
-    def get_pending_changes(self) -> List[Dict[str, Any]]:
-        """Get all pending change requests"""
+    def get_pending_page(self, limit: int = 50, after: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """One page of pending change requests, riskiest first and newest first within a risk level
+        
+        Keyset pagination over idx_changes_queue: every pending status is read as its own index
+        range starting just after the previous page's last key and the ranges are merged, so a page
+        costs the same however long the queue or the request history grows. Pass the returned
+        next_after back in to get the following page; it is None on the last page.
+        """
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT id, requested_by, request_type, description, risk_level, status, created_at
-            FROM change_requests 
-            WHERE status IN ('submitted', 'ai_reviewed')
-            ORDER BY 
-                CASE risk_level 
-                    WHEN 'critical' THEN 1
-                    WHEN 'high' THEN 2  
-                    WHEN 'medium' THEN 3
-                    WHEN 'low' THEN 4
-                END,
-                created_at DESC
-        """)
-        
-        results = []
-        for row in cursor.fetchall():
-            results.append({
+        rows = []
+        for status in self.PENDING_STATUSES:
+            rows.extend(self._queue_range(cursor, status, limit + 1, after))
+        
+        conn.close()
+        
+        # Newest first (created_at, then id), then a stable sort puts the riskiest ranks on top
+        rows.sort(key=lambda row: (row[6], row[0]), reverse=True)
+        rows.sort(key=lambda row: row[7])
+        
+        page = rows[:limit]
+        next_after = None
+        if len(rows) > limit:
+            last = page[-1]
+            next_after = [last[7], last[6], last[0]]
+        
+        return {
+            'changes': [{
                 'id': row[0],
                 'requested_by': row[1],
                 'request_type': row[2],
@@ -297,10 +312,51 @@ class ScryptoChangeGatekeeper:
                 'risk_level': row[4],
                 'status': row[5],
                 'created_at': row[6]
-            })
-        
-        conn.close()
-        return results
+            } for row in page],
+            'next_after': next_after
+        }
+    
+    def _queue_range(self, cursor: sqlite3.Cursor, status: str, limit: int,
+                     after: Optional[List[Any]]) -> List[tuple]:
+        """Up to limit rows of one status in queue order, strictly after the (rank, created_at, id) key"""
+        columns = "id, requested_by, request_type, description, risk_level, status, created_at, risk_rank"
+        rows = []
+        
+        # Two plain index ranges: the rest of the previous key's risk rank, then the lower-risk ranks
+        if after is not None:
+            risk_rank, created_at, request_id = after
+            cursor.execute(f"""
+                SELECT {columns} FROM change_requests
+                WHERE status = ? AND risk_rank = ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (status, risk_rank, created_at, request_id, limit))
+            rows = cursor.fetchall()
+        else:
+            risk_rank = 0
+        
+        if len(rows) < limit:
+            cursor.execute(f"""
+                SELECT {columns} FROM change_requests
+                WHERE status = ? AND risk_rank > ?
+                ORDER BY risk_rank, created_at DESC, id DESC
+                LIMIT ?
+            """, (status, risk_rank, limit - len(rows)))
+            rows.extend(cursor.fetchall())
+        
+        return rows
+    
+    def get_pending_changes(self) -> List[Dict[str, Any]]:
+        """Get all pending change requests"""
+        changes = []
+        after = None
+        
+        while True:
+            page = self.get_pending_page(limit=500, after=after)
+            changes.extend(page['changes'])
+            after = page['next_after']
+            if after is None:
+                return changes
 
 def main():
     """Demo the change gatekeeper system"""
@@ -7,17 +7,210 @@ Provides contextual assistance for developers, stakeholders, and clients
 """
 
 import os
+import sys
+import re
 import json
+import zlib
+import time
 import sqlite3
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 from datetime import datetime
-import openai
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "embeddings"))
+
+from openai_client import get_shared_client, estimate_tokens
+
+class SessionMemory:
+    """Conversation state for one chat session
+    
+    Recent turns are kept verbatim; older turns are folded into a rolling summary that
+    is trimmed to a token cap, so the prompt stays bounded however long the chat runs.
+    Retrieval results are cached per session so follow-up questions reuse them.
+    """
+    
+    STOPWORDS = {
+        'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'any', 'can', 'how', 'what',
+        'when', 'where', 'which', 'who', 'why', 'does', 'did', 'this', 'that', 'these', 'those',
+        'with', 'from', 'into', 'about', 'there', 'their', 'them', 'they', 'its', 'was', 'were',
+        'will', 'would', 'should', 'could', 'have', 'has', 'had', 'more', 'tell', 'explain',
+        'please', 'also', 'then', 'than', 'our', 'your', 'it'
+    }
+    
+    def __init__(self, session_id: str, user_level: str,
+                 max_recent_turns: int = 4, summary_token_cap: int = 400, max_cached_retrievals: int = 8):
+        self.session_id = session_id
+        self.user_level = user_level
+        self.max_recent_turns = max_recent_turns
+        self.summary_token_cap = summary_token_cap
+        self.max_cached_retrievals = max_cached_retrievals
+        
+        self.recent_turns = deque()
+        self.summary_lines: List[str] = []
+        self.retrieval_cache: 'OrderedDict[frozenset, List[Dict[str, Any]]]' = OrderedDict()
+        self.turn_count = 0
+        self.retrievals_reused = 0
+        self.last_active = time.monotonic()
+    
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.summary_lines)
+    
+    def touch(self):
+        self.last_active = time.monotonic()
+    
+    def add_turn(self, question: str, response: str):
+        """Record a completed turn, compressing the oldest verbatim turn when over budget"""
+        self.recent_turns.append((question, response))
+        self.turn_count += 1
+        
+        while len(self.recent_turns) > self.max_recent_turns:
+            self._summarize_turn(*self.recent_turns.popleft())
+    
+    def _summarize_turn(self, question: str, response: str):
+        """Fold a turn into the rolling summary, dropping the oldest lines past the cap"""
+        self.summary_lines.append(f"- Q: {self._first_sentence(question, 120)} A: {self._first_sentence(response, 200)}")
+        
+        while len(self.summary_lines) > 1 and estimate_tokens(self.summary) > self.summary_token_cap:
+            self.summary_lines.pop(0)
+    
+    def _first_sentence(self, text: str, max_chars: int) -> str:
+        text = " ".join(text.split())
+        match = re.match(r"(.+?[.!?])(\s|$)", text)
+        sentence = match.group(1) if match else text
+        return sentence if len(sentence) <= max_chars else sentence[:max_chars - 3] + "..."
+    
+    def query_terms(self, query: str) -> frozenset:
+        """Significant lower-cased terms used as the retrieval cache key"""
+        words = re.findall(r"[a-z0-9_]+", query.lower())
+        return frozenset(word for word in words if len(word) > 2 and word not in self.STOPWORDS)
+    
+    def cached_context(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """Context already retrieved in this session that covers the query, if any"""
+        if not self.retrieval_cache:
+            return None
+        
+        terms = self.query_terms(query)
+        
+        if terms in self.retrieval_cache:
+            key = terms
+        elif not terms:
+            # "Why?", "tell me more" - a follow-up on the latest retrieval
+            key = next(reversed(self.retrieval_cache))
+        else:
+            # Only a retrieval whose own terms cover the query; one spanning two earlier
+            # topics would get just one topic's documents, so it is retrieved afresh
+            key = next((cached for cached in reversed(self.retrieval_cache) if terms <= cached), None)
+            if key is None:
+                return None
+        
+        self.retrieval_cache.move_to_end(key)
+        self.retrievals_reused += 1
+        return self.retrieval_cache[key]
+    
+    def remember_context(self, query: str, context_docs: List[Dict[str, Any]]):
+        if not context_docs:
+            # Nothing found is not worth reusing; the topic may be indexed by the next turn
+            return
+        
+        key = self.query_terms(query)
+        self.retrieval_cache[key] = context_docs
+        self.retrieval_cache.move_to_end(key)
+        
+        while len(self.retrieval_cache) > self.max_cached_retrievals:
+            self.retrieval_cache.popitem(last=False)
+    
+    def history_messages(self) -> List[Dict[str, str]]:
+        """Summary plus verbatim recent turns as chat messages"""
+        messages = []
+        if self.summary_lines:
+            messages.append({"role": "system", "content": f"Earlier in this conversation:\n{self.summary}"})
+        for question, response in self.recent_turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": response})
+        return messages
+
+class SessionStore:
+    """LRU of live sessions with idle expiry, rehydrated from ai_interactions on a miss
+    
+    Sessions are keyed by (session_id, user_level): a client reusing another level's
+    session id gets a separate conversation, never the other level's history or context.
+    """
+    
+    def __init__(self, db_path: str, max_sessions: int = 256, idle_ttl_seconds: int = 1800,
+                 hydrate_turns: int = 50):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.hydrate_turns = hydrate_turns
+        self.sessions: 'OrderedDict[Tuple[str, str], SessionMemory]' = OrderedDict()
+    
+    def get(self, session_id: str, user_level: str) -> SessionMemory:
+        self.expire_idle()
+        
+        key = (session_id, user_level)
+        session = self.sessions.get(key)
+        if session is None:
+            session = self.hydrate(session_id, user_level)
+            self.sessions[key] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        
+        self.sessions.move_to_end(key)
+        session.touch()
+        return session
+    
+    def expire_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        # Least recently used sessions sit at the front
+        while self.sessions:
+            key, session = next(iter(self.sessions.items()))
+            if session.last_active >= cutoff:
+                break
+            del self.sessions[key]
+    
+    def hydrate(self, session_id: str, user_level: str) -> SessionMemory:
+        """Rebuild a session's memory from the interactions it logged at this user level"""
+        session = SessionMemory(session_id, user_level)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT question, response FROM ai_interactions
+            WHERE session_id = ? AND user_level = ?
+            ORDER BY id DESC
+            LIMIT ?
+        """, (session_id, user_level, self.hydrate_turns))
+        turns = cursor.fetchall()
+        
+        # Older turns may have been compacted into the archive (tools/compact-interactions.py)
+        if len(turns) < self.hydrate_turns:
+            cursor.execute("""
+                SELECT payload FROM ai_interactions_archive
+                WHERE session_id = ?
+                ORDER BY day DESC
+            """, (session_id,))
+            for (payload,) in cursor:
+                archived = json.loads(zlib.decompress(payload))
+                turns.extend((item['question'], item['response']) for item in reversed(archived)
+                             if item['user_level'] == user_level)
+                if len(turns) >= self.hydrate_turns:
+                    break
+        
+        for question, response in reversed(turns[:self.hydrate_turns]):
+            session.add_turn(question, response)
+        
+        conn.close()
+        return session
 
 class ScryptoAssistant:
-    def __init__(self, db_path: str = "scrypto-intelligence.db"):
+    def __init__(self, db_path: str = "scrypto-intelligence.db", openai_client=None):
         self.db_path = db_path
-        self.openai_client = openai.OpenAI()
+        # Shared wrapper: rate limits, retries and circuit breaker for every OpenAI call
+        self.openai_client = openai_client or get_shared_client()
+        self.sessions = SessionStore(db_path)
         
         # User access levels and their capabilities
         self.access_levels = {
@@ -74,49 +267,88 @@ class ScryptoAssistant:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # Counts come from the trigger-maintained rollup, not a join per request
         cursor.execute("""
-            SELECT f.*, 
-                   COUNT(c.id) as component_count,
-                   COUNT(a.id) as api_count,
-                   COUNT(t.id) as test_count
+            SELECT f.domain, f.group_name, f.item, f.spec_status, f.implementation_status,
+                   COALESCE(r.component_count, 0),
+                   COALESCE(r.api_count, 0),
+                   COALESCE(r.test_count, 0)
             FROM project_features f
-            LEFT JOIN code_components c ON f.id = c.feature_id
-            LEFT JOIN api_endpoints a ON f.id = a.feature_id  
-            LEFT JOIN test_coverage t ON f.id = t.feature_id
+            LEFT JOIN feature_status_rollup r ON r.feature_id = f.id
             WHERE f.domain LIKE ? OR f.group_name LIKE ? OR f.item LIKE ?
-            GROUP BY f.id
         """, (f'%{feature_query}%', f'%{feature_query}%', f'%{feature_query}%'))
         
         results = []
         for row in cursor.fetchall():
             results.append({
-                'domain': row[1],
-                'group': row[2], 
-                'item': row[3],
-                'status': row[4],
-                'implementation_status': row[5],
-                'component_count': row[-3],
-                'api_count': row[-2],
-                'test_count': row[-1]
+                'domain': row[0],
+                'group': row[1], 
+                'item': row[2],
+                'status': row[3],
+                'implementation_status': row[4],
+                'component_count': row[5],
+                'api_count': row[6],
+                'test_count': row[7]
             })
         
         conn.close()
         return {'features': results, 'total_found': len(results)}
     
+    def get_progress_overview(self) -> List[Dict[str, Any]]:
+        """Per-domain completion from the materialized rollup (constant-time read)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT domain, total_features, completed, tested, production_ready, completion_percentage
+            FROM implementation_progress_rollup
+            ORDER BY domain
+        """)
+        
+        results = []
+        for row in cursor.fetchall():
+            results.append({
+                'domain': row[0],
+                'total_features': row[1],
+                'completed': row[2],
+                'tested': row[3],
+                'production_ready': row[4],
+                'completion_percentage': row[5]
+            })
+        
+        conn.close()
+        return results
+    
     def generate_response(self, query: str, user_level: str, session_id: str) -> str:
         """Generate AI response based on user level and relevant context"""
         
         # Get user capabilities
         user_config = self.access_levels.get(user_level, self.access_levels['client'])
         
-        # Get relevant context
-        context_docs = self.get_relevant_context(query, user_level)
+        session = self.sessions.get(session_id, user_level)
+        
+        # Reuse context already retrieved in this session before searching again
+        context_docs = session.cached_context(query)
+        if context_docs is None:
+            context_docs = self.get_relevant_context(query, user_level)
+            session.remember_context(query, context_docs)
         
         # Build context string
         context_parts = []
         for doc in context_docs:
             context_parts.append(f"**{doc['title']}** ({doc['spec_type']}):\n{doc['content']}")
         
+        # Status-focused users always get the current progress figures
+        if 'progress_tracking' in user_config['capabilities'] or 'feature_status' in user_config['capabilities']:
+            progress_lines = [
+                f"- {row['domain']}: {row['completion_percentage']}% complete "
+                f"({row['completed']} completed, {row['tested']} tested, {row['production_ready']} in production "
+                f"of {row['total_features']} features)"
+                for row in self.get_progress_overview()
+            ]
+            if progress_lines:
+                context_parts.insert(0, "**Implementation progress**:\n" + "\n".join(progress_lines))
+        
         context_text = "\n\n".join(context_parts)
         
         # Truncate context based on user level
@@ -140,11 +372,10 @@ class ScryptoAssistant:
             Focus on feature capabilities, user benefits, and timeline updates.
             Use simple language and avoid technical jargon."""
         
-        # Create messages for OpenAI
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {query}"}
-        ]
+        # Create messages for OpenAI: summary and recent turns carry the conversation
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(session.history_messages())
+        messages.append({"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {query}"})
         
         try:
             response = self.openai_client.chat.completions.create(
@@ -155,6 +386,7 @@ class ScryptoAssistant:
             )
             
             ai_response = response.choices[0].message.content
+            session.add_turn(query, ai_response)
             
             # Log interaction
             self.log_interaction(session_id, user_level, query, ai_response, context_docs)
@@ -239,6 +471,7 @@ def main():
     # Test different user levels
     test_queries = [
         ("How do I implement a new medical history feature?", "developer"),
+        ("Which of those files need tests?", "developer"),
         ("What's the current status of the pharmacy portal?", "stakeholder"), 
         ("When will the prescription scanning feature be ready?", "client")
     ]
@@ -1,8 +1,12 @@
 -- Scrypto Project Intelligence Database Schema
 -- Purpose: Structured storage of all project knowledge for AI system
 
+-- Lets tools/compact-interactions.py hand freed pages back to the OS without a full VACUUM
+-- (only takes effect on a new database; existing ones are converted by that tool's first run)
+PRAGMA auto_vacuum = INCREMENTAL;
+
 -- Core project features and implementation status
-CREATE TABLE project_features (
+CREATE TABLE IF NOT EXISTS project_features (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   domain TEXT NOT NULL, -- patient, pharmacy, admin
   group_name TEXT NOT NULL, -- medhist, persinfo, prescriptions, etc.
@@ -21,6 +25,9 @@ CREATE TABLE project_features (
   has_hooks BOOLEAN DEFAULT FALSE,
   has_tests BOOLEAN DEFAULT FALSE,
   
+  -- Created by code_scanner from a route; seeded features are never deleted by a scan
+  discovered_by_scanner BOOLEAN DEFAULT FALSE,
+  
   -- Metadata
   created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
   updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -30,7 +37,7 @@ CREATE TABLE project_features (
 );
 
 -- Specifications and documentation storage
-CREATE TABLE specifications (
+CREATE TABLE IF NOT EXISTS specifications (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   feature_id INTEGER REFERENCES project_features(id),
   
@@ -48,7 +55,7 @@ CREATE TABLE specifications (
 );
 
 -- Code components and file tracking
-CREATE TABLE code_components (
+CREATE TABLE IF NOT EXISTS code_components (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   feature_id INTEGER REFERENCES project_features(id),
   
@@ -61,7 +68,7 @@ CREATE TABLE code_components (
   lines_of_code INTEGER,
   
   -- Status tracking
-  exists BOOLEAN DEFAULT FALSE,
+  "exists" BOOLEAN DEFAULT FALSE,
   compiles BOOLEAN DEFAULT FALSE,
   tested BOOLEAN DEFAULT FALSE,
   
@@ -74,7 +81,7 @@ CREATE TABLE code_components (
 );
 
 -- API endpoint verification
-CREATE TABLE api_endpoints (
+CREATE TABLE IF NOT EXISTS api_endpoints (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   feature_id INTEGER REFERENCES project_features(id),
   
@@ -102,7 +109,7 @@ CREATE TABLE api_endpoints (
 );
 
 -- Test coverage and results
-CREATE TABLE test_coverage (
+CREATE TABLE IF NOT EXISTS test_coverage (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   feature_id INTEGER REFERENCES project_features(id),
   
@@ -121,8 +128,20 @@ CREATE TABLE test_coverage (
   updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Static scan bookkeeping so unchanged files are not re-parsed
+CREATE TABLE IF NOT EXISTS scanned_files (
+  file_path TEXT PRIMARY KEY, -- Relative to the project root
+  kind TEXT NOT NULL CHECK (kind IN ('source', 'test')),
+  
+  mtime REAL,
+  file_size INTEGER,
+  content_hash TEXT, -- sha256 of the content last parsed
+  
+  scanned_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Vector embeddings for semantic search
-CREATE TABLE document_embeddings (
+CREATE TABLE IF NOT EXISTS document_embeddings (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   
   -- Source document
@@ -133,16 +152,107 @@ CREATE TABLE document_embeddings (
   -- Embedding data (JSON array of floats)
   embedding_vector TEXT NOT NULL, -- JSON array
   embedding_model TEXT DEFAULT 'text-embedding-3-small',
+  embedding_provider TEXT DEFAULT 'openai', -- openai, local
+  embedding_dim INTEGER,
   
   -- Metadata for retrieval
   tags TEXT, -- JSON array of tags
   metadata TEXT, -- JSON object with additional context
   
+  -- Facet columns promoted out of metadata (JSON1 generated, indexed below)
+  file_path TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.file_path')) VIRTUAL,
+  relative_path TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.relative_path')) VIRTUAL,
+  component_type TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.component_type')) VIRTUAL,
+  spec_type TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.spec_type')) VIRTUAL,
+  directory TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.directory')) VIRTUAL,
+  chunk_index INTEGER GENERATED ALWAYS AS (json_extract(metadata, '$.chunk_index')) VIRTUAL,
+  
+  -- MinHash signature (uint32 array) for near-duplicate detection at ingest
+  minhash BLOB,
+  
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Further locations of chunks that were deduplicated onto an existing embedding
+CREATE TABLE IF NOT EXISTS chunk_sources (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  embedding_id INTEGER NOT NULL REFERENCES document_embeddings(id),
+  
+  source_type TEXT NOT NULL,
+  similarity REAL, -- Estimated Jaccard similarity with the embedded chunk
+  tags TEXT, -- JSON array of tags
+  metadata TEXT, -- JSON object, same shape as document_embeddings.metadata
+  
+  file_path TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.file_path')) VIRTUAL,
+  relative_path TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.relative_path')) VIRTUAL,
+  component_type TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.component_type')) VIRTUAL,
+  spec_type TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.spec_type')) VIRTUAL,
+  directory TEXT GENERATED ALWAYS AS (json_extract(metadata, '$.directory')) VIRTUAL,
+  chunk_index INTEGER GENERATED ALWAYS AS (json_extract(metadata, '$.chunk_index')) VIRTUAL,
+  
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Fitted state for embedding providers that learn from the corpus (local TF-IDF/SVD)
+CREATE TABLE IF NOT EXISTS embedding_models (
+  model_id TEXT PRIMARY KEY, -- Matches document_embeddings.embedding_model
+  provider TEXT NOT NULL,
+  dimension INTEGER NOT NULL,
+  state BLOB, -- Serialized provider state
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Change marker for the exported vector matrices (embeddings/sharded_index.py), bumped by
+-- triggers on every vector write so readers check one row instead of counting the table
+CREATE TABLE IF NOT EXISTS embedding_generation (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  epoch TEXT NOT NULL, -- Random per database file, so a recreated file never matches an old export
+  generation INTEGER NOT NULL DEFAULT 0
+);
+
+-- Full-text index over chunk text and paths (external content: the text is not stored twice)
+CREATE VIRTUAL TABLE IF NOT EXISTS document_fts USING fts5(
+  content_chunk,
+  relative_path,
+  content='document_embeddings',
+  content_rowid='id',
+  tokenize='porter unicode61'
+);
+
+-- Files as they were last indexed, so watch mode's catch-up compares exact mtimes and
+-- content hashes rather than second-precision chunk timestamps
+CREATE TABLE IF NOT EXISTS indexed_files (
+  file_path TEXT NOT NULL,
+  embedding_model TEXT NOT NULL,
+  
+  mtime_ns INTEGER NOT NULL,
+  file_size INTEGER NOT NULL,
+  content_hash TEXT NOT NULL, -- sha256 of the content last indexed
+  
+  indexed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  
+  PRIMARY KEY (file_path, embedding_model)
+);
+
+-- Watch-mode refreshes (setup-vector-db.py watch): how far the index trailed the files on disk
+CREATE TABLE IF NOT EXISTS index_refresh_log (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  
+  files_changed INTEGER NOT NULL,
+  files_removed INTEGER NOT NULL,
+  chunks_embedded INTEGER NOT NULL,
+  failures INTEGER NOT NULL DEFAULT 0,
+  
+  -- Lag: file modification (or detected deletion) to the refresh commit
+  reindex_ms REAL NOT NULL,
+  lag_ms_max REAL,
+  lag_ms_avg REAL,
+  
   created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
 -- AI chat history and context
-CREATE TABLE ai_interactions (
+CREATE TABLE IF NOT EXISTS ai_interactions (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   
   session_id TEXT NOT NULL,
@@ -161,8 +271,42 @@ CREATE TABLE ai_interactions (
   created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Per-day usage of interactions compacted out of ai_interactions
+CREATE TABLE IF NOT EXISTS ai_interaction_daily (
+  day DATE NOT NULL,
+  user_level TEXT NOT NULL,
+  model_used TEXT NOT NULL DEFAULT '',
+  
+  interactions INTEGER NOT NULL DEFAULT 0,
+  sessions INTEGER NOT NULL DEFAULT 0,
+  tokens_used INTEGER NOT NULL DEFAULT 0,
+  
+  -- Sum and count rather than an average so later compactions of the same day add up
+  response_time_ms_total INTEGER NOT NULL DEFAULT 0,
+  response_time_count INTEGER NOT NULL DEFAULT 0,
+  response_time_ms_max INTEGER,
+  question_chars INTEGER NOT NULL DEFAULT 0,
+  response_chars INTEGER NOT NULL DEFAULT 0,
+  
+  PRIMARY KEY (day, user_level, model_used)
+);
+
+-- Full text of compacted interactions: one zlib-compressed JSON array per session and day
+CREATE TABLE IF NOT EXISTS ai_interactions_archive (
+  day DATE NOT NULL,
+  session_id TEXT NOT NULL,
+  
+  interaction_count INTEGER NOT NULL,
+  first_interaction_id INTEGER NOT NULL,
+  last_interaction_id INTEGER NOT NULL,
+  raw_bytes INTEGER NOT NULL,
+  payload BLOB NOT NULL,
+  
+  PRIMARY KEY (day, session_id)
+);
+
 -- Change tracking and impact analysis
-CREATE TABLE change_requests (
+CREATE TABLE IF NOT EXISTS change_requests (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   
   -- Request details
@@ -174,6 +318,7 @@ CREATE TABLE change_requests (
   impact_analysis TEXT, -- AI-generated impact assessment
   affected_features TEXT, -- JSON array of feature IDs
   risk_level TEXT CHECK (risk_level IN ('low', 'medium', 'high', 'critical')),
+  risk_rank INTEGER, -- 1 critical .. 4 low, 5 unrated; kept in step with risk_level by triggers
   
   -- Status
   status TEXT DEFAULT 'submitted' CHECK (status IN (
@@ -189,7 +334,7 @@ CREATE TABLE change_requests (
 );
 
 -- Project metrics and KPIs
-CREATE TABLE project_metrics (
+CREATE TABLE IF NOT EXISTS project_metrics (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   
   metric_date DATE NOT NULL,
@@ -220,30 +365,55 @@ CREATE TABLE project_metrics (
 );
 
 -- Indexes for performance
-CREATE INDEX idx_features_domain_group ON project_features(domain, group_name);
-CREATE INDEX idx_features_status ON project_features(implementation_status);
-CREATE INDEX idx_specifications_feature ON specifications(feature_id);
-CREATE INDEX idx_components_feature ON code_components(feature_id);
-CREATE INDEX idx_endpoints_feature ON api_endpoints(feature_id);
-CREATE INDEX idx_embeddings_source ON document_embeddings(source_type, source_id);
-CREATE INDEX idx_interactions_session ON ai_interactions(session_id);
-CREATE INDEX idx_changes_status ON change_requests(status);
-
--- Views for common queries
+CREATE INDEX IF NOT EXISTS idx_features_domain_group ON project_features(domain, group_name);
+CREATE INDEX IF NOT EXISTS idx_features_status ON project_features(implementation_status);
+CREATE INDEX IF NOT EXISTS idx_specifications_feature ON specifications(feature_id);
+CREATE INDEX IF NOT EXISTS idx_components_feature ON code_components(feature_id);
+CREATE INDEX IF NOT EXISTS idx_endpoints_feature ON api_endpoints(feature_id);
+CREATE INDEX IF NOT EXISTS idx_components_file ON code_components(file_path);
+CREATE INDEX IF NOT EXISTS idx_tests_feature ON test_coverage(feature_id);
+CREATE INDEX IF NOT EXISTS idx_tests_file ON test_coverage(test_file);
+CREATE INDEX IF NOT EXISTS idx_embeddings_source ON document_embeddings(source_type, source_id);
+CREATE INDEX IF NOT EXISTS idx_embeddings_model ON document_embeddings(embedding_model, embedding_dim);
+CREATE INDEX IF NOT EXISTS idx_embeddings_file ON document_embeddings(file_path, chunk_index);
+CREATE INDEX IF NOT EXISTS idx_embeddings_relative_path ON document_embeddings(relative_path);
+CREATE INDEX IF NOT EXISTS idx_embeddings_component_type ON document_embeddings(component_type);
+CREATE INDEX IF NOT EXISTS idx_embeddings_spec_type ON document_embeddings(spec_type);
+CREATE INDEX IF NOT EXISTS idx_embeddings_directory ON document_embeddings(directory);
+CREATE INDEX IF NOT EXISTS idx_chunk_sources_embedding ON chunk_sources(embedding_id);
+CREATE INDEX IF NOT EXISTS idx_chunk_sources_file ON chunk_sources(file_path, chunk_index);
+CREATE INDEX IF NOT EXISTS idx_chunk_sources_component_type ON chunk_sources(component_type);
+CREATE INDEX IF NOT EXISTS idx_chunk_sources_spec_type ON chunk_sources(spec_type);
+CREATE INDEX IF NOT EXISTS idx_chunk_sources_directory ON chunk_sources(directory);
+CREATE INDEX IF NOT EXISTS idx_interactions_session ON ai_interactions(session_id);
+CREATE INDEX IF NOT EXISTS idx_interactions_created ON ai_interactions(created_at);
+CREATE INDEX IF NOT EXISTS idx_interactions_archive_session ON ai_interactions_archive(session_id, day);
+
+-- One specifications row per file so re-indexing a spec updates it in place
+-- (drops the duplicates older builds left behind, keeping the newest)
+DELETE FROM specifications WHERE file_path IS NOT NULL AND id NOT IN (
+  SELECT MAX(id) FROM specifications WHERE file_path IS NOT NULL GROUP BY file_path
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_specifications_file_path ON specifications(file_path);
+
+-- Review queue order: one index range per status, riskiest first, newest first within a rank
+-- (supersedes idx_changes_status, which is a prefix of it)
+DROP INDEX IF EXISTS idx_changes_status;
+CREATE INDEX IF NOT EXISTS idx_changes_queue ON change_requests(status, risk_rank, created_at DESC, id DESC);
+
+-- Views for common queries (recreated so fixes reach existing databases)
+-- Counts use correlated subqueries; LEFT JOINing all four tables multiplies them
+DROP VIEW IF EXISTS v_feature_status;
 CREATE VIEW v_feature_status AS
 SELECT 
   f.*,
-  COUNT(s.id) as spec_count,
-  COUNT(c.id) as component_count,
-  COUNT(a.id) as api_count,
-  COUNT(t.id) as test_count
-FROM project_features f
-LEFT JOIN specifications s ON f.id = s.feature_id
-LEFT JOIN code_components c ON f.id = c.feature_id  
-LEFT JOIN api_endpoints a ON f.id = a.feature_id
-LEFT JOIN test_coverage t ON f.id = t.feature_id
-GROUP BY f.id;
+  (SELECT COUNT(*) FROM specifications s WHERE s.feature_id = f.id) as spec_count,
+  (SELECT COUNT(*) FROM code_components c WHERE c.feature_id = f.id) as component_count,
+  (SELECT COUNT(*) FROM api_endpoints a WHERE a.feature_id = f.id) as api_count,
+  (SELECT COUNT(*) FROM test_coverage t WHERE t.feature_id = f.id) as test_count
+FROM project_features f;
 
+DROP VIEW IF EXISTS v_implementation_progress;
 CREATE VIEW v_implementation_progress AS
 SELECT 
   domain,
@@ -256,4 +426,247 @@ SELECT
     2
   ) as completion_percentage
 FROM project_features
-GROUP BY domain;
\ No newline at end of file
+GROUP BY domain;
+
+-- Materialized rollups of the views above, kept current by the triggers below
+-- (tools/refresh-rollups.py checks them against the views and snapshots metrics)
+CREATE TABLE IF NOT EXISTS feature_status_rollup (
+  feature_id INTEGER PRIMARY KEY REFERENCES project_features(id),
+  
+  spec_count INTEGER NOT NULL DEFAULT 0,
+  component_count INTEGER NOT NULL DEFAULT 0,
+  api_count INTEGER NOT NULL DEFAULT 0,
+  test_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS implementation_progress_rollup (
+  domain TEXT PRIMARY KEY,
+  
+  total_features INTEGER NOT NULL DEFAULT 0,
+  completed INTEGER NOT NULL DEFAULT 0,
+  tested INTEGER NOT NULL DEFAULT 0,
+  production_ready INTEGER NOT NULL DEFAULT 0,
+  completion_percentage REAL NOT NULL DEFAULT 0
+);
+
+-- Backfill databases that predate the rollups; once populated the triggers keep them
+-- current, so later schema runs skip the full view scan
+INSERT OR IGNORE INTO feature_status_rollup (feature_id, spec_count, component_count, api_count, test_count)
+SELECT id, spec_count, component_count, api_count, test_count FROM v_feature_status
+WHERE NOT EXISTS (SELECT 1 FROM feature_status_rollup);
+
+INSERT OR IGNORE INTO implementation_progress_rollup
+  (domain, total_features, completed, tested, production_ready, completion_percentage)
+SELECT domain, total_features, completed, tested, production_ready, completion_percentage
+FROM v_implementation_progress
+WHERE NOT EXISTS (SELECT 1 FROM implementation_progress_rollup);
+
+-- Domain progress: apply a feature's contribution (+1/-1) to its domain row
+-- (NOT EXISTS rather than OR IGNORE: an outer upsert overrides a trigger's conflict policy)
+CREATE TRIGGER IF NOT EXISTS trg_features_rollup_insert
+AFTER INSERT ON project_features
+BEGIN
+  INSERT INTO feature_status_rollup (feature_id)
+  SELECT NEW.id WHERE NOT EXISTS (SELECT 1 FROM feature_status_rollup WHERE feature_id = NEW.id);
+  INSERT INTO implementation_progress_rollup (domain)
+  SELECT NEW.domain WHERE NOT EXISTS (SELECT 1 FROM implementation_progress_rollup WHERE domain = NEW.domain);
+  UPDATE implementation_progress_rollup SET
+    total_features = total_features + 1,
+    completed = completed + (NEW.implementation_status = 'completed'),
+    tested = tested + (NEW.implementation_status = 'tested'),
+    production_ready = production_ready + (NEW.implementation_status = 'production')
+  WHERE domain = NEW.domain;
+  UPDATE implementation_progress_rollup SET
+    completion_percentage = ROUND((completed + tested + production_ready) * 100.0 / total_features, 2)
+  WHERE domain = NEW.domain;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_features_rollup_delete
+AFTER DELETE ON project_features
+BEGIN
+  DELETE FROM feature_status_rollup WHERE feature_id = OLD.id;
+  UPDATE implementation_progress_rollup SET
+    total_features = total_features - 1,
+    completed = completed - (OLD.implementation_status = 'completed'),
+    tested = tested - (OLD.implementation_status = 'tested'),
+    production_ready = production_ready - (OLD.implementation_status = 'production')
+  WHERE domain = OLD.domain;
+  DELETE FROM implementation_progress_rollup WHERE domain = OLD.domain AND total_features <= 0;
+  UPDATE implementation_progress_rollup SET
+    completion_percentage = ROUND((completed + tested + production_ready) * 100.0 / total_features, 2)
+  WHERE domain = OLD.domain;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_features_rollup_update
+AFTER UPDATE OF domain, implementation_status ON project_features
+BEGIN
+  UPDATE implementation_progress_rollup SET
+    total_features = total_features - 1,
+    completed = completed - (OLD.implementation_status = 'completed'),
+    tested = tested - (OLD.implementation_status = 'tested'),
+    production_ready = production_ready - (OLD.implementation_status = 'production')
+  WHERE domain = OLD.domain;
+  INSERT INTO implementation_progress_rollup (domain)
+  SELECT NEW.domain WHERE NOT EXISTS (SELECT 1 FROM implementation_progress_rollup WHERE domain = NEW.domain);
+  UPDATE implementation_progress_rollup SET
+    total_features = total_features + 1,
+    completed = completed + (NEW.implementation_status = 'completed'),
+    tested = tested + (NEW.implementation_status = 'tested'),
+    production_ready = production_ready + (NEW.implementation_status = 'production')
+  WHERE domain = NEW.domain;
+  DELETE FROM implementation_progress_rollup WHERE domain = OLD.domain AND total_features <= 0;
+  UPDATE implementation_progress_rollup SET
+    completion_percentage = ROUND((completed + tested + production_ready) * 100.0 / total_features, 2)
+  WHERE domain IN (OLD.domain, NEW.domain);
+END;
+
+-- Per-feature counts: each child row adds one to its feature's rollup row
+CREATE TRIGGER IF NOT EXISTS trg_specs_rollup_insert
+AFTER INSERT ON specifications WHEN NEW.feature_id IS NOT NULL
+BEGIN
+  UPDATE feature_status_rollup SET spec_count = spec_count + 1 WHERE feature_id = NEW.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_specs_rollup_delete
+AFTER DELETE ON specifications WHEN OLD.feature_id IS NOT NULL
+BEGIN
+  UPDATE feature_status_rollup SET spec_count = spec_count - 1 WHERE feature_id = OLD.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_specs_rollup_update
+AFTER UPDATE OF feature_id ON specifications
+BEGIN
+  UPDATE feature_status_rollup SET spec_count = spec_count - 1 WHERE feature_id = OLD.feature_id;
+  UPDATE feature_status_rollup SET spec_count = spec_count + 1 WHERE feature_id = NEW.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_components_rollup_insert
+AFTER INSERT ON code_components WHEN NEW.feature_id IS NOT NULL
+BEGIN
+  UPDATE feature_status_rollup SET component_count = component_count + 1 WHERE feature_id = NEW.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_components_rollup_delete
+AFTER DELETE ON code_components WHEN OLD.feature_id IS NOT NULL
+BEGIN
+  UPDATE feature_status_rollup SET component_count = component_count - 1 WHERE feature_id = OLD.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_components_rollup_update
+AFTER UPDATE OF feature_id ON code_components
+BEGIN
+  UPDATE feature_status_rollup SET component_count = component_count - 1 WHERE feature_id = OLD.feature_id;
+  UPDATE feature_status_rollup SET component_count = component_count + 1 WHERE feature_id = NEW.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_endpoints_rollup_insert
+AFTER INSERT ON api_endpoints WHEN NEW.feature_id IS NOT NULL
+BEGIN
+  UPDATE feature_status_rollup SET api_count = api_count + 1 WHERE feature_id = NEW.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_endpoints_rollup_delete
+AFTER DELETE ON api_endpoints WHEN OLD.feature_id IS NOT NULL
+BEGIN
+  UPDATE feature_status_rollup SET api_count = api_count - 1 WHERE feature_id = OLD.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_endpoints_rollup_update
+AFTER UPDATE OF feature_id ON api_endpoints
+BEGIN
+  UPDATE feature_status_rollup SET api_count = api_count - 1 WHERE feature_id = OLD.feature_id;
+  UPDATE feature_status_rollup SET api_count = api_count + 1 WHERE feature_id = NEW.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tests_rollup_insert
+AFTER INSERT ON test_coverage WHEN NEW.feature_id IS NOT NULL
+BEGIN
+  UPDATE feature_status_rollup SET test_count = test_count + 1 WHERE feature_id = NEW.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tests_rollup_delete
+AFTER DELETE ON test_coverage WHEN OLD.feature_id IS NOT NULL
+BEGIN
+  UPDATE feature_status_rollup SET test_count = test_count - 1 WHERE feature_id = OLD.feature_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tests_rollup_update
+AFTER UPDATE OF feature_id ON test_coverage
+BEGIN
+  UPDATE feature_status_rollup SET test_count = test_count - 1 WHERE feature_id = OLD.feature_id;
+  UPDATE feature_status_rollup SET test_count = test_count + 1 WHERE feature_id = NEW.feature_id;
+END;
+
+-- Keep document_fts in step with document_embeddings
+CREATE TRIGGER IF NOT EXISTS trg_embeddings_fts_insert
+AFTER INSERT ON document_embeddings
+BEGIN
+  INSERT INTO document_fts (rowid, content_chunk, relative_path)
+  VALUES (NEW.id, NEW.content_chunk, NEW.relative_path);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_embeddings_fts_delete
+AFTER DELETE ON document_embeddings
+BEGIN
+  INSERT INTO document_fts (document_fts, rowid, content_chunk, relative_path)
+  VALUES ('delete', OLD.id, OLD.content_chunk, OLD.relative_path);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_embeddings_fts_update
+AFTER UPDATE OF content_chunk, metadata ON document_embeddings
+BEGIN
+  INSERT INTO document_fts (document_fts, rowid, content_chunk, relative_path)
+  VALUES ('delete', OLD.id, OLD.content_chunk, OLD.relative_path);
+  INSERT INTO document_fts (rowid, content_chunk, relative_path)
+  VALUES (NEW.id, NEW.content_chunk, NEW.relative_path);
+END;
+
+-- Bump the vector generation whenever the set of stored vectors changes
+INSERT OR IGNORE INTO embedding_generation (id, epoch) VALUES (1, lower(hex(randomblob(8))));
+
+CREATE TRIGGER IF NOT EXISTS trg_embeddings_generation_insert
+AFTER INSERT ON document_embeddings
+BEGIN
+  UPDATE embedding_generation SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_embeddings_generation_delete
+AFTER DELETE ON document_embeddings
+BEGIN
+  UPDATE embedding_generation SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_embeddings_generation_update
+AFTER UPDATE OF embedding_vector, embedding_model ON document_embeddings
+BEGIN
+  UPDATE embedding_generation SET generation = generation + 1 WHERE id = 1;
+END;
+
+-- Index chunks stored before the full-text table existed
+INSERT INTO document_fts (document_fts)
+SELECT 'rebuild'
+WHERE NOT EXISTS (SELECT 1 FROM document_fts_docsize)
+  AND EXISTS (SELECT 1 FROM document_embeddings);
+
+-- Keep change_requests.risk_rank in step with risk_level
+CREATE TRIGGER IF NOT EXISTS trg_changes_risk_rank_insert
+AFTER INSERT ON change_requests
+BEGIN
+  UPDATE change_requests SET risk_rank = CASE NEW.risk_level
+    WHEN 'critical' THEN 1 WHEN 'high' THEN 2 WHEN 'medium' THEN 3 WHEN 'low' THEN 4 ELSE 5
+  END WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_changes_risk_rank_update
+AFTER UPDATE OF risk_level ON change_requests
+BEGIN
+  UPDATE change_requests SET risk_rank = CASE NEW.risk_level
+    WHEN 'critical' THEN 1 WHEN 'high' THEN 2 WHEN 'medium' THEN 3 WHEN 'low' THEN 4 ELSE 5
+  END WHERE id = NEW.id;
+END;
+
+-- Rank change requests stored before risk_rank existed
+UPDATE change_requests SET risk_rank = CASE risk_level
+  WHEN 'critical' THEN 1 WHEN 'high' THEN 2 WHEN 'medium' THEN 3 WHEN 'low' THEN 4 ELSE 5
+END
+WHERE risk_rank IS NULL;
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+"""
+Scrypto Code Scanner
+Static, incremental scan of the app tree that fills code_components, api_endpoints,
+test_coverage and project_features, so implementation status is answered by SQL
+rather than by reading the codebase through an LLM
+"""
+
+import re
+import sqlite3
+import hashlib
+import argparse
+from typing import List, Dict, Optional, Set, Tuple
+from pathlib import Path
+from datetime import datetime
+
+class ScryptoCodeScanner:
+    # Source directories mapped onto features, in scan order (routes define the features)
+    SOURCE_DIRS = ['app', 'components', 'hooks', 'schemas']
+    TEST_DIRS = ['__tests__', 'tests']
+    
+    DOMAINS = ('patient', 'pharmacy', 'admin')
+    HTTP_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'PATCH')
+    
+    EXPORTED_HANDLER = re.compile(
+        r"^export\s+(?:async\s+)?(?:function\s+|const\s+)(GET|POST|PUT|DELETE|PATCH)\b", re.MULTILINE
+    )
+    EXPORTED_LIST = re.compile(r"^export\s*\{([^}]*)\}", re.MULTILINE)
+    TEST_CASE = re.compile(r"\b(?:it|test)(?:\.(?:only|skip))?\s*\(")
+    
+    def __init__(self, db_path: str, project_dir: str):
+        self.db_path = db_path
+        self.project_path = Path(project_dir)
+        self.feature_ids: Dict[Tuple[str, str, str], int] = {}
+        self.item_patterns: List[Tuple[re.Pattern, Tuple[str, str, str]]] = []
+    
+    def scan(self, full: bool = False) -> Dict[str, int]:
+        """Scan the tree, re-parsing only files whose size, mtime and content changed
+        
+        Unchanged files keep their feature links only while the feature set is unchanged:
+        when a route adds or drops a feature every stored file is matched again, so an
+        incremental scan links exactly what a full scan would.
+        """
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        stats = {'seen': 0, 'parsed': 0, 'unchanged': 0, 'removed': 0,
+                 'features_removed': 0, 'features_orphaned': 0, 'relinked': 0}
+        seen_files = set()
+        
+        self.load_features(cursor)
+        known_features = set(self.feature_ids)
+        route_features = self.route_feature_ids(cursor)
+        
+        for file_path, kind in self.iter_files():
+            relative_path = str(file_path.relative_to(self.project_path))
+            seen_files.add(relative_path)
+            stats['seen'] += 1
+            
+            stat = file_path.stat()
+            previous = cursor.execute("""
+                SELECT mtime, file_size, content_hash FROM scanned_files WHERE file_path = ?
+            """, (relative_path,)).fetchone()
+            
+            if not full and previous and previous[0] == stat.st_mtime and previous[1] == stat.st_size:
+                stats['unchanged'] += 1
+                continue
+            
+            try:
+                content = file_path.read_text(encoding='utf-8')
+            except Exception as e:
+                print(f"❌ Error reading {relative_path}: {e}")
+                continue
+            
+            content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            
+            if full or not previous or previous[2] != content_hash:
+                self.remove_file(cursor, relative_path)
+                self.parse_file(cursor, relative_path, kind, content, stat.st_size)
+                stats['parsed'] += 1
+            else:
+                stats['unchanged'] += 1  # Touched but not edited
+            
+            cursor.execute("""
+                INSERT OR REPLACE INTO scanned_files (file_path, kind, mtime, file_size, content_hash, scanned_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (relative_path, kind, stat.st_mtime, stat.st_size, content_hash))
+        
+        # Files that disappeared since the last scan
+        for (relative_path,) in cursor.execute("SELECT file_path FROM scanned_files").fetchall():
+            if relative_path not in seen_files:
+                self.remove_file(cursor, relative_path)
+                cursor.execute("DELETE FROM scanned_files WHERE file_path = ?", (relative_path,))
+                stats['removed'] += 1
+        
+        stats['features_removed'], stats['features_orphaned'] = self.remove_features(
+            cursor, route_features - self.route_feature_ids(cursor))
+        if stats['features_removed']:
+            self.load_features(cursor)
+        if set(self.feature_ids) != known_features:
+            stats['relinked'] = self.relink_files(cursor)
+        
+        self.update_feature_flags(cursor)
+        
+        conn.commit()
+        conn.close()
+        return stats
+    
+    def iter_files(self):
+        """Yield (path, kind) with routes and pages first so they define the features"""
+        def ordered(paths):
+            return sorted(paths, key=lambda path: (path.name not in ('route.ts', 'page.tsx'), str(path)))
+        
+        for dir_name in self.SOURCE_DIRS:
+            dir_path = self.project_path / dir_name
+            if dir_path.exists():
+                for file_path in ordered(dir_path.rglob("*.ts*")):
+                    if self.is_ignored(file_path):
+                        continue
+                    yield file_path, 'source'
+        
+        for dir_name in self.TEST_DIRS:
+            dir_path = self.project_path / dir_name
+            if dir_path.exists():
+                for file_path in sorted(dir_path.rglob("*")):
+                    if file_path.is_file() and re.search(r"\.(test|spec)\.[jt]sx?$", file_path.name) and not self.is_ignored(file_path):
+                        yield file_path, 'test'
+    
+    def is_ignored(self, file_path: Path) -> bool:
+        return 'node_modules' in file_path.parts or '.next' in file_path.parts
+    
+    def load_features(self, cursor: sqlite3.Cursor):
+        self.feature_ids = {}
+        self.item_patterns = []
+        for feature_id, domain, group_name, item in cursor.execute(
+            "SELECT id, domain, group_name, item FROM project_features"
+        ).fetchall():
+            self.register_feature(feature_id, (domain, group_name, item))
+    
+    def register_feature(self, feature_id: int, feature: Tuple[str, str, str]):
+        self.feature_ids[feature] = feature_id
+        
+        # Match the item in singular or plural form on word boundaries (allergy, allergies)
+        item = feature[2]
+        pattern = re.compile(rf"_(?:{re.escape(item)}|{re.escape(self.singular(item))})_")
+        self.item_patterns.append((pattern, feature))
+        # Longest items first so 'family_history' wins over 'history'
+        self.item_patterns.sort(key=lambda entry: len(entry[1][2]), reverse=True)
+    
+    def ensure_feature(self, cursor: sqlite3.Cursor, feature: Tuple[str, str, str]) -> int:
+        if feature not in self.feature_ids:
+            cursor.execute("""
+                INSERT OR IGNORE INTO project_features (domain, group_name, item, discovered_by_scanner)
+                VALUES (?, ?, ?, TRUE)
+            """, feature)
+            feature_id = cursor.execute("""
+                SELECT id FROM project_features WHERE domain = ? AND group_name = ? AND item = ?
+            """, feature).fetchone()[0]
+            self.register_feature(feature_id, feature)
+        return self.feature_ids[feature]
+    
+    def singular(self, item: str) -> str:
+        if item.endswith('ies'):
+            return item[:-3] + 'y'
+        if item.endswith('s') and not item.endswith('ss'):
+            return item[:-1]
+        return item
+    
+    def slug(self, text: str) -> str:
+        """camelCase / kebab-case / path text as snake_case words"""
+        text = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", text)
+        return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip('_')
+    
+    def route_feature(self, parts: Tuple[str, ...]) -> Optional[Tuple[str, str, str]]:
+        """(domain, group, item) from route segments such as patient/medhist/allergies/[id]"""
+        segments = [part for part in parts if not (part.startswith('(') and part.endswith(')'))]
+        if len(segments) < 3 or segments[0] not in self.DOMAINS:
+            return None
+        if any(segment.startswith('[') for segment in segments[1:3]):
+            return None
+        return segments[0], self.slug(segments[1]), self.slug(segments[2])
+    
+    def match_feature(self, relative_path: str) -> Optional[Tuple[str, str, str]]:
+        """Best known feature whose item name appears in a component/hook/schema path"""
+        slug = "_" + self.slug(relative_path) + "_"
+        domain = next((part for part in Path(relative_path).parts if part in self.DOMAINS), None)
+        
+        for pattern, feature in self.item_patterns:
+            if domain and feature[0] != domain:
+                continue
+            if pattern.search(slug):
+                return feature
+        return None
+    
+    def classify(self, file_path: Path, kind: str) -> str:
+        if kind == 'test':
+            return 'test'
+        if file_path.name == 'page.tsx':
+            return 'page'
+        if file_path.name == 'route.ts':
+            return 'api_route'
+        if 'schemas' in file_path.parts:
+            return 'schema'
+        if 'hooks' in file_path.parts:
+            return 'hook'
+        if 'layout' in file_path.name.lower():
+            return 'layout'
+        if file_path.name.startswith('config.'):
+            return 'config'
+        return 'component'
+    
+    def file_feature(self, relative_path: str, component_type: str) -> Optional[Tuple[str, str, str]]:
+        """Routes and pages define their feature; every other file matches a known one"""
+        parts = Path(relative_path).parts
+        if component_type == 'page' and parts[0] == 'app':
+            return self.route_feature(parts[1:-1])
+        if component_type == 'api_route' and parts[:2] == ('app', 'api'):
+            return self.route_feature(parts[2:-1])
+        return self.match_feature(relative_path)
+    
+    def parse_file(self, cursor: sqlite3.Cursor, relative_path: str, kind: str, content: str, file_size: int):
+        file_path = Path(relative_path)
+        component_type = self.classify(file_path, kind)
+        
+        feature = self.file_feature(relative_path, component_type)
+        feature_id = self.ensure_feature(cursor, feature) if feature else None
+        
+        cursor.execute("""
+            INSERT INTO code_components
+            (feature_id, component_type, file_path, file_size, lines_of_code, "exists", last_checked)
+            VALUES (?, ?, ?, ?, ?, TRUE, CURRENT_TIMESTAMP)
+        """, (feature_id, component_type, relative_path, file_size, content.count('\n') + 1))
+        
+        if component_type == 'api_route':
+            self.record_endpoints(cursor, relative_path, content, feature_id)
+        elif component_type == 'test':
+            self.record_tests(cursor, relative_path, content, feature_id)
+    
+    def api_path(self, relative_path: str) -> str:
+        """URL path served by an app/api/.../route.ts file"""
+        parts = [part for part in Path(relative_path).parts[1:-1] if not part.startswith('(')]
+        return "/" + "/".join(parts)
+    
+    def exported_methods(self, content: str) -> List[str]:
+        methods = set(self.EXPORTED_HANDLER.findall(content))
+        for names in self.EXPORTED_LIST.findall(content):
+            for name in names.split(','):
+                exported = name.split(' as ')[-1].strip()
+                if exported in self.HTTP_METHODS:
+                    methods.add(exported)
+        return sorted(methods)
+    
+    def record_endpoints(self, cursor: sqlite3.Cursor, relative_path: str, content: str, feature_id: Optional[int]):
+        path = self.api_path(relative_path)
+        has_auth = 'auth.getUser' in content or 'getUser(' in content
+        has_csrf = 'verifyCsrf' in content
+        has_validation = 'safeParse(' in content or '.parse(' in content
+        
+        for method in self.exported_methods(content):
+            cursor.execute("""
+                INSERT INTO api_endpoints
+                (feature_id, path, method, has_auth, has_csrf, has_validation, test_result, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 'not_tested', CURRENT_TIMESTAMP)
+                ON CONFLICT(path, method) DO UPDATE SET
+                    feature_id = excluded.feature_id,
+                    has_auth = excluded.has_auth,
+                    has_csrf = excluded.has_csrf,
+                    has_validation = excluded.has_validation,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (feature_id, path, method, has_auth, has_csrf, has_validation))
+    
+    def record_tests(self, cursor: sqlite3.Cursor, relative_path: str, content: str, feature_id: Optional[int]):
+        parts = Path(relative_path).parts
+        if 'e2e' in parts or relative_path.endswith('.spec.ts'):
+            test_type = 'e2e'
+        elif 'unit' in parts or 'schemas' in parts:
+            test_type = 'unit'
+        else:
+            test_type = 'integration'
+        
+        cursor.execute("""
+            INSERT INTO test_coverage (feature_id, test_type, test_file, total_tests)
+            VALUES (?, ?, ?, ?)
+        """, (feature_id, test_type, relative_path, len(self.TEST_CASE.findall(content))))
+    
+    def remove_file(self, cursor: sqlite3.Cursor, relative_path: str):
+        """Drop everything previously derived from a file"""
+        cursor.execute("DELETE FROM code_components WHERE file_path = ?", (relative_path,))
+        cursor.execute("DELETE FROM test_coverage WHERE test_file = ?", (relative_path,))
+        if Path(relative_path).name == 'route.ts':
+            cursor.execute("DELETE FROM api_endpoints WHERE path = ?", (self.api_path(relative_path),))
+    
+    def route_feature_ids(self, cursor: sqlite3.Cursor) -> Set[int]:
+        """Features currently backed by a scanned page or API route"""
+        return {row[0] for row in cursor.execute("""
+            SELECT DISTINCT feature_id FROM code_components
+            WHERE component_type IN ('page', 'api_route') AND feature_id IS NOT NULL
+        """)}
+    
+    def remove_features(self, cursor: sqlite3.Cursor, feature_ids: Set[int]) -> Tuple[int, int]:
+        """Handle features whose last page and route were removed; returns (removed, orphaned)
+        
+        Features the scanner discovered are deleted and their rows unlinked. Seeded features
+        carry a manual implementation_status, so they are kept as they are and only lose their
+        has_page/has_api flags; a route that was moved back links to them again.
+        """
+        removed = 0
+        for feature_id in feature_ids:
+            discovered = cursor.execute(
+                "SELECT discovered_by_scanner FROM project_features WHERE id = ?", (feature_id,)
+            ).fetchone()
+            if not discovered or not discovered[0]:
+                continue
+            
+            for table in ('specifications', 'code_components', 'api_endpoints', 'test_coverage'):
+                cursor.execute(f"UPDATE {table} SET feature_id = NULL WHERE feature_id = ?", (feature_id,))
+            cursor.execute("DELETE FROM project_features WHERE id = ?", (feature_id,))
+            removed += 1
+        return removed, len(feature_ids) - removed
+    
+    def relink_files(self, cursor: sqlite3.Cursor) -> int:
+        """Match every stored file against the current features; returns the rows changed"""
+        relinked = 0
+        for component_id, file_path, component_type, feature_id in cursor.execute(
+            "SELECT id, file_path, component_type, feature_id FROM code_components"
+        ).fetchall():
+            feature = self.file_feature(file_path, component_type)
+            new_feature_id = self.feature_ids.get(feature) if feature else None
+            if new_feature_id == feature_id:
+                continue
+            
+            cursor.execute("UPDATE code_components SET feature_id = ? WHERE id = ?", (new_feature_id, component_id))
+            if component_type == 'test':
+                cursor.execute("UPDATE test_coverage SET feature_id = ? WHERE test_file = ?", (new_feature_id, file_path))
+            relinked += 1
+        return relinked
+    
+    def update_feature_flags(self, cursor: sqlite3.Cursor):
+        """Refresh the has_* columns of project_features from the scanned rows"""
+        cursor.execute("""
+            UPDATE project_features SET
+              has_page = EXISTS (SELECT 1 FROM code_components c WHERE c.feature_id = project_features.id AND c.component_type = 'page'),
+              has_api = EXISTS (SELECT 1 FROM api_endpoints a WHERE a.feature_id = project_features.id),
+              has_schema = EXISTS (SELECT 1 FROM code_components c WHERE c.feature_id = project_features.id AND c.component_type = 'schema'),
+              has_hooks = EXISTS (SELECT 1 FROM code_components c WHERE c.feature_id = project_features.id AND c.component_type = 'hook'),
+              has_tests = EXISTS (SELECT 1 FROM test_coverage t WHERE t.feature_id = project_features.id)
+        """)
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan the Scrypto codebase into the project database")
+    parser.add_argument('--db', default="scrypto-intelligence.db", help="SQLite database path")
+    parser.add_argument('--project-dir', default=str(Path(__file__).parent.parent.parent))
+    parser.add_argument('--full', action='store_true', help="Re-parse every file")
+    args = parser.parse_args()
+    
+    # Make sure the schema exists without pulling in the embedding stack
+    conn = sqlite3.connect(args.db)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(project_features)")}
+    if columns and 'discovered_by_scanner' not in columns:
+        # Databases created before scanner-discovered features were flagged
+        conn.execute("ALTER TABLE project_features ADD COLUMN discovered_by_scanner BOOLEAN DEFAULT FALSE")
+    with open(Path(__file__).parent.parent / "database" / "schema.sql", 'r') as f:
+        conn.executescript(f.read())
+    conn.close()
+    
+    started = datetime.now()
+    stats = ScryptoCodeScanner(args.db, args.project_dir).scan(full=args.full)
+    elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+    
+    print(f"🔎 Scanned {stats['seen']} files in {elapsed_ms:.0f}ms: "
+          f"{stats['parsed']} parsed, {stats['unchanged']} unchanged, {stats['removed']} removed")
+    if stats['features_removed'] or stats['features_orphaned'] or stats['relinked']:
+        print(f"🔗 {stats['features_removed']} features without routes removed, "
+              f"{stats['features_orphaned']} seeded features left without routes, {stats['relinked']} files relinked")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Scrypto Embedding Providers
+Interchangeable backends that turn text chunks into vectors for the vector database.
+OpenAI is the hosted default; the local hashed TF-IDF + randomized SVD provider runs
+offline on CPU (NumPy/SciPy) so indexing works in air-gapped CI.
+"""
+
+import io
+import re
+import json
+import zlib
+import hashlib
+from typing import List, Optional
+
+
+class EmbeddingError(RuntimeError):
+    """Texts could not be embedded; callers must not store partial results"""
+
+
+class EmbeddingProvider:
+    """Base interface for embedding backends"""
+    
+    name = 'base'
+    requires_fit = False
+    
+    @property
+    def model_id(self) -> str:
+        """Identifier stored with every vector so vectors from different models never mix"""
+        raise NotImplementedError
+    
+    @property
+    def dimension(self) -> Optional[int]:
+        raise NotImplementedError
+    
+    @property
+    def is_ready(self) -> bool:
+        return True
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts, returning one vector per input"""
+        raise NotImplementedError
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query; providers may override with a lighter path"""
+        return self.embed([text])[0]
+    
+    def fit(self, texts: List[str]):
+        """Learn model state from a corpus (only needed when requires_fit is True)"""
+        pass
+    
+    def save_state(self) -> Optional[bytes]:
+        """Serialized model state, or None for stateless providers"""
+        return None
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Hosted embeddings via the OpenAI API"""
+    
+    name = 'openai'
+    
+    # Known output sizes; other models are sized from their first response
+    MODEL_DIMENSIONS = {
+        'text-embedding-3-small': 1536,
+        'text-embedding-3-large': 3072,
+        'text-embedding-ada-002': 1536
+    }
+    
+    def __init__(self, model: str = "text-embedding-3-small", client=None, batch_size: int = 100):
+        if client is None:
+            from openai_client import get_shared_client
+            client = get_shared_client()
+        
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+        self._dimension = self.MODEL_DIMENSIONS.get(model)
+    
+    @property
+    def model_id(self) -> str:
+        return self.model
+    
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._dimension
+    
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(
+            model=self.model,
+            input=batch
+        )
+        return [item.embedding for item in response.data]
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        
+        # The shared client runs batches concurrently under its adaptive limit
+        map_batches = getattr(self.client, 'map_concurrent', None)
+        results = map_batches(self._embed_batch, batches) if map_batches else [self._embed_batch(batch) for batch in batches]
+        vectors = [vector for batch_vectors in results for vector in batch_vectors]
+        
+        if len(vectors) != len(texts):
+            raise EmbeddingError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        
+        if vectors and self._dimension is None:
+            self._dimension = len(vectors[0])
+        
+        return vectors
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Offline embeddings: hashed TF-IDF features projected with a randomized SVD (LSA)
+    
+    The hashing trick avoids storing a vocabulary; only the hash buckets that occur in
+    the training corpus are kept, which keeps the projection matrix small.
+    """
+    
+    name = 'local'
+    requires_fit = True
+    
+    TOKEN_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9]*|\d+")
+    CAMEL_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+    
+    def __init__(self, dimension: int = 256, n_features: int = 2 ** 20,
+                 n_oversamples: int = 10, n_power_iterations: int = 4, seed: int = 42):
+        self.target_dimension = dimension
+        self.n_features = n_features
+        self.n_oversamples = n_oversamples
+        self.n_power_iterations = n_power_iterations
+        self.seed = seed
+        
+        # Learned state
+        self.active_features = None   # sorted hash buckets seen during fit
+        self.idf = None               # idf weight per active bucket
+        self.components = None        # (dimension, n_active) projection
+        self._fingerprint = None
+    
+    @property
+    def model_id(self) -> str:
+        if self._fingerprint is None:
+            return f"local-tfidf-svd-{self.target_dimension}"
+        return f"local-tfidf-svd-{self.dimension}-{self._fingerprint}"
+    
+    @property
+    def dimension(self) -> Optional[int]:
+        if self.components is None:
+            return None
+        return int(self.components.shape[0])
+    
+    @property
+    def is_ready(self) -> bool:
+        return self.components is not None
+    
+    def tokenize(self, text: str) -> List[str]:
+        """Lower-cased word tokens plus camelCase/PascalCase sub-tokens for code"""
+        tokens = []
+        for token in self.TOKEN_PATTERN.findall(text):
+            lowered = token.lower()
+            tokens.append(lowered)
+            parts = self.CAMEL_PATTERN.findall(token)
+            if len(parts) > 1:
+                tokens.extend(part.lower() for part in parts)
+        return tokens
+    
+    def _hash_counts(self, texts: List[str]):
+        """Sparse (n_texts, n_features) matrix of sublinear term frequencies"""
+        import numpy as np
+        from scipy import sparse
+        
+        indptr = [0]
+        indices = []
+        data = []
+        
+        for text in texts:
+            counts = {}
+            for token in self.tokenize(text):
+                bucket = zlib.crc32(token.encode('utf-8')) % self.n_features
+                counts[bucket] = counts.get(bucket, 0) + 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        
+        matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(texts), self.n_features)
+        )
+        matrix.data = 1.0 + np.log(matrix.data)
+        return matrix
+    
+    def _tfidf(self, counts):
+        """Row-normalized TF-IDF of hashed counts, restricted to the active buckets"""
+        import numpy as np
+        from scipy import sparse
+        
+        weighted = counts[:, self.active_features] @ sparse.diags(self.idf)
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ weighted
+    
+    def fit(self, texts: List[str]):
+        """Learn idf weights and the SVD projection from the corpus"""
+        import numpy as np
+        
+        if not texts:
+            raise ValueError("Cannot fit local embeddings on an empty corpus")
+        
+        counts = self._hash_counts(texts)
+        document_frequency = np.bincount(counts.indices, minlength=self.n_features)
+        
+        self.active_features = np.flatnonzero(document_frequency).astype(np.int64)
+        n_documents = counts.shape[0]
+        self.idf = (np.log((1.0 + n_documents) / (1.0 + document_frequency[self.active_features])) + 1.0).astype(np.float32)
+        
+        tfidf = self._tfidf(counts)
+        self.components = self._randomized_svd(tfidf)
+        self._fingerprint = hashlib.sha256(self.save_state()).hexdigest()[:12]
+    
+    def _randomized_svd(self, matrix):
+        """Top right-singular vectors via the Halko/Martinsson/Tropp range finder"""
+        import numpy as np
+        
+        n_rows, n_cols = matrix.shape
+        rank = max(1, min(self.target_dimension, n_rows, n_cols))
+        sketch_size = min(rank + self.n_oversamples, n_rows, n_cols)
+        
+        rng = np.random.default_rng(self.seed)
+        omega = rng.standard_normal((n_cols, sketch_size)).astype(np.float32)
+        
+        basis, _ = np.linalg.qr(matrix @ omega)
+        for _ in range(self.n_power_iterations):
+            basis, _ = np.linalg.qr(matrix.T @ basis)
+            basis, _ = np.linalg.qr(matrix @ basis)
+        
+        projected = np.asarray((matrix.T @ basis).T)
+        _, _, vt = np.linalg.svd(projected, full_matrices=False)
+        
+        return vt[:rank].astype(np.float32)
+    
+    def _embed_one(self, text: str):
+        """Project one text without building sparse matrices (no SciPy needed at query time)"""
+        import numpy as np
+        
+        counts = {}
+        for token in self.tokenize(text):
+            bucket = zlib.crc32(token.encode('utf-8')) % self.n_features
+            counts[bucket] = counts.get(bucket, 0) + 1
+        
+        buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        term_frequency = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        
+        # Buckets never seen during fit have no idf weight and are dropped, as in _tfidf
+        positions = np.minimum(np.searchsorted(self.active_features, buckets), len(self.active_features) - 1)
+        known = self.active_features[positions] == buckets
+        positions = positions[known]
+        
+        weights = term_frequency[known] * self.idf[positions]
+        norm = np.sqrt(np.dot(weights, weights))
+        if norm:
+            weights /= norm
+        
+        return self.components[:, positions] @ weights
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        import numpy as np
+        
+        if not self.is_ready:
+            raise RuntimeError("Local embedding provider has not been fitted")
+        if not texts:
+            return []
+        
+        vectors = np.asarray(self._tfidf(self._hash_counts(texts)) @ self.components.T, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        
+        return (vectors / norms).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        """One query without SciPy, for the memory-mapped bundle reader"""
+        import numpy as np
+        
+        if not self.is_ready:
+            raise RuntimeError("Local embedding provider has not been fitted")
+        
+        vector = np.asarray(self._embed_one(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+    
+    def save_state(self) -> Optional[bytes]:
+        import numpy as np
+        
+        if not self.is_ready:
+            return None
+        
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **self.state_arrays())
+        return buffer.getvalue()
+    
+    @classmethod
+    def from_state(cls, state: bytes) -> 'LocalEmbeddingProvider':
+        import numpy as np
+        
+        arrays = np.load(io.BytesIO(state))
+        return cls.from_arrays(arrays, hashlib.sha256(state).hexdigest()[:12])
+    
+    @classmethod
+    def from_arrays(cls, arrays, fingerprint: str) -> 'LocalEmbeddingProvider':
+        """Build from already-decoded (possibly memory-mapped) state arrays"""
+        target_dimension, n_features, seed = (int(value) for value in arrays['params'])
+        
+        provider = cls(dimension=target_dimension, n_features=n_features, seed=seed)
+        provider.active_features = arrays['active_features']
+        provider.idf = arrays['idf']
+        provider.components = arrays['components']
+        provider._fingerprint = fingerprint
+        
+        return provider
+    
+    def state_arrays(self) -> dict:
+        """Learned state as plain arrays (what save_state compresses)"""
+        import numpy as np
+        
+        return {
+            'active_features': self.active_features,
+            'idf': self.idf,
+            'components': self.components,
+            'params': np.asarray([self.target_dimension, self.n_features, self.seed], dtype=np.int64)
+        }
+
+
+class CachedEmbeddingProvider(EmbeddingProvider):
+    """Wraps another provider with a JSON cache of vectors keyed by model and text
+    
+    Lets evaluation runs against a hosted model replay query embeddings offline.
+    """
+    
+    def __init__(self, provider: EmbeddingProvider, cache_path: str):
+        self.provider = provider
+        self.cache_path = cache_path
+        self.name = provider.name
+        self.requires_fit = provider.requires_fit
+        self.hits = 0
+        self.misses = 0
+        
+        try:
+            with open(cache_path, 'r') as f:
+                self.cache = json.load(f)
+        except FileNotFoundError:
+            self.cache = {}
+    
+    @property
+    def model_id(self) -> str:
+        return self.provider.model_id
+    
+    @property
+    def dimension(self) -> Optional[int]:
+        return self.provider.dimension
+    
+    @property
+    def is_ready(self) -> bool:
+        return self.provider.is_ready
+    
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.setdefault(self.model_id, {})
+        missing = [text for text in dict.fromkeys(texts) if self._key(text) not in vectors]
+        
+        if missing:
+            for text, vector in zip(missing, self.provider.embed(missing)):
+                vectors[self._key(text)] = vector
+            self.save()
+        
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        return [vectors[self._key(text)] for text in texts]
+    
+    def save(self):
+        with open(self.cache_path, 'w') as f:
+            json.dump(self.cache, f)
+
+
+def get_embedding_provider(name: str, **kwargs) -> EmbeddingProvider:
+    """Create a provider by name ('openai' or 'local')"""
+    if name == 'openai':
+        return OpenAIEmbeddingProvider(**kwargs)
+    if name == 'local':
+        return LocalEmbeddingProvider(**kwargs)
+    raise ValueError(f"Unknown embedding provider: {name}")
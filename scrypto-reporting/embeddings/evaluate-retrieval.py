@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+"""
+Scrypto Retrieval Evaluation
+Runs a golden set of questions through every retrieval mode (LIKE, FTS, exact vector,
+mmap bundle, IVF ANN, hybrid) and through the context retrieval the assistant and the
+change gatekeeper actually use, and reports recall@k, MRR and p50/p95 latency side by
+side. Runs offline with the local provider or a cache of hosted query embeddings.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import argparse
+import importlib.util
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from embedding_providers import CachedEmbeddingProvider
+from index_bundle import IndexBundle
+from openai_client import ResilientOpenAIClient, FaultInjectingOpenAI
+
+def load_script_module(module_name: str, script_path: Path):
+    """The pipeline scripts have hyphenated names, so load them by path"""
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_vector_db_module():
+    return load_script_module("setup_vector_db", Path(__file__).parent / "setup-vector-db.py")
+
+class ScryptoRetrievalEvaluator:
+    MODES = ('like', 'fts', 'vector', 'bundle', 'ann', 'hybrid', 'assistant', 'gatekeeper')
+    
+    def __init__(self, vector_db, golden_path: str, bundle: Optional[IndexBundle] = None,
+                 k_values: Tuple[int, ...] = (1, 5, 10)):
+        self.vector_db = vector_db
+        self.bundle = bundle
+        self.k_values = tuple(sorted(k_values))
+        self.assistant = None
+        self.gatekeeper = None
+        self._spec_files = None
+        
+        with open(golden_path, 'r') as f:
+            self.golden = json.load(f)
+    
+    @staticmethod
+    def result_files(result: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """(source type, relative path) of a result and of every location deduplicated onto it"""
+        files = []
+        for metadata in [result['metadata']] + result.get('duplicates', []):
+            source_type = 'spec' if 'spec_type' in metadata else 'code'
+            files.append((source_type, metadata.get('relative_path')))
+        return files
+    
+    def like_search(self, question: str, limit: int) -> List[Dict[str, Any]]:
+        """Baseline: the keyword LIKE strategy of get_change_context, over the indexed chunks"""
+        conn = sqlite3.connect(self.vector_db.db_path)
+        cursor = conn.cursor()
+        results = []
+        
+        for keyword in question.lower().split()[:5]:
+            cursor.execute("""
+                SELECT id, metadata FROM document_embeddings
+                WHERE embedding_model = ? AND LOWER(content_chunk) LIKE ?
+                LIMIT ?
+            """, (self.vector_db.embedding_provider.model_id, f'%{keyword}%', limit))
+            results.extend({'id': row[0], 'metadata': json.loads(row[1])} for row in cursor.fetchall())
+        
+        conn.close()
+        return results
+    
+    def spec_files(self) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+        """Stored spec path -> path relative to the specs dir, and spec title -> stored paths
+        
+        The assistant and the gatekeeper read the specifications table, which keeps the
+        path the spec was indexed from; the chunk metadata records both forms.
+        """
+        if self._spec_files is None:
+            conn = sqlite3.connect(self.vector_db.db_path)
+            model_id = self.vector_db.embedding_provider.model_id
+            relative_paths = dict(conn.execute("""
+                SELECT file_path, relative_path FROM document_embeddings
+                WHERE embedding_model = ? AND source_type = 'spec'
+                UNION
+                SELECT s.file_path, s.relative_path FROM chunk_sources s
+                JOIN document_embeddings e ON e.id = s.embedding_id
+                WHERE e.embedding_model = ? AND s.source_type = 'spec'
+            """, (model_id, model_id)).fetchall())
+            
+            paths_by_title: Dict[str, List[str]] = {}
+            for title, file_path in conn.execute("SELECT title, file_path FROM specifications"):
+                paths_by_title.setdefault(title, []).append(file_path)
+            
+            conn.close()
+            self._spec_files = (relative_paths, paths_by_title)
+        return self._spec_files
+    
+    def spec_result(self, file_path: str) -> Dict[str, Any]:
+        relative_paths, _ = self.spec_files()
+        return {'metadata': {'spec_type': None, 'relative_path': relative_paths.get(file_path, file_path)}}
+    
+    def assistant_search(self, question: str, limit: int) -> List[Dict[str, Any]]:
+        """ScryptoAssistant.get_relevant_context, as the chatbot calls it for a developer"""
+        context = self.assistant.get_relevant_context(question, 'developer', limit)
+        return [self.spec_result(item['file_path']) for item in context]
+    
+    def gatekeeper_search(self, question: str, limit: int) -> List[Dict[str, Any]]:
+        """ScryptoChangeGatekeeper.get_change_context; it returns prompt text, so map its
+        **title** headers back to spec files"""
+        _, paths_by_title = self.spec_files()
+        context = self.gatekeeper.get_change_context(question)
+        return [self.spec_result(file_path)
+                for title in re.findall(r'^\*\*(.+?)\*\*:$', context, re.MULTILINE)
+                for file_path in paths_by_title.get(title, [])][:limit]
+    
+    @staticmethod
+    def offline_client() -> ResilientOpenAIClient:
+        """Context retrieval never calls the model, so the components get the local stub"""
+        return ResilientOpenAIClient(FaultInjectingOpenAI())
+    
+    def retriever(self, mode: str) -> Optional[Callable[[str, int], List[Dict[str, Any]]]]:
+        """Search function for a mode, or None when it is unavailable in this setup"""
+        if mode == 'like':
+            return self.like_search
+        if mode == 'fts':
+            return self.vector_db.keyword_search
+        if mode == 'vector':
+            return self.vector_db.semantic_search
+        if mode == 'hybrid':
+            return self.vector_db.hybrid_search
+        if mode == 'assistant':
+            if self.assistant is None:
+                module = load_script_module("scrypto_assistant", Path(__file__).parent.parent / "chatbot" / "scrypto-assistant.py")
+                self.assistant = module.ScryptoAssistant(self.vector_db.db_path, openai_client=self.offline_client())
+            return self.assistant_search
+        if mode == 'gatekeeper':
+            if self.gatekeeper is None:
+                module = load_script_module("change_gatekeeper", Path(__file__).parent.parent / "agents" / "change-gatekeeper.py")
+                self.gatekeeper = module.ScryptoChangeGatekeeper(self.vector_db.db_path, openai_client=self.offline_client())
+            return self.gatekeeper_search
+        if mode in ('bundle', 'ann') and self.bundle is not None:
+            if mode == 'ann' and not self.bundle.ann:
+                return None
+            embed = self.vector_db.embedding_provider.embed
+            return lambda question, limit: self.bundle.search(embed([question])[0], k=limit, exact=(mode == 'bundle'))
+        return None
+    
+    def evaluate_mode(self, mode: str, repeat: int = 3) -> Optional[Dict[str, Any]]:
+        search = self.retriever(mode)
+        if search is None:
+            return None
+        
+        max_k = self.k_values[-1]
+        recalls = {k: [] for k in self.k_values}
+        reciprocal_ranks = []
+        latencies = []
+        per_question = []
+        
+        for item in self.golden['questions']:
+            expected = ({('spec', path) for path in item.get('expected_specs', [])}
+                        | {('code', path) for path in item.get('expected_code', [])})
+            
+            # Chunks from one file cluster together, so over-fetch before ranking files
+            for _ in range(repeat):
+                started = time.perf_counter()
+                results = search(item['question'], max_k * 3)
+                latencies.append((time.perf_counter() - started) * 1000)
+            
+            ranked_files = []
+            for result in results:
+                for file_key in self.result_files(result):
+                    if file_key not in ranked_files:
+                        ranked_files.append(file_key)
+            ranked_files = ranked_files[:max_k]
+            
+            for k in self.k_values:
+                recalls[k].append(len(expected & set(ranked_files[:k])) / len(expected))
+            
+            first_hit = next((rank for rank, file_key in enumerate(ranked_files, start=1) if file_key in expected), None)
+            reciprocal_ranks.append(1.0 / first_hit if first_hit else 0.0)
+            per_question.append({'id': item['id'], 'first_hit': first_hit,
+                                 f'recall@{max_k}': recalls[max_k][-1]})
+        
+        return {
+            'mode': mode,
+            'recall': {k: float(np.mean(values)) for k, values in recalls.items()},
+            'mrr': float(np.mean(reciprocal_ranks)),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'questions': per_question
+        }
+    
+    def evaluate(self, modes: Tuple[str, ...] = MODES, repeat: int = 3) -> List[Dict[str, Any]]:
+        # Embed every question once up front so vector timings measure retrieval, not the provider
+        self.vector_db.embedding_provider.embed([item['question'] for item in self.golden['questions']])
+        
+        reports = []
+        for mode in modes:
+            report = self.evaluate_mode(mode, repeat)
+            if report is None:
+                print(f"⏭️  Skipping {mode}: not available for this database")
+                continue
+            reports.append(report)
+        return reports
+    
+    def print_table(self, reports: List[Dict[str, Any]]):
+        recall_headers = "".join(f"{'R@' + str(k):>8}" for k in self.k_values)
+        print(f"\n{'mode':<12}{recall_headers}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}")
+        print("-" * (12 + 8 * len(self.k_values) + 28))
+        for report in reports:
+            recalls = "".join(f"{report['recall'][k]:>8.3f}" for k in self.k_values)
+            print(f"{report['mode']:<12}{recalls}{report['mrr']:>8.3f}{report['p50_ms']:>10.2f}{report['p95_ms']:>10.2f}")
+
+def check_regressions(reports: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+                      max_recall_drop: float, max_latency_ratio: Optional[float]) -> List[str]:
+    """Mode/metric pairs that got worse than the baseline allows"""
+    previous = {report['mode']: report for report in baseline}
+    problems = []
+    
+    for report in reports:
+        before = previous.get(report['mode'])
+        if before is None:
+            continue
+        for k, recall in report['recall'].items():
+            old = before['recall'].get(str(k), before['recall'].get(k))
+            if old is not None and recall < old - max_recall_drop:
+                problems.append(f"{report['mode']} recall@{k} {old:.3f} -> {recall:.3f}")
+        if before['mrr'] - report['mrr'] > max_recall_drop:
+            problems.append(f"{report['mode']} MRR {before['mrr']:.3f} -> {report['mrr']:.3f}")
+        if max_latency_ratio and report['p95_ms'] > before['p95_ms'] * max_latency_ratio:
+            problems.append(f"{report['mode']} p95 {before['p95_ms']:.2f}ms -> {report['p95_ms']:.2f}ms")
+    
+    return problems
+
+def main():
+    script_dir = Path(__file__).parent
+    
+    parser = argparse.ArgumentParser(description="Evaluate Scrypto retrieval quality and latency")
+    parser.add_argument('--db', default="scrypto-intelligence.db", help="Vector database to evaluate")
+    parser.add_argument('--golden', default=str(script_dir / "golden-set.json"), help="Golden question set")
+    parser.add_argument('--provider', choices=['openai', 'local'],
+                        default=os.environ.get('SCRYPTO_EMBEDDING_PROVIDER', 'openai'),
+                        help="Provider that embedded the database (local runs fully offline)")
+    parser.add_argument('--embedding-cache',
+                        help="JSON cache of query embeddings (default: <db>.query-embeddings.json)")
+    parser.add_argument('--bundle', help="Index bundle for the bundle/ann modes (default: exported to a temp dir)")
+    parser.add_argument('--modes', nargs='+', choices=ScryptoRetrievalEvaluator.MODES,
+                        default=list(ScryptoRetrievalEvaluator.MODES), help="Retrieval modes to run")
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 5, 10], help="Cut-offs for recall@k")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per question")
+    parser.add_argument('--save', help="Write the report as JSON (e.g. to use as a baseline)")
+    parser.add_argument('--baseline', help="Fail if results regress against this saved report")
+    parser.add_argument('--max-recall-drop', type=float, default=0.02, help="Allowed recall/MRR drop vs baseline")
+    parser.add_argument('--max-latency-ratio', type=float, help="Allowed p95 slowdown factor vs baseline")
+    args = parser.parse_args()
+    
+    print("📏 Scrypto Retrieval Evaluation")
+    print("=" * 50)
+    
+    module = load_vector_db_module()
+    vector_db = module.ScryptoVectorDB(args.db, embedding_provider=args.provider)
+    if not vector_db.embedding_provider.is_ready:
+        print("❌ The local provider has not been fitted for this database; run setup-vector-db.py --provider local")
+        sys.exit(1)
+    
+    cache_path = args.embedding_cache or f"{args.db}.query-embeddings.json"
+    vector_db.embedding_provider = CachedEmbeddingProvider(vector_db.embedding_provider, cache_path)
+    
+    bundle = None
+    bundle_dir = None
+    if {'bundle', 'ann'} & set(args.modes):
+        if args.bundle:
+            bundle = IndexBundle(args.bundle)
+        else:
+            bundle_dir = tempfile.TemporaryDirectory()
+            vector_db.export_bundle(str(Path(bundle_dir.name) / "bundle"))
+            bundle = IndexBundle(str(Path(bundle_dir.name) / "bundle"))
+        
+        if bundle.model_id != vector_db.embedding_provider.model_id:
+            print(f"⚠️ Bundle model {bundle.model_id} does not match {vector_db.embedding_provider.model_id}; skipping bundle modes")
+            bundle = None
+    
+    evaluator = ScryptoRetrievalEvaluator(vector_db, args.golden, bundle=bundle, k_values=tuple(args.k))
+    print(f"🧠 Model: {vector_db.embedding_provider.model_id}, {len(evaluator.golden['questions'])} questions")
+    
+    reports = evaluator.evaluate(tuple(args.modes), repeat=args.repeat)
+    evaluator.print_table(reports)
+    
+    provider = vector_db.embedding_provider
+    print(f"\n💾 Query embeddings: {provider.hits} cached, {provider.misses} computed ({cache_path})")
+    
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'model_id': provider.model_id, 'reports': reports}, f, indent=2)
+        print(f"📝 Report saved to {args.save}")
+    
+    if bundle_dir is not None:
+        bundle_dir.cleanup()
+    
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        problems = check_regressions(reports, baseline['reports'], args.max_recall_drop, args.max_latency_ratio)
+        for problem in problems:
+            print(f"❌ Regression: {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
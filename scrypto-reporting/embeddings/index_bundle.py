@@ -0,0 +1,459 @@
+"""
+Scrypto Index Bundle
+A versioned, memory-mappable export of one embedding model's vectors: a raw float32
+(or int8 + per-row scale) matrix, columnar row metadata, an optional IVF ANN index
+and the fitted provider state, described by a manifest with sha256 content hashes.
+Readers mmap the files and serve queries without parsing any vectors.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from embedding_providers import EmbeddingProvider, LocalEmbeddingProvider, OpenAIEmbeddingProvider
+
+FORMAT_NAME = 'scrypto-index-bundle'
+FORMAT_VERSION = 1
+
+# Row metadata stored as utf-8 blob + int64 offsets columns
+STRING_COLUMNS = ('source_type', 'file_path', 'relative_path', 'content', 'tags', 'metadata', 'duplicates')
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def default_model(conn: sqlite3.Connection) -> Optional[str]:
+    """The model with the most stored vectors"""
+    row = conn.execute("""
+        SELECT embedding_model FROM document_embeddings
+        GROUP BY embedding_model
+        ORDER BY COUNT(*) DESC
+        LIMIT 1
+    """).fetchone()
+    return row[0] if row else None
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-row int8 quantization; vectors ~= codes * scales[:, None]"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 7):
+    """Spherical k-means coarse quantizer; returns centroids and each row's list"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for list_id in range(nlist):
+            members = vectors[assignments == list_id]
+            if len(members):
+                centroid = members.sum(axis=0)
+                norm = np.linalg.norm(centroid)
+                centroids[list_id] = centroid / norm if norm else centroid
+            else:
+                # Re-seed empty lists so every list stays useful
+                centroids[list_id] = vectors[rng.integers(len(vectors))]
+    
+    return centroids.astype(np.float32), np.argmax(vectors @ centroids.T, axis=1)
+
+def write_string_column(directory: Path, name: str, values: List[str]):
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    
+    offsets.tofile(directory / f"{name}.offsets.i64")
+    with open(directory / f"{name}.utf8", 'wb') as f:
+        for value in encoded:
+            f.write(value)
+
+def write_bundle(db_path: str, out_dir: str, model_id: Optional[str] = None,
+                 dtype: str = 'float32', ann: bool = True, nlist: Optional[int] = None,
+                 versioned: bool = True) -> Dict[str, Any]:
+    """Export one model's rows from a vector database into a bundle directory
+    
+    versioned=True publishes through a symlink that a served bundle can be re-exported
+    behind (see publish_version). versioned=False writes out_dir as a plain directory
+    to copy to another host; it must not exist yet.
+    """
+    if dtype not in ('float32', 'int8'):
+        raise ValueError(f"Unsupported bundle dtype: {dtype}")
+    
+    out_path = Path(out_dir)
+    if not versioned and (out_path.exists() or out_path.is_symlink()):
+        raise FileExistsError(f"{out_dir} already exists; plain bundles are not replaced in place")
+    
+    conn = sqlite3.connect(db_path)
+    model_id = model_id or default_model(conn)
+    if model_id is None:
+        conn.close()
+        raise ValueError(f"No embeddings to export in {db_path}")
+    
+    rows = conn.execute("""
+        SELECT id, source_type, file_path, relative_path, content_chunk, tags, metadata,
+               embedding_vector, minhash
+        FROM document_embeddings
+        WHERE embedding_model = ?
+        ORDER BY id
+    """, (model_id,)).fetchall()
+    
+    duplicates: Dict[int, List[Dict[str, Any]]] = {}
+    for embedding_id, source_type, similarity, tags, metadata in conn.execute("""
+        SELECT s.embedding_id, s.source_type, s.similarity, s.tags, s.metadata
+        FROM chunk_sources s
+        JOIN document_embeddings e ON e.id = s.embedding_id
+        WHERE e.embedding_model = ?
+        ORDER BY s.id
+    """, (model_id,)):
+        duplicates.setdefault(embedding_id, []).append({
+            'source_type': source_type,
+            'similarity': similarity,
+            'tags': json.loads(tags),
+            'metadata': json.loads(metadata)
+        })
+    
+    model = conn.execute("""
+        SELECT provider, state FROM embedding_models WHERE model_id = ?
+    """, (model_id,)).fetchone()
+    conn.close()
+    
+    if not rows:
+        raise ValueError(f"No embeddings for model {model_id} in {db_path}")
+    
+    vectors = np.asarray([json.loads(row[7]) for row in rows], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    
+    # Every export is written to its own version directory next to the destination;
+    # out_dir is a symlink switched to the finished version (see publish_version),
+    # or the directory itself renamed into place for a plain export
+    version_dir = out_path.with_name(f".{out_path.name}.v{time.time_ns()}")
+    (version_dir / 'columns').mkdir(parents=True)
+    
+    if dtype == 'int8':
+        codes, scales = quantize_int8(vectors)
+        codes.tofile(version_dir / 'vectors.i8')
+        scales.tofile(version_dir / 'scales.f32')
+    else:
+        vectors.tofile(version_dir / 'vectors.f32')
+    
+    np.asarray([row[0] for row in rows], dtype=np.int64).tofile(version_dir / 'ids.i64')
+    
+    num_perm = next((len(row[8]) // 4 for row in rows if row[8]), 0)
+    if num_perm:
+        minhash = np.zeros((len(rows), num_perm), dtype=np.uint32)
+        for position, row in enumerate(rows):
+            if row[8]:
+                minhash[position] = np.frombuffer(row[8], dtype=np.uint32)
+        minhash.tofile(version_dir / 'minhash.u32')
+    
+    columns = {
+        'source_type': [row[1] for row in rows],
+        'file_path': [row[2] or '' for row in rows],
+        'relative_path': [row[3] or '' for row in rows],
+        'content': [row[4] for row in rows],
+        'tags': [row[5] for row in rows],
+        'metadata': [row[6] for row in rows],
+        'duplicates': [json.dumps(duplicates.get(row[0], [])) for row in rows]
+    }
+    for name in STRING_COLUMNS:
+        write_string_column(version_dir / 'columns', name, columns[name])
+    
+    ann_info = None
+    if ann and len(rows) >= 64:
+        nlist = nlist or max(1, int(round(np.sqrt(len(rows)))))
+        centroids, assignments = train_ivf(vectors, min(nlist, len(rows)))
+        order = np.argsort(assignments, kind='stable').astype(np.int64)
+        list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=list_offsets[1:])
+        
+        centroids.tofile(version_dir / 'ivf_centroids.f32')
+        order.tofile(version_dir / 'ivf_rows.i64')
+        list_offsets.tofile(version_dir / 'ivf_offsets.i64')
+        ann_info = {'type': 'ivf', 'nlist': len(centroids), 'nprobe': max(1, len(centroids) // 4)}
+    
+    # The compressed state is kept for import; the raw arrays let readers mmap the provider
+    provider_state = None
+    if model and model[1] is not None:
+        with open(version_dir / 'provider_state.npz', 'wb') as f:
+            f.write(model[1])
+        provider_state = 'provider_state.npz'
+        
+        (version_dir / 'provider').mkdir()
+        for name, array in LocalEmbeddingProvider.from_state(model[1]).state_arrays().items():
+            np.save(version_dir / 'provider' / f"{name}.npy", np.ascontiguousarray(array))
+    
+    manifest = {
+        'format': FORMAT_NAME,
+        'format_version': FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'model_id': model_id,
+        'provider': model[0] if model else None,
+        'dimension': int(vectors.shape[1]),
+        'count': len(rows),
+        'dtype': dtype,
+        'minhash_perm': num_perm,
+        'columns': list(STRING_COLUMNS),
+        'ann': ann_info,
+        'provider_state': provider_state,
+        'provider_fingerprint': hashlib.sha256(model[1]).hexdigest()[:12] if provider_state else None,
+        'files': {
+            str(path.relative_to(version_dir)): {'sha256': file_sha256(path), 'bytes': path.stat().st_size}
+            for path in sorted(version_dir.rglob('*')) if path.is_file()
+        }
+    }
+    with open(version_dir / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    if versioned:
+        publish_version(out_path, version_dir)
+    else:
+        os.rename(version_dir, out_path)
+    return manifest
+
+def bundle_versions(out_path: Path) -> List[Path]:
+    """Version directories of a bundle path, oldest first"""
+    prefix = f".{out_path.name}.v"
+    versions = [path for path in out_path.parent.glob(f"{prefix}*") if path.name[len(prefix):].isdigit()]
+    return sorted(versions, key=lambda path: int(path.name[len(prefix):]))
+
+def publish_version(out_path: Path, version_dir: Path, keep: int = 2):
+    """Point out_path at a finished version with one atomic rename, then prune old versions
+    
+    os.replace of a symlink is atomic, so out_path always resolves to a complete bundle.
+    The previous version is kept for readers that resolved the link just before the swap.
+    
+    Each version directory is self-contained, but out_path itself is only a relative link
+    to its hidden sibling: ship the resolved directory (cp -rL, tar -h) or the whole
+    parent, or export with versioned=False for a plain copyable directory.
+    """
+    if out_path.is_dir() and not out_path.is_symlink():
+        # A bundle written before versioning becomes the previous version (a one-time move)
+        os.replace(out_path, out_path.with_name(f".{out_path.name}.v0"))
+    
+    link = out_path.with_name(f".{out_path.name}.link-{os.getpid()}")
+    if link.is_symlink():
+        link.unlink()
+    os.symlink(version_dir.name, link)
+    os.replace(link, out_path)
+    
+    older = [path for path in bundle_versions(out_path) if path != version_dir]
+    for path in older[:len(older) - (keep - 1)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class IndexBundle:
+    """Read-only, memory-mapped view of an exported bundle"""
+    
+    def __init__(self, path: str, verify: bool = False, attempts: int = 3):
+        for attempt in range(attempts):
+            # Resolve the bundle link once per attempt so every file comes from the same version
+            self.path = Path(path).resolve()
+            try:
+                self._open(verify)
+                return
+            except FileNotFoundError:
+                # The resolved version was pruned by a later export (or a pre-versioning
+                # bundle was being moved aside) while it was opened; follow the link again
+                if attempt + 1 == attempts:
+                    raise
+                time.sleep(0.05)
+    
+    def _open(self, verify: bool):
+        with open(self.path / 'manifest.json', 'r') as f:
+            self.manifest = json.load(f)
+        
+        if self.manifest.get('format') != FORMAT_NAME:
+            raise ValueError(f"{self.path} is not a {FORMAT_NAME}")
+        if self.manifest['format_version'] > FORMAT_VERSION:
+            raise ValueError(f"Bundle format {self.manifest['format_version']} is newer than supported ({FORMAT_VERSION})")
+        if verify:
+            self.verify()
+        
+        self.count = self.manifest['count']
+        self.dimension = self.manifest['dimension']
+        shape = (self.count, self.dimension)
+        
+        if self.manifest['dtype'] == 'int8':
+            self.vectors = self._map('vectors.i8', np.int8, shape)
+            self.scales = self._map('scales.f32', np.float32, (self.count,))
+        else:
+            self.vectors = self._map('vectors.f32', np.float32, shape)
+            self.scales = None
+        
+        self.ids = self._map('ids.i64', np.int64, (self.count,))
+        self.columns = {
+            name: (self._map(f"columns/{name}.offsets.i64", np.int64, (self.count + 1,)),
+                   self._map(f"columns/{name}.utf8", np.uint8, None))
+            for name in self.manifest['columns']
+        }
+        
+        self.ann = self.manifest.get('ann')
+        if self.ann:
+            self.centroids = self._map('ivf_centroids.f32', np.float32, (self.ann['nlist'], self.dimension))
+            self.list_rows = self._map('ivf_rows.i64', np.int64, (self.count,))
+            self.list_offsets = self._map('ivf_offsets.i64', np.int64, (self.ann['nlist'] + 1,))
+    
+    def _map(self, name: str, dtype, shape) -> np.ndarray:
+        path = self.path / name
+        if path.stat().st_size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+    
+    @property
+    def model_id(self) -> str:
+        return self.manifest['model_id']
+    
+    def verify(self):
+        """Check every file against the sha256 recorded in the manifest"""
+        for name, info in self.manifest['files'].items():
+            if file_sha256(self.path / name) != info['sha256']:
+                raise ValueError(f"Bundle file {name} does not match its manifest hash")
+    
+    def provider_state(self) -> Optional[bytes]:
+        if not self.manifest.get('provider_state'):
+            return None
+        with open(self.path / self.manifest['provider_state'], 'rb') as f:
+            return f.read()
+    
+    def embedding_provider(self) -> EmbeddingProvider:
+        """Provider that embeds queries into this bundle's vector space"""
+        if not self.manifest.get('provider_state'):
+            return OpenAIEmbeddingProvider(model=self.model_id)
+        
+        arrays = {
+            path.stem: np.load(path, mmap_mode='r')
+            for path in (self.path / 'provider').glob('*.npy')
+        }
+        return LocalEmbeddingProvider.from_arrays(arrays, self.manifest['provider_fingerprint'])
+    
+    def string(self, column: str, position: int) -> str:
+        offsets, blob = self.columns[column]
+        return bytes(blob[offsets[position]:offsets[position + 1]]).decode('utf-8')
+    
+    def minhash(self, position: int) -> Optional[bytes]:
+        num_perm = self.manifest.get('minhash_perm')
+        if not num_perm:
+            return None
+        if not hasattr(self, '_minhash'):
+            self._minhash = self._map('minhash.u32', np.uint32, (self.count, num_perm))
+        signature = self._minhash[position]
+        return signature.tobytes() if signature.any() else None
+    
+    def row(self, position: int) -> Dict[str, Any]:
+        return {
+            'id': int(self.ids[position]),
+            'source_type': self.string('source_type', position),
+            'content': self.string('content', position),
+            'tags': json.loads(self.string('tags', position)),
+            'metadata': json.loads(self.string('metadata', position)),
+            'duplicates': [duplicate['metadata'] for duplicate in json.loads(self.string('duplicates', position))]
+        }
+    
+    def score(self, positions: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Cosine scores of the given rows (all rows when positions is None)"""
+        vectors = self.vectors if positions is None else self.vectors[positions]
+        if self.scales is None:
+            return vectors @ query
+        scales = self.scales if positions is None else self.scales[positions]
+        return (vectors.astype(np.float32) @ query) * scales
+    
+    def search(self, query_vector: List[float], k: int = 5, nprobe: Optional[int] = None,
+               exact: bool = False) -> List[Dict[str, Any]]:
+        """Top-k rows for a query vector; uses the IVF index unless exact or none was built"""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        
+        if self.ann and not exact:
+            nprobe = min(nprobe or self.ann['nprobe'], self.ann['nlist'])
+            probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            positions = np.concatenate([
+                self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]] for list_id in probed
+            ])
+        else:
+            positions = None
+        
+        scores = self.score(positions, query)
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        
+        results = []
+        for index in top:
+            position = int(index if positions is None else positions[index])
+            result = self.row(position)
+            result['similarity'] = float(scores[index])
+            results.append(result)
+        return results
+
+def import_bundle(bundle: IndexBundle, db_path: str) -> int:
+    """Load a bundle's rows into a vector database, replacing rows of the same model"""
+    conn = sqlite3.connect(db_path)
+    model_id = bundle.model_id
+    
+    with conn:
+        conn.execute("""
+            DELETE FROM chunk_sources
+            WHERE embedding_id IN (SELECT id FROM document_embeddings WHERE embedding_model = ?)
+        """, (model_id,))
+        conn.execute("DELETE FROM document_embeddings WHERE embedding_model = ?", (model_id,))
+        
+        state = bundle.provider_state()
+        conn.execute("""
+            INSERT OR REPLACE INTO embedding_models
+            (model_id, provider, dimension, state)
+            VALUES (?, ?, ?, ?)
+        """, (model_id, bundle.manifest['provider'] or 'openai', bundle.dimension, state))
+        
+        for position in range(bundle.count):
+            if bundle.scales is None:
+                vector = bundle.vectors[position]
+            else:
+                vector = bundle.vectors[position].astype(np.float32) * bundle.scales[position]
+            
+            cursor = conn.execute("""
+                INSERT INTO document_embeddings
+                (source_type, content_chunk, embedding_vector, embedding_model,
+                 embedding_provider, embedding_dim, tags, metadata, minhash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                bundle.string('source_type', position),
+                bundle.string('content', position),
+                json.dumps(vector.tolist()),
+                model_id,
+                bundle.manifest['provider'] or 'openai',
+                bundle.dimension,
+                bundle.string('tags', position),
+                bundle.string('metadata', position),
+                bundle.minhash(position)
+            ))
+            
+            for duplicate in json.loads(bundle.string('duplicates', position)):
+                conn.execute("""
+                    INSERT INTO chunk_sources
+                    (embedding_id, source_type, similarity, tags, metadata)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (
+                    cursor.lastrowid,
+                    duplicate['source_type'],
+                    duplicate['similarity'],
+                    json.dumps(duplicate['tags']),
+                    json.dumps(duplicate['metadata'])
+                ))
+    
+    conn.close()
+    return bundle.count
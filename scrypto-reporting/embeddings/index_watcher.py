@@ -0,0 +1,342 @@
+"""
+Scrypto Index Watcher
+Keeps the vector database current while specs and code are edited: file changes come from
+inotify (through libc, Linux) or mtime polling elsewhere, bursts are debounced and coalesced
+into batches, and each batch is re-indexed by ScryptoVectorDB.reindex_paths in one transaction.
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+# inotify event bits from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+# Directories never worth watching (and too large for the default inotify watch limit)
+SKIPPED_DIRS = {'node_modules', '.next', '.git', '__pycache__'}
+
+def iter_tree(root: Path):
+    """Yield (directory, file names) below root, skipping SKIPPED_DIRS"""
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [name for name in dir_names if name not in SKIPPED_DIRS]
+        yield Path(dir_path), file_names
+
+class InotifyWatcher:
+    """Recursive inotify watches on a set of root directories"""
+    
+    MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+            IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    
+    def __init__(self, roots: List[Path]):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, "libc not found")
+        
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        
+        self.watches: Dict[int, Path] = {}
+        self.overflowed = False
+        try:
+            for root in roots:
+                self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+    
+    def add_watch(self, directory: Path):
+        # IN_ONLYDIR watches the directory's entries; files are reported by name
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), self.MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return  # Removed before we got to it; its parent reports the deletion
+            raise OSError(error, f"inotify_add_watch failed for {directory} (raise fs.inotify.max_user_watches?)")
+        self.watches[wd] = directory
+    
+    def add_tree(self, root: Path) -> Set[Path]:
+        """Watch root and every directory below it; returns the files already inside"""
+        files = set()
+        for directory, file_names in iter_tree(root):
+            self.add_watch(directory)
+            files.update(directory / name for name in file_names)
+        return files
+    
+    def poll(self, timeout: Optional[float]) -> Set[Path]:
+        """Paths changed since the last call, waiting up to timeout seconds for the first event"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_length].rstrip(b'\0')
+                offset += _EVENT_HEADER.size + name_length
+                
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+                if not name:
+                    # The watched directory itself was deleted or moved away
+                    changed.add(directory)
+                    continue
+                
+                path = directory / os.fsdecode(name)
+                if mask & IN_ISDIR:
+                    if path.name in SKIPPED_DIRS:
+                        continue
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # Files may land in a new directory before its watch exists
+                        changed.update(self.add_tree(path))
+                    else:
+                        changed.add(path)
+                else:
+                    changed.add(path)
+        
+        return changed
+    
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """mtime/size snapshots of the root directories, diffed every interval"""
+    
+    def __init__(self, roots: List[Path], interval: float = 1.0):
+        self.roots = roots
+        self.interval = interval
+        self.overflowed = False
+        self.snapshot = self.scan()
+        self.next_scan = time.monotonic() + interval
+    
+    def scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for root in self.roots:
+            for directory, file_names in iter_tree(root):
+                for name in file_names:
+                    path = directory / name
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    def poll(self, timeout: Optional[float]) -> Set[Path]:
+        wait = self.next_scan - time.monotonic()
+        if timeout is not None and wait > timeout:
+            time.sleep(max(timeout, 0))
+            return set()
+        time.sleep(max(wait, 0))
+        self.next_scan = time.monotonic() + self.interval
+        
+        snapshot = self.scan()
+        changed = {path for path, signature in snapshot.items() if self.snapshot.get(path) != signature}
+        changed.update(self.snapshot.keys() - snapshot.keys())
+        self.snapshot = snapshot
+        return changed
+    
+    def close(self):
+        pass
+
+def make_watcher(roots: List[Path], force_polling: bool = False, poll_interval: float = 1.0):
+    """inotify where the platform and watch limits allow it, polling otherwise"""
+    if not force_polling:
+        try:
+            return InotifyWatcher(roots)
+        except OSError as e:
+            print(f"⚠️ inotify unavailable ({e}); polling every {poll_interval}s instead")
+    return PollingWatcher(roots, poll_interval)
+
+class ChangeBatcher:
+    """Coalesces bursts of edits into one batch per quiet period
+    
+    A batch is released once no new change arrived for `debounce` seconds, or `max_delay`
+    seconds after its first change so a file saved continuously still gets indexed.
+    Deferred paths (retries) rejoin the pending set when their delay has passed.
+    """
+    
+    def __init__(self, debounce: float = 0.5, max_delay: float = 5.0):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.pending: Dict[Path, float] = {}  # path -> wall-clock time first seen
+        self.deferred: Dict[Path, Tuple[float, float]] = {}  # path -> (monotonic due time, first seen)
+        self.first_change = None
+        self.last_change = None
+    
+    def add(self, paths: Set[Path]):
+        if not paths:
+            return
+        now = time.monotonic()
+        wall_now = time.time()
+        if not self.pending:
+            self.first_change = now
+        self.last_change = now
+        for path in paths:
+            # A fresh change supersedes a scheduled retry
+            retry = self.deferred.pop(path, None)
+            self.pending.setdefault(path, retry[1] if retry else wall_now)
+    
+    def defer(self, batch: Dict[Path, float], delay: float):
+        """Retry a batch's paths after `delay` seconds, keeping when each change was first seen"""
+        due = time.monotonic() + delay
+        for path, detected_at in batch.items():
+            self.deferred[path] = (due, detected_at)
+    
+    def release_deferred(self):
+        now = time.monotonic()
+        due = {path: detected_at for path, (due_at, detected_at) in self.deferred.items() if due_at <= now}
+        for path in due:
+            del self.deferred[path]
+        if due:
+            self.requeue(due)
+    
+    def time_until_due(self) -> Optional[float]:
+        """Seconds until the pending batch is released (None when nothing is pending or deferred)"""
+        self.release_deferred()
+        if not self.pending:
+            if not self.deferred:
+                return None
+            return max(min(due_at for due_at, _ in self.deferred.values()) - time.monotonic(), 0.0)
+        due = min(self.last_change + self.debounce, self.first_change + self.max_delay)
+        return max(due - time.monotonic(), 0.0)
+    
+    def requeue(self, batch: Dict[Path, float]):
+        """Put back a batch that failed to commit, keeping when each change was first seen"""
+        self.add(set(batch))
+        self.pending.update(batch)
+    
+    def take(self) -> Dict[Path, float]:
+        batch, self.pending = self.pending, {}
+        return batch
+
+def change_lag_ms(path: Path, detected_at: float, committed_at: float) -> float:
+    """Time from the change landing on disk (its mtime, or detection for deletions) to the commit"""
+    try:
+        changed_at = min(path.stat().st_mtime, detected_at)
+    except OSError:
+        changed_at = detected_at
+    return max(committed_at - changed_at, 0.0) * 1000
+
+def watch(vector_db, specs_dir: str, project_dir: str, debounce: float = 0.5, max_delay: float = 5.0,
+          force_polling: bool = False, poll_interval: float = 1.0, catch_up: bool = True,
+          stop: Optional[threading.Event] = None, max_retries: int = 3,
+          retry_backoff: float = 2.0) -> Dict[str, float]:
+    """Re-index changed files until interrupted (or until stop is set); returns lag totals
+    
+    A file that fails to re-index is retried up to max_retries times, waiting
+    retry_backoff seconds before the first retry and twice as long before each next one.
+    """
+    specs_path = Path(specs_dir)
+    project_path = Path(project_dir)
+    roots = [specs_path] + [project_path / name for name in vector_db.CODE_DIRS if (project_path / name).is_dir()]
+    
+    watcher = make_watcher(roots, force_polling, poll_interval)
+    batcher = ChangeBatcher(debounce, max_delay)
+    totals = {'batches': 0, 'files': 0, 'lag_ms_max': 0.0, 'abandoned': 0}
+    attempts: Dict[Path, int] = {}  # failed path -> failures so far
+    
+    print(f"👀 Watching {len(roots)} directories with {type(watcher).__name__} "
+          f"(debounce {debounce}s, max delay {max_delay}s)")
+    
+    if catch_up:
+        # Edits made while nothing was watching
+        batcher.add(set(vector_db.stale_paths(specs_dir, project_dir)))
+    
+    try:
+        while stop is None or not stop.is_set():
+            wait = batcher.time_until_due()
+            changed = watcher.poll(0.5 if wait is None else min(wait, 0.5))
+            # Deletions are kept whatever they were: a removed directory takes its files with it
+            batcher.add({path for path in changed if not path.exists()
+                         or vector_db.classify_path(path, specs_path, project_path) is not None})
+            
+            if watcher.overflowed:
+                print("⚠️ Change queue overflowed; rescanning for stale files")
+                watcher.overflowed = False
+                batcher.add(set(vector_db.stale_paths(specs_dir, project_dir)))
+            
+            if batcher.time_until_due() != 0.0:
+                continue
+            
+            batch = batcher.take()
+            started = time.perf_counter()
+            try:
+                stats = vector_db.reindex_paths(batch.keys(), specs_dir, project_dir)
+            except sqlite3.OperationalError as e:
+                # e.g. another writer held the database past the busy timeout; nothing was committed
+                print(f"⚠️ Refresh rolled back ({e}); retrying {len(batch)} files")
+                batcher.requeue(batch)
+                continue
+            reindex_ms = (time.perf_counter() - started) * 1000
+            
+            committed_at = time.time()
+            lags_ms = [change_lag_ms(path, detected_at, committed_at) for path, detected_at in batch.items()]
+            vector_db.log_refresh(stats, reindex_ms, lags_ms)
+            
+            totals['batches'] += 1
+            totals['files'] += len(batch)
+            totals['lag_ms_max'] = max([totals['lag_ms_max']] + lags_ms)
+            
+            failed = f", {len(stats['failed'])} failed" if stats['failed'] else ""
+            print(f"🔄 {stats['changed']} re-indexed, {stats['removed']} removed, {stats['chunks']} chunks embedded "
+                  f"in {reindex_ms:.0f}ms{failed}; index lag max {max(lags_ms):.0f}ms")
+            
+            failed_paths = {Path(file_path) for file_path in stats['failed']}
+            for path in batch.keys() - failed_paths:
+                attempts.pop(path, None)
+            for path in failed_paths & batch.keys():
+                attempts[path] = attempts.get(path, 0) + 1
+                if attempts[path] > max_retries:
+                    print(f"❌ Giving up on {path} after {max_retries} retries; it is retried on its next change")
+                    del attempts[path]
+                    totals['abandoned'] += 1
+                    continue
+                batcher.defer({path: batch[path]}, retry_backoff * 2 ** (attempts[path] - 1))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    
+    return totals
@@ -0,0 +1,106 @@
+"""
+Scrypto Near-Duplicate Detection
+MinHash signatures with banded LSH, used at ingest so overlapping windows, copy-pasted
+spec sections and near-identical components share one embedding instead of many
+"""
+
+import re
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Mersenne prime 2^31 - 1 keeps (a * x + b) inside uint64 without overflow
+_PRIME = np.uint64((1 << 31) - 1)
+
+class MinHasher:
+    """Word-shingle MinHash signatures"""
+    
+    TOKEN_PATTERN = re.compile(r"\w+")
+    
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+    
+    def shingles(self, text: str) -> Set[str]:
+        tokens = self.TOKEN_PATTERN.findall(text.lower())
+        if len(tokens) <= self.shingle_size:
+            return {" ".join(tokens)}
+        return {" ".join(tokens[i:i + self.shingle_size]) for i in range(len(tokens) - self.shingle_size + 1)}
+    
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) for shingle in self.shingles(text)),
+            dtype=np.uint64
+        ) % _PRIME
+        
+        # (num_perm, n_shingles) permuted hashes, minimum per permutation
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % _PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+    
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the underlying shingle sets"""
+        return float(np.mean(a == b))
+    
+    @staticmethod
+    def to_bytes(signature: np.ndarray) -> bytes:
+        return signature.astype(np.uint32).tobytes()
+    
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype=np.uint32)
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures
+    
+    With 16 bands of 8 rows, pairs at Jaccard 0.8 collide in some band ~95% of the time
+    while pairs below 0.5 almost never do; candidates are then verified exactly.
+    """
+    
+    def __init__(self, num_perm: int = 128, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.signatures: Dict[int, np.ndarray] = {}
+    
+    def __len__(self) -> int:
+        return len(self.signatures)
+    
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+    
+    def add(self, key: int, signature: np.ndarray):
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(key)
+    
+    def remove(self, key: int):
+        # Bucket entries are dropped lazily when candidates are resolved
+        self.signatures.pop(key, None)
+    
+    def candidates(self, signature: np.ndarray) -> Set[int]:
+        found = set()
+        for band_key in self._band_keys(signature):
+            bucket = self.buckets.get(band_key)
+            if bucket:
+                bucket[:] = [key for key in bucket if key in self.signatures]
+                found.update(bucket)
+        return found
+    
+    def find_duplicate(self, signature: np.ndarray, threshold: float) -> Optional[int]:
+        """Most similar indexed key at or above the threshold, if any"""
+        best_key, best_similarity = None, threshold
+        for key in self.candidates(signature):
+            similarity = MinHasher.similarity(signature, self.signatures[key])
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+        return best_key
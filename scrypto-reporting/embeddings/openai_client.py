@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+
+"""
+Scrypto OpenAI Client
+One wrapper around the OpenAI client shared by the vector database, the assistant and
+the change gatekeeper: token-bucket limits on requests and tokens per minute, adaptive
+(AIMD) concurrency driven by 429s, jittered exponential backoff and a circuit breaker
+that fails fast during outages. FaultInjectingOpenAI is a local stand-in for testing.
+"""
+
+import os
+import time
+import random
+import hashlib
+import argparse
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open"""
+    
+    def __init__(self, retry_in: float):
+        super().__init__(f"OpenAI API unavailable (circuit open), retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+def estimate_request_tokens(kwargs: Dict[str, Any]) -> int:
+    """Tokens a request will be charged for, counted before it is sent"""
+    if 'input' in kwargs:
+        texts = kwargs['input'] if isinstance(kwargs['input'], list) else [kwargs['input']]
+        return sum(estimate_tokens(str(text)) for text in texts)
+    
+    prompt = sum(estimate_tokens(str(message.get('content', ''))) for message in kwargs.get('messages', []))
+    return prompt + kwargs.get('max_tokens', 0)
+
+def classify_error(exc: Exception) -> str:
+    """'throttled' (429), 'transient' (5xx, timeouts, connection errors) or 'fatal'"""
+    status = getattr(exc, 'status_code', None)
+    if status == 429:
+        return 'throttled'
+    if status is not None:
+        return 'transient' if status >= 500 or status == 408 else 'fatal'
+    if isinstance(exc, (ConnectionError, TimeoutError)) or type(exc).__name__ in ('APIConnectionError', 'APITimeoutError'):
+        return 'transient'
+    return 'fatal'
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate"""
+    
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self, amount: float = 1.0):
+        """Block until `amount` tokens are available (oversized requests wait for a full bucket)"""
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            self.sleep(wait)
+    
+    def adjust(self, delta: float):
+        """Charge (or refund) the difference between estimated and actual usage"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight requests: +1 after a window of successes, halved on a 429"""
+    
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+    
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+    
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+    
+    def on_success(self):
+        with self.condition:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify()
+    
+    def on_throttle(self):
+        with self.condition:
+            self.limit = max(self.minimum, self.limit // 2)
+            self.successes = 0
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures; lets one probe through after the cool-down"""
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+    
+    def before_call(self):
+        with self.lock:
+            if self.state == 'closed':
+                return
+            remaining = self.opened_at + self.reset_timeout - self.clock()
+            if self.state == 'open' and remaining <= 0:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self.probing:
+                self.probing = True
+                return
+            raise CircuitOpenError(max(0.0, remaining))
+    
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.probing = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = self.clock()
+            self.probing = False
+    
+    @property
+    def is_open(self) -> bool:
+        return self.state == 'open'
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After when the API sends one"""
+    
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 rng: Optional[random.Random] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+    
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + self.rng.uniform(0, self.base_delay)
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+class _Endpoint:
+    """`.create(**kwargs)` routed through the wrapper's limits and retries"""
+    
+    def __init__(self, owner: 'ResilientOpenAIClient', create: Callable[..., Any]):
+        self.owner = owner
+        self._create = create
+    
+    def create(self, **kwargs):
+        return self.owner.request(self._create, kwargs)
+
+class ResilientOpenAIClient:
+    """Drop-in for the `embeddings.create` / `chat.completions.create` surface of openai.OpenAI"""
+    
+    def __init__(self, client=None,
+                 requests_per_minute: float = 3000,
+                 tokens_per_minute: float = 1000000,
+                 max_concurrency: int = 16,
+                 retry: Optional[RetryPolicy] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if client is None:
+            import openai
+            client = openai.OpenAI(max_retries=0)  # Retries are handled here
+        
+        self.client = client
+        self.sleep = sleep
+        self.requests = TokenBucket(requests_per_minute, clock=clock, sleep=sleep)
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock, sleep=sleep)
+        self.concurrency = AdaptiveConcurrency(initial=min(4, max_concurrency), maximum=max_concurrency)
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.stats = {'calls': 0, 'retries': 0, 'throttled': 0, 'transient_errors': 0, 'short_circuited': 0}
+        self.stats_lock = threading.Lock()
+        
+        self.embeddings = _Endpoint(self, client.embeddings.create)
+        self.chat = SimpleNamespace(completions=_Endpoint(self, client.chat.completions.create))
+    
+    def _count(self, name: str):
+        with self.stats_lock:
+            self.stats[name] += 1
+    
+    def request(self, create: Callable[..., Any], kwargs: Dict[str, Any]):
+        estimated = estimate_request_tokens(kwargs)
+        
+        for attempt in range(self.retry.max_attempts):
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count('short_circuited')
+                raise
+            
+            self.requests.acquire()
+            self.tokens.acquire(estimated)
+            self.concurrency.acquire()
+            self._count('calls')
+            
+            try:
+                response = create(**kwargs)
+            except Exception as exc:
+                kind = classify_error(exc)
+                if kind == 'fatal':
+                    # The API answered, so it is up; the request itself is bad
+                    self.breaker.record_success()
+                    raise
+                
+                if kind == 'throttled':
+                    # Also an answer: throttling is the concurrency limit's job, not the breaker's
+                    self._count('throttled')
+                    self.breaker.record_success()
+                    self.concurrency.on_throttle()
+                else:
+                    self._count('transient_errors')
+                    self.breaker.record_failure()
+                
+                if attempt + 1 == self.retry.max_attempts or self.breaker.is_open:
+                    raise
+                delay = self.retry.delay(attempt, retry_after_seconds(exc))
+            else:
+                self.breaker.record_success()
+                self.concurrency.on_success()
+                
+                usage = getattr(response, 'usage', None)
+                actual = getattr(usage, 'total_tokens', None)
+                if actual is not None:
+                    self.tokens.adjust(actual - estimated)
+                return response
+            finally:
+                self.concurrency.release()
+            
+            self._count('retries')
+            self.sleep(delay)
+    
+    def map_concurrent(self, fn: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        """Run fn over items on threads; the adaptive limit decides how many are in flight"""
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(len(items), self.concurrency.maximum)) as executor:
+            return list(executor.map(fn, items))
+
+_shared_client: Optional[ResilientOpenAIClient] = None
+_shared_lock = threading.Lock()
+
+def get_shared_client() -> ResilientOpenAIClient:
+    """Process-wide client so every component draws from the same rate limits
+    
+    Limits come from SCRYPTO_OPENAI_RPM, SCRYPTO_OPENAI_TPM and SCRYPTO_OPENAI_CONCURRENCY.
+    """
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = ResilientOpenAIClient(
+                requests_per_minute=float(os.environ.get('SCRYPTO_OPENAI_RPM', 3000)),
+                tokens_per_minute=float(os.environ.get('SCRYPTO_OPENAI_TPM', 1000000)),
+                max_concurrency=int(os.environ.get('SCRYPTO_OPENAI_CONCURRENCY', 16))
+            )
+        return _shared_client
+
+class StubAPIError(Exception):
+    """Error shaped like openai.APIStatusError (status_code, response.headers)"""
+    
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={'retry-after': str(retry_after)} if retry_after is not None else {})
+
+class FaultInjectingOpenAI:
+    """Local stand-in for openai.OpenAI that injects 429s, 5xx errors, latency and outages
+    
+    `max_concurrent` makes the stub throttle like a server at capacity, which is what the
+    adaptive concurrency limit reacts to. Embeddings are deterministic hashes of the text.
+    """
+    
+    def __init__(self, rate_limit_rate: float = 0.0, error_rate: float = 0.0,
+                 max_concurrent: Optional[int] = None, latency: float = 0.0,
+                 dimension: int = 8, seed: int = 0):
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.max_concurrent = max_concurrent
+        self.latency = latency
+        self.dimension = dimension
+        self.outage = False
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        
+        self.embeddings = SimpleNamespace(create=self._embeddings_create)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat_create))
+    
+    def _call(self, respond: Callable[[], Any]):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            over_capacity = self.max_concurrent is not None and self.in_flight > self.max_concurrent
+            roll = self.rng.random()
+        
+        try:
+            if self.outage:
+                raise StubAPIError(503, "Service unavailable")
+            if over_capacity or roll < self.rate_limit_rate:
+                raise StubAPIError(429, "Rate limit reached", retry_after=0.01)
+            if roll < self.rate_limit_rate + self.error_rate:
+                raise StubAPIError(500, "Internal server error")
+            if self.latency:
+                time.sleep(self.latency)
+            return respond()
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+    
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return [(digest[i % len(digest)] - 128) / 128.0 for i in range(self.dimension)]
+    
+    def _embeddings_create(self, model: str, input, **kwargs):
+        texts = input if isinstance(input, list) else [input]
+        tokens = sum(estimate_tokens(text) for text in texts)
+        return self._call(lambda: SimpleNamespace(
+            data=[SimpleNamespace(embedding=self._vector(text), index=i) for i, text in enumerate(texts)],
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens)
+        ))
+    
+    def _chat_create(self, model: str, messages: List[Dict[str, str]], max_tokens: int = 256, **kwargs):
+        prompt = sum(estimate_tokens(message['content']) for message in messages)
+        content = f"[stub {model}] {messages[-1]['content'][:60]}"
+        return self._call(lambda: SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(role='assistant', content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt, completion_tokens=estimate_tokens(content),
+                                  total_tokens=prompt + estimate_tokens(content))
+        ))
+
+def main():
+    """Exercise the client against the fault-injecting stub"""
+    parser = argparse.ArgumentParser(description="Simulate OpenAI traffic through the shared client")
+    parser.add_argument('--requests', type=int, default=200, help="Embedding calls to make")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.05, help="Fraction of random 429s")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="Fraction of random 500s")
+    parser.add_argument('--server-capacity', type=int, default=6, help="Concurrent calls before the stub throttles")
+    parser.add_argument('--rpm', type=float, default=60000, help="Requests per minute limit")
+    args = parser.parse_args()
+    
+    stub = FaultInjectingOpenAI(rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+                                max_concurrent=args.server_capacity, latency=0.005)
+    client = ResilientOpenAIClient(stub, requests_per_minute=args.rpm,
+                                   retry=RetryPolicy(base_delay=0.01, max_delay=0.2))
+    
+    started = time.perf_counter()
+    
+    def call(i: int) -> bool:
+        try:
+            client.embeddings.create(model="text-embedding-3-small", input=[f"chunk {i}"])
+            return True
+        except Exception:
+            return False
+    
+    # Counted from the results rather than a shared counter the worker threads would race on
+    failures = client.map_concurrent(call, list(range(args.requests))).count(False)
+    elapsed = time.perf_counter() - started
+    
+    print(f"📡 {args.requests} requests in {elapsed:.2f}s, {failures} failed after retries")
+    print(f"   API calls: {stub.calls}, stats: {client.stats}")
+    print(f"   Adaptive concurrency settled at {client.concurrency.limit} (server capacity {args.server_capacity})")
+    
+    # Outage: the breaker opens and later calls fail fast without reaching the API
+    stub.outage = True
+    before = stub.calls
+    outcomes = []
+    for i in range(20):
+        try:
+            client.embeddings.create(model="text-embedding-3-small", input=[f"outage {i}"])
+            outcomes.append('ok')
+        except CircuitOpenError:
+            outcomes.append('fast-fail')
+        except Exception:
+            outcomes.append('error')
+    
+    print(f"🔌 Outage: {outcomes.count('fast-fail')} of 20 calls failed fast, "
+          f"{stub.calls - before} reached the API, breaker {client.breaker.state}")
+
+if __name__ == "__main__":
+    main()
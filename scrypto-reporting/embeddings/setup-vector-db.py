@@ -2,29 +2,104 @@
 
 """
 Scrypto Vector Database Setup
-Extracts content from specs and code, creates embeddings using OpenAI, stores in SQLite
+Extracts content from specs and code, creates embeddings (OpenAI or local), stores in SQLite
 Based on Archon RAG techniques from /_eve_/repos/rag/Archon
 """
 
 import os
+import re
+import sys
 import json
+import zlib
 import sqlite3
+import fnmatch
 import hashlib
-from typing import List, Dict, Any
+import argparse
+import time
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Union, Callable
 from pathlib import Path
-import openai
 from datetime import datetime
 
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from embedding_providers import EmbeddingProvider, EmbeddingError, LocalEmbeddingProvider, get_embedding_provider
+from code_scanner import ScryptoCodeScanner
+from near_duplicates import MinHasher, LSHIndex
+from sharded_index import ShardPool, shard_stamp, ensure_shard_matrix, open_matrix, top_k_many
+from index_bundle import IndexBundle, write_bundle, import_bundle
+from index_watcher import watch
+
 class ScryptoVectorDB:
-    def __init__(self, db_path: str = "scrypto-intelligence.db"):
+    # Indexed columns of document_embeddings that searches can be filtered and faceted on
+    FILTER_COLUMNS = (
+        'source_type',
+        'file_path',
+        'relative_path',
+        'component_type',
+        'spec_type',
+        'directory',
+        'chunk_index'
+    )
+    
+    # Columns added after a table was first created; applied before schema.sql runs
+    MIGRATED_COLUMNS = {
+        'document_embeddings': [
+            ('embedding_provider', "TEXT DEFAULT 'openai'"),
+            ('embedding_dim', 'INTEGER'),
+            ('minhash', 'BLOB')
+        ],
+        'change_requests': [
+            ('risk_rank', 'INTEGER')
+        ],
+        'project_features': [
+            ('discovered_by_scanner', 'BOOLEAN DEFAULT FALSE')
+        ]
+    }
+    
+    # Candidates fetched per result by search_many when near-duplicates are collapsed
+    CANDIDATE_FACTOR = 4
+    
+    # Key directories scanned for code
+    CODE_DIRS = [
+        'app',
+        'components', 
+        'lib',
+        'hooks',
+        'schemas',
+        'config'
+    ]
+    
+    def __init__(self, db_path: str = "scrypto-intelligence.db",
+                 embedding_provider: Union[str, EmbeddingProvider, None] = None,
+                 dedup_threshold: Optional[float] = 0.85):
         self.db_path = db_path
-        self.openai_client = openai.OpenAI()
         self.init_database()
+        
+        # Near-duplicate chunks (estimated Jaccard >= threshold) share one embedding; None disables
+        self.dedup_threshold = dedup_threshold
+        self.minhasher = MinHasher()
+        self._lsh = None
+        self._lsh_model = None
+        self._corpus = None
+        # A reused chunk skips one embedding input and one vector row, so one counter covers both;
+        # a batch made only of reused chunks also skips its embedding request
+        self.dedup_stats = {'chunks': 0, 'embeddings_saved': 0, 'embedding_requests_saved': 0}
+        
+        if embedding_provider is None:
+            embedding_provider = os.environ.get('SCRYPTO_EMBEDDING_PROVIDER', 'openai')
+        if isinstance(embedding_provider, str):
+            embedding_provider = self.load_embedding_provider(embedding_provider)
+        
+        self.embedding_provider = embedding_provider
     
     def init_database(self):
         """Initialize the vector database with schema"""
         conn = sqlite3.connect(self.db_path)
         
+        self.migrate_schema(conn)
+        
         # Read and execute schema
         schema_path = Path(__file__).parent.parent / "database" / "schema.sql"
         with open(schema_path, 'r') as f:
@@ -34,6 +109,79 @@ class ScryptoVectorDB:
         conn.close()
         print(f"✅ Database initialized: {self.db_path}")
     
+    def migrate_schema(self, conn: sqlite3.Connection):
+        """Add columns that databases created by older schema versions are missing"""
+        for table, columns in self.MIGRATED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if not existing:
+                continue  # Fresh database, schema.sql creates the full table
+            
+            for column, definition in columns:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        
+        conn.commit()
+    
+    def load_embedding_provider(self, name: str) -> EmbeddingProvider:
+        """Create a provider by name, restoring fitted state from the database if it has any"""
+        if name != 'local':
+            return get_embedding_provider(name)
+        
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute("""
+            SELECT state FROM embedding_models
+            WHERE provider = 'local' AND state IS NOT NULL
+            ORDER BY created_at DESC, rowid DESC
+            LIMIT 1
+        """).fetchone()
+        conn.close()
+        
+        if row:
+            return LocalEmbeddingProvider.from_state(row[0])
+        return LocalEmbeddingProvider()
+    
+    def fit_embedding_provider(self, texts: List[str]):
+        """Fit a corpus-trained provider and persist its state alongside the vectors"""
+        print(f"\n🧮 Fitting {self.embedding_provider.name} embeddings on {len(texts)} chunks...")
+        self.embedding_provider.fit(texts)
+        
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            INSERT OR REPLACE INTO embedding_models 
+            (model_id, provider, dimension, state)
+            VALUES (?, ?, ?, ?)
+        """, (
+            self.embedding_provider.model_id,
+            self.embedding_provider.name,
+            self.embedding_provider.dimension,
+            self.embedding_provider.save_state()
+        ))
+        conn.commit()
+        conn.close()
+        print(f"✅ Embedding model ready: {self.embedding_provider.model_id}")
+    
+    def drop_other_models(self) -> int:
+        """Delete the vectors and fitted state of every model but the active one
+        
+        Called once a rebuild with the active model has committed, so searches never see
+        an empty index and superseded rows stop inflating facet counts and the file.
+        """
+        model_id = self.embedding_provider.model_id
+        
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            conn.execute("""
+                DELETE FROM chunk_sources
+                WHERE embedding_id IN (SELECT id FROM document_embeddings WHERE embedding_model IS NOT ?)
+            """, (model_id,))
+            removed = conn.execute("DELETE FROM document_embeddings WHERE embedding_model IS NOT ?",
+                                   (model_id,)).rowcount
+            conn.execute("DELETE FROM indexed_files WHERE embedding_model != ?", (model_id,))
+            conn.execute("DELETE FROM embedding_models WHERE model_id != ?", (model_id,))
+        conn.close()
+        
+        return removed
+    
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """Split text into overlapping chunks for embedding"""
         if len(text) <= chunk_size:
@@ -46,21 +194,336 @@ class ScryptoVectorDB:
             end = min(start + chunk_size, len(text))
             chunk = text[start:end]
             chunks.append(chunk)
+            if end == len(text):
+                break
             start = end - overlap
             
         return chunks
     
     def create_embedding(self, text: str) -> List[float]:
-        """Create embedding using OpenAI API"""
+        """Create embedding with the configured provider"""
+        return self.create_embeddings([text])[0]
+    
+    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for a batch of texts in as few provider calls as possible
+        
+        Raises EmbeddingError rather than returning empty vectors, so a failed batch is
+        never silently stored as missing chunks.
+        """
+        if not texts:
+            return []
+        
         try:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
-            return response.data[0].embedding
+            vectors = self.embedding_provider.embed(texts)
+        except EmbeddingError:
+            raise
         except Exception as e:
-            print(f"❌ Embedding failed: {e}")
-            return []
+            raise EmbeddingError(f"Embedding {len(texts)} texts with {self.embedding_provider.model_id} failed: {e}") from e
+        
+        if len(vectors) != len(texts) or not all(vectors):
+            raise EmbeddingError(f"{self.embedding_provider.model_id} returned incomplete embeddings")
+        return vectors
+    
+    def iter_spec_files(self, specs_dir: str) -> Iterator[Tuple[Path, str]]:
+        """Yield (spec file, content) for every markdown specification"""
+        for spec_file in Path(specs_dir).rglob("*.md"):
+            if spec_file.name.startswith('.'):
+                continue
+            
+            try:
+                with open(spec_file, 'r', encoding='utf-8') as f:
+                    yield spec_file, f.read()
+            except Exception as e:
+                print(f"❌ Error reading {spec_file}: {e}")
+    
+    def iter_code_files(self, project_dir: str) -> Iterator[Tuple[Path, str, str]]:
+        """Yield (code file, top-level directory, content) for indexable TypeScript files"""
+        project_path = Path(project_dir)
+        
+        for dir_name in self.CODE_DIRS:
+            dir_path = project_path / dir_name
+            if not dir_path.exists():
+                continue
+                
+            for code_file in dir_path.rglob("*.ts*"):
+                if 'node_modules' in str(code_file) or '.next' in str(code_file):
+                    continue
+                
+                try:
+                    with open(code_file, 'r', encoding='utf-8') as f:
+                        content = f.read()
+                except Exception as e:
+                    print(f"❌ Error reading {code_file}: {e}")
+                    continue
+                
+                if not self.is_indexable_code(content):
+                    continue
+                
+                yield code_file, dir_name, content
+    
+    def is_indexable_code(self, content: str) -> bool:
+        # Skip very large files or binary content
+        return 100 <= len(content) <= 50000
+    
+    def classify_path(self, path: Path, specs_path: Path, project_path: Path) -> Optional[Tuple[str, Optional[str]]]:
+        """('spec', None) or ('code', top-level directory) for a path the build would index"""
+        if 'node_modules' in str(path) or '.next' in str(path) or path.name.startswith('.'):
+            return None
+        
+        if path.suffix == '.md' and path.is_relative_to(specs_path):
+            return 'spec', None
+        
+        if path.is_relative_to(project_path) and fnmatch.fnmatch(path.name, '*.ts*'):
+            parts = path.relative_to(project_path).parts
+            if len(parts) > 1 and parts[0] in self.CODE_DIRS:
+                return 'code', parts[0]
+        
+        return None
+    
+    def classify_code_file(self, code_file: Path) -> str:
+        """Determine component type from file name and location"""
+        if 'page.tsx' in code_file.name:
+            return 'page'
+        elif 'route.ts' in code_file.name:
+            return 'api_route'
+        elif code_file.parent.name == 'schemas':
+            return 'schema'
+        elif code_file.parent.name == 'hooks':
+            return 'hook'
+        elif 'layout' in code_file.name.lower():
+            return 'layout'
+        elif code_file.parent.name == 'config':
+            return 'config'
+        else:
+            return 'component'
+    
+    def build_spec_chunks(self, spec_file: Path, specs_path: Path, content: str) -> List[Dict[str, Any]]:
+        """Chunk a specification into rows ready for embedding"""
+        # Extract metadata from path
+        relative_path = spec_file.relative_to(specs_path)
+        path_parts = relative_path.parts
+        
+        spec_type = path_parts[0] if len(path_parts) > 1 else 'general'
+        title = spec_file.stem
+        
+        chunks = self.chunk_text(content)
+        records = []
+        
+        for i, chunk in enumerate(chunks):
+            if len(chunk.strip()) < 50:  # Skip very small chunks
+                continue
+            
+            # Create unique chunk ID
+            chunk_id = hashlib.md5(f"{relative_path}_{i}_{chunk[:100]}".encode()).hexdigest()
+            
+            records.append({
+                'source_type': 'spec',
+                'content': chunk,
+                'tags': [spec_type, title, str(relative_path)],
+                'metadata': {
+                    'file_path': str(spec_file),
+                    'relative_path': str(relative_path),
+                    'chunk_id': chunk_id,
+                    'chunk_index': i,
+                    'chunk_count': len(chunks),
+                    'spec_type': spec_type,
+                    'title': title
+                }
+            })
+        
+        return records
+    
+    def build_code_chunks(self, code_file: Path, project_path: Path, dir_name: str, content: str) -> List[Dict[str, Any]]:
+        """Chunk a code file into rows ready for embedding"""
+        relative_path = code_file.relative_to(project_path)
+        component_type = self.classify_code_file(code_file)
+        
+        # Create smaller chunks for code (500 chars with 100 overlap)
+        chunks = self.chunk_text(content, chunk_size=500, overlap=100)
+        records = []
+        
+        for i, chunk in enumerate(chunks):
+            if len(chunk.strip()) < 50:
+                continue
+            
+            records.append({
+                'source_type': 'code',
+                'content': chunk,
+                'tags': [component_type, dir_name, code_file.stem],
+                'metadata': {
+                    'file_path': str(code_file),
+                    'relative_path': str(relative_path),
+                    'component_type': component_type,
+                    'directory': dir_name,
+                    'chunk_index': i,
+                    'lines_of_code': len(content.split('\n'))
+                }
+            })
+        
+        return records
+    
+    def collect_chunks(self, specs_dir: str, project_dir: str) -> List[Dict[str, Any]]:
+        """All spec and code chunks, e.g. as a training corpus for a local provider"""
+        specs_path = Path(specs_dir)
+        project_path = Path(project_dir)
+        records = []
+        
+        for spec_file, content in self.iter_spec_files(specs_dir):
+            records.extend(self.build_spec_chunks(spec_file, specs_path, content))
+        
+        for code_file, dir_name, content in self.iter_code_files(project_dir):
+            records.extend(self.build_code_chunks(code_file, project_path, dir_name, content))
+        
+        return records
+    
+    def lsh_index(self, cursor: sqlite3.Cursor) -> LSHIndex:
+        """LSH over the stored signatures of the active model, loaded once per instance"""
+        model_id = self.embedding_provider.model_id
+        
+        if self._lsh is None or self._lsh_model != model_id:
+            self._lsh = LSHIndex(self.minhasher.num_perm)
+            self._lsh_model = model_id
+            
+            cursor.execute("""
+                SELECT id, minhash FROM document_embeddings
+                WHERE embedding_model = ? AND minhash IS NOT NULL
+            """, (model_id,))
+            for embedding_id, minhash in cursor.fetchall():
+                self._lsh.add(embedding_id, MinHasher.from_bytes(minhash))
+        
+        return self._lsh
+    
+    def remove_file_chunks(self, cursor: sqlite3.Cursor, file_path: str, model_id: str):
+        """Remove a file's chunks for a model, keeping shared embeddings alive for other files
+        
+        An embedding whose primary location is this file is handed over to its next
+        recorded duplicate location instead of being deleted.
+        """
+        cursor.execute("""
+            DELETE FROM chunk_sources
+            WHERE file_path = ?
+              AND embedding_id IN (SELECT id FROM document_embeddings WHERE embedding_model = ?)
+        """, (file_path, model_id))
+        
+        cursor.execute("""
+            SELECT id FROM document_embeddings
+            WHERE file_path = ? AND embedding_model = ?
+        """, (file_path, model_id))
+        
+        for (embedding_id,) in cursor.fetchall():
+            source = cursor.execute("""
+                SELECT id, source_type, tags, metadata FROM chunk_sources
+                WHERE embedding_id = ?
+                ORDER BY id
+                LIMIT 1
+            """, (embedding_id,)).fetchone()
+            
+            if source:
+                cursor.execute("""
+                    UPDATE document_embeddings SET source_type = ?, tags = ?, metadata = ?
+                    WHERE id = ?
+                """, (source[1], source[2], source[3], embedding_id))
+                cursor.execute("DELETE FROM chunk_sources WHERE id = ?", (source[0],))
+            else:
+                cursor.execute("DELETE FROM document_embeddings WHERE id = ?", (embedding_id,))
+                if self._lsh is not None and self._lsh_model == model_id:
+                    self._lsh.remove(embedding_id)
+    
+    def store_chunks(self, cursor: sqlite3.Cursor, records: List[Dict[str, Any]]) -> int:
+        """Embed a file's unique chunks in one batch, linking near-duplicates to existing rows
+        
+        Runs inside a savepoint: if embedding fails, the file keeps its previous chunks.
+        """
+        if not records:
+            return 0
+        
+        cursor.execute("SAVEPOINT store_chunks")
+        try:
+            stored = self._store_chunks(cursor, records)
+        except Exception:
+            cursor.execute("ROLLBACK TO store_chunks")
+            cursor.execute("RELEASE store_chunks")
+            self._lsh = None  # The in-memory index no longer matches the rolled-back rows
+            raise
+        
+        cursor.execute("RELEASE store_chunks")
+        return stored
+    
+    def _store_chunks(self, cursor: sqlite3.Cursor, records: List[Dict[str, Any]]) -> int:
+        model_id = self.embedding_provider.model_id
+        
+        # Re-indexing a file replaces its previous chunks for this model only
+        for file_path in {record['metadata']['file_path'] for record in records}:
+            self.remove_file_chunks(cursor, file_path, model_id)
+        
+        # Resolve near-duplicates before paying for embeddings. Chunks pending in this
+        # batch sit in the LSH under negative keys until they have a row id.
+        lsh = self.lsh_index(cursor) if self.dedup_threshold is not None else None
+        unique = []
+        duplicates = []
+        
+        for record in records:
+            self.dedup_stats['chunks'] += 1
+            signature = self.minhasher.signature(record['content']) if lsh is not None else None
+            
+            target = lsh.find_duplicate(signature, self.dedup_threshold) if lsh is not None else None
+            if target is not None:
+                similarity = MinHasher.similarity(signature, lsh.signatures[target])
+                duplicates.append((record, target, similarity))
+                continue
+            
+            if lsh is not None:
+                lsh.add(-1 - len(unique), signature)
+            unique.append((record, signature))
+        
+        embeddings = self.create_embeddings([record['content'] for record, _ in unique])
+        row_ids = {}
+        
+        for index, ((record, signature), embedding) in enumerate(zip(unique, embeddings)):
+            if lsh is not None:
+                lsh.remove(-1 - index)
+            
+            cursor.execute("""
+                INSERT INTO document_embeddings 
+                (source_type, content_chunk, embedding_vector, embedding_model,
+                 embedding_provider, embedding_dim, tags, metadata, minhash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                record['source_type'],
+                record['content'],
+                json.dumps(embedding),
+                model_id,
+                self.embedding_provider.name,
+                len(embedding),
+                json.dumps(record['tags']),
+                json.dumps(record['metadata']),
+                MinHasher.to_bytes(signature) if signature is not None else None
+            ))
+            row_ids[-1 - index] = cursor.lastrowid
+            
+            if lsh is not None:
+                lsh.add(cursor.lastrowid, signature)
+        
+        if duplicates and not unique:
+            self.dedup_stats['embedding_requests_saved'] += 1
+        
+        for record, target, similarity in duplicates:
+            embedding_id = row_ids[target] if target < 0 else target
+            
+            cursor.execute("""
+                INSERT INTO chunk_sources 
+                (embedding_id, source_type, similarity, tags, metadata)
+                VALUES (?, ?, ?, ?, ?)
+            """, (
+                embedding_id,
+                record['source_type'],
+                similarity,
+                json.dumps(record['tags']),
+                json.dumps(record['metadata'])
+            ))
+            self.dedup_stats['embeddings_saved'] += 1
+        
+        return len(row_ids)
     
     def process_specifications(self, specs_dir: str):
         """Process all specification files and create embeddings"""
@@ -71,69 +534,17 @@ class ScryptoVectorDB:
         
         specs_path = Path(specs_dir)
         
-        for spec_file in specs_path.rglob("*.md"):
-            if spec_file.name.startswith('.'):
-                continue
-                
+        for spec_file, content in self.iter_spec_files(specs_dir):
             try:
-                with open(spec_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Extract metadata from path
                 relative_path = spec_file.relative_to(specs_path)
-                path_parts = relative_path.parts
-                
-                spec_type = path_parts[0] if len(path_parts) > 1 else 'general'
-                title = spec_file.stem
-                
                 print(f"📄 Processing: {relative_path}")
                 
-                # Create chunks and embeddings
-                chunks = self.chunk_text(content)
-                
-                for i, chunk in enumerate(chunks):
-                    if len(chunk.strip()) < 50:  # Skip very small chunks
-                        continue
-                    
-                    embedding = self.create_embedding(chunk)
-                    if not embedding:
-                        continue
-                    
-                    # Create unique chunk ID
-                    chunk_id = hashlib.md5(f"{relative_path}_{i}_{chunk[:100]}".encode()).hexdigest()
-                    
-                    # Store embedding
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO document_embeddings 
-                        (source_type, content_chunk, embedding_vector, tags, metadata)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (
-                        'spec',
-                        chunk,
-                        json.dumps(embedding),
-                        json.dumps([spec_type, title, str(relative_path)]),
-                        json.dumps({
-                            'file_path': str(spec_file),
-                            'relative_path': str(relative_path),
-                            'chunk_index': i,
-                            'chunk_count': len(chunks),
-                            'spec_type': spec_type,
-                            'title': title
-                        })
-                    ))
+                records = self.build_spec_chunks(spec_file, specs_path, content)
+                self.store_chunks(cursor, records)
+                self.record_indexed_file(cursor, spec_file, spec_file.stat(), content)
                 
                 # Also store in specifications table
-                cursor.execute("""
-                    INSERT OR REPLACE INTO specifications 
-                    (spec_type, title, content, file_path, version)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    spec_type,
-                    title,
-                    content,
-                    str(spec_file),
-                    '1.0'
-                ))
+                self.store_specification(cursor, spec_file, specs_path, content)
                 
             except Exception as e:
                 print(f"❌ Error processing {spec_file}: {e}")
@@ -142,6 +553,28 @@ class ScryptoVectorDB:
         conn.close()
         print("✅ Specifications processing complete")
     
+    def store_specification(self, cursor: sqlite3.Cursor, spec_file: Path, specs_path: Path, content: str):
+        """Record a whole specification document in the specifications table"""
+        path_parts = spec_file.relative_to(specs_path).parts
+        spec_type = path_parts[0] if len(path_parts) > 1 else 'general'
+        
+        cursor.execute("""
+            INSERT INTO specifications 
+            (spec_type, title, content, file_path, version)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(file_path) DO UPDATE SET
+                spec_type = excluded.spec_type,
+                title = excluded.title,
+                content = excluded.content,
+                updated_at = CURRENT_TIMESTAMP
+        """, (
+            spec_type,
+            spec_file.stem,
+            content,
+            str(spec_file),
+            '1.0'
+        ))
+    
     def process_code_files(self, project_dir: str):
         """Process TypeScript/JavaScript files and create embeddings"""
         print("\n💻 Processing code files...")
@@ -151,91 +584,212 @@ class ScryptoVectorDB:
         
         project_path = Path(project_dir)
         
-        # Focus on key directories
-        code_dirs = [
-            'app',
-            'components', 
-            'lib',
-            'hooks',
-            'schemas',
-            'config'
-        ]
+        for code_file, dir_name, content in self.iter_code_files(project_dir):
+            try:
+                relative_path = code_file.relative_to(project_path)
+                print(f"💻 Processing: {relative_path}")
+                
+                records = self.build_code_chunks(code_file, project_path, dir_name, content)
+                self.store_chunks(cursor, records)
+                self.record_indexed_file(cursor, code_file, code_file.stat(), content)
+            
+            except Exception as e:
+                print(f"❌ Error processing {code_file}: {e}")
         
-        for dir_name in code_dirs:
-            dir_path = project_path / dir_name
-            if not dir_path.exists():
-                continue
+        conn.commit()
+        conn.close()
+        print("✅ Code processing complete")
+    
+    def reindex_paths(self, paths: Iterable[Path], specs_dir: str, project_dir: str) -> Dict[str, Any]:
+        """Re-chunk and re-embed changed files and drop deleted ones, in one transaction
+        
+        In WAL mode readers keep seeing the previous index until the commit, so a file is
+        never visible half re-indexed. A file whose embedding fails keeps its old chunks.
+        A path that no longer exists removes every indexed file at or below it.
+        """
+        specs_path = Path(specs_dir)
+        project_path = Path(project_dir)
+        model_id = self.embedding_provider.model_id
+        stats = {'changed': 0, 'removed': 0, 'chunks': 0, 'failed': []}
+        
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        try:
+            for path in sorted(set(paths)):
+                if not path.exists():
+                    stats['removed'] += self.remove_indexed_paths(cursor, path, model_id)
+                    continue
                 
-            for code_file in dir_path.rglob("*.ts*"):
-                if 'node_modules' in str(code_file) or '.next' in str(code_file):
+                kind = self.classify_path(path, specs_path, project_path) if path.is_file() else None
+                if kind is None:
                     continue
                 
                 try:
-                    with open(code_file, 'r', encoding='utf-8') as f:
+                    # Stat before reading: an edit landing mid-read then still looks stale next time
+                    stat = path.stat()
+                    with open(path, 'r', encoding='utf-8') as f:
                         content = f.read()
                     
-                    # Skip very large files or binary content
-                    if len(content) > 50000 or len(content) < 100:
-                        continue
-                    
-                    relative_path = code_file.relative_to(project_path)
-                    
-                    # Determine component type
-                    if 'page.tsx' in code_file.name:
-                        component_type = 'page'
-                    elif 'route.ts' in code_file.name:
-                        component_type = 'api_route'
-                    elif code_file.parent.name == 'schemas':
-                        component_type = 'schema'
-                    elif code_file.parent.name == 'hooks':
-                        component_type = 'hook'
-                    elif 'layout' in code_file.name.lower():
-                        component_type = 'layout'
-                    elif code_file.parent.name == 'config':
-                        component_type = 'config'
+                    if kind[0] == 'spec':
+                        records = self.build_spec_chunks(path, specs_path, content)
+                    elif self.is_indexable_code(content):
+                        records = self.build_code_chunks(path, project_path, kind[1], content)
                     else:
-                        component_type = 'component'
+                        records = []
                     
-                    print(f"💻 Processing: {relative_path}")
+                    if records:
+                        stats['chunks'] += self.store_chunks(cursor, records)
+                    else:
+                        self.remove_file_chunks(cursor, str(path), model_id)
+                    self.record_indexed_file(cursor, path, stat, content)
                     
-                    # Create smaller chunks for code (500 chars with 100 overlap)
-                    chunks = self.chunk_text(content, chunk_size=500, overlap=100)
+                    stats['changed'] += 1
                     
-                    for i, chunk in enumerate(chunks):
-                        if len(chunk.strip()) < 50:
-                            continue
-                        
-                        embedding = self.create_embedding(chunk)
-                        if not embedding:
-                            continue
-                        
-                        cursor.execute("""
-                            INSERT OR REPLACE INTO document_embeddings 
-                            (source_type, content_chunk, embedding_vector, tags, metadata)
-                            VALUES (?, ?, ?, ?, ?)
-                        """, (
-                            'code',
-                            chunk,
-                            json.dumps(embedding),
-                            json.dumps([component_type, dir_name, code_file.stem]),
-                            json.dumps({
-                                'file_path': str(code_file),
-                                'relative_path': str(relative_path),
-                                'component_type': component_type,
-                                'directory': dir_name,
-                                'chunk_index': i,
-                                'lines_of_code': len(content.split('\n'))
-                            })
-                        ))
+                    if kind[0] == 'spec':
+                        try:
+                            self.store_specification(cursor, path, specs_path, content)
+                        except sqlite3.IntegrityError as e:
+                            print(f"⚠️ {path.name} not recorded in specifications: {e}")
                 
                 except Exception as e:
-                    print(f"❌ Error processing {code_file}: {e}")
+                    print(f"❌ Error re-indexing {path}: {e}")
+                    stats['failed'].append(str(path))
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self._lsh = None
+            raise
+        finally:
+            conn.close()
+        
+        return stats
+    
+    def remove_indexed_paths(self, cursor: sqlite3.Cursor, path: Path, model_id: str) -> int:
+        """Remove the chunks of a deleted file, or of every file under a deleted directory"""
+        # Everything below the directory sorts between its prefix and prefix + the highest code point
+        prefix = str(path) + os.sep
+        bounds = (str(path), prefix, prefix + chr(0x10FFFF))
+        
+        cursor.execute("""
+            SELECT file_path FROM document_embeddings
+            WHERE embedding_model = ? AND (file_path = ? OR (file_path > ? AND file_path < ?))
+            UNION
+            SELECT s.file_path FROM chunk_sources s
+            JOIN document_embeddings e ON e.id = s.embedding_id
+            WHERE e.embedding_model = ? AND (s.file_path = ? OR (s.file_path > ? AND s.file_path < ?))
+        """, (model_id, *bounds, model_id, *bounds))
+        file_paths = [row[0] for row in cursor.fetchall()]
+        
+        for file_path in file_paths:
+            self.remove_file_chunks(cursor, file_path, model_id)
+        
+        cursor.execute("""
+            DELETE FROM indexed_files
+            WHERE embedding_model = ? AND (file_path = ? OR (file_path > ? AND file_path < ?))
+        """, (model_id, *bounds))
+        
+        cursor.execute("""
+            DELETE FROM specifications WHERE file_path = ? OR (file_path > ? AND file_path < ?)
+        """, bounds)
+        
+        return len(file_paths)
+    
+    def record_indexed_file(self, cursor: sqlite3.Cursor, path: Path, stat: os.stat_result, content: str):
+        """Remember the version of a file the active model's chunks were built from"""
+        cursor.execute("""
+            INSERT OR REPLACE INTO indexed_files
+            (file_path, embedding_model, mtime_ns, file_size, content_hash, indexed_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (str(path), self.embedding_provider.model_id, stat.st_mtime_ns, stat.st_size,
+              hashlib.sha256(content.encode('utf-8')).hexdigest()))
+    
+    def stale_paths(self, specs_dir: str, project_dir: str) -> List[Path]:
+        """Files edited, added or deleted since they were last indexed (e.g. while no watcher ran)
+        
+        A file is current when its mtime (ns) and size match indexed_files, or when only its
+        mtime moved and the content hash is unchanged. Files indexed before indexed_files
+        existed have no row and are re-indexed once.
+        """
+        specs_path = Path(specs_dir)
+        project_path = Path(project_dir)
+        model_id = self.embedding_provider.model_id
+        
+        conn = sqlite3.connect(self.db_path)
+        indexed = {file_path: (mtime_ns, file_size, content_hash)
+                   for file_path, mtime_ns, file_size, content_hash in conn.execute("""
+            SELECT file_path, mtime_ns, file_size, content_hash FROM indexed_files WHERE embedding_model = ?
+        """, (model_id,))}
+        chunked = {file_path for (file_path,) in conn.execute("""
+            SELECT file_path FROM document_embeddings WHERE embedding_model = ?
+            UNION
+            SELECT s.file_path FROM chunk_sources s
+            JOIN document_embeddings e ON e.id = s.embedding_id
+            WHERE e.embedding_model = ?
+        """, (model_id, model_id))}
+        conn.close()
+        
+        candidates = list(specs_path.rglob("*.md"))
+        for dir_name in self.CODE_DIRS:
+            if (project_path / dir_name).exists():
+                candidates.extend((project_path / dir_name).rglob("*.ts*"))
+        
+        stale = []
+        on_disk = set()
+        for path in candidates:
+            kind = self.classify_path(path, specs_path, project_path)
+            if kind is None:
+                continue
+            on_disk.add(str(path))
+            if self.is_stale(path, kind, indexed.get(str(path)), str(path) in chunked):
+                stale.append(path)
+        
+        for file_path in (indexed.keys() | chunked) - on_disk:
+            if file_path and self.classify_path(Path(file_path), specs_path, project_path) is not None:
+                stale.append(Path(file_path))
+        return stale
+    
+    def is_stale(self, path: Path, kind: Tuple[str, Optional[str]],
+                 indexed: Optional[Tuple[int, int, str]], chunked: bool) -> bool:
+        try:
+            stat = path.stat()
+            if indexed and (stat.st_mtime_ns, stat.st_size) == indexed[:2]:
+                return False
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            return True  # Let reindex_paths report it
+        
+        if indexed:
+            # Touched, checked out or copied without an edit
+            return hashlib.sha256(content.encode('utf-8')).hexdigest() != indexed[2]
+        # Never recorded: code that is not worth indexing has nothing to catch up on
+        return chunked or kind[0] == 'spec' or self.is_indexable_code(content)
+    
+    def log_refresh(self, stats: Dict[str, Any], reindex_ms: float, lags_ms: List[float]):
+        """Record one watch-mode refresh and how far the index trailed the files on disk"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        
+        conn.execute("""
+            INSERT INTO index_refresh_log
+            (files_changed, files_removed, chunks_embedded, failures, reindex_ms, lag_ms_max, lag_ms_avg)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            stats['changed'],
+            stats['removed'],
+            stats['chunks'],
+            len(stats['failed']),
+            reindex_ms,
+            max(lags_ms) if lags_ms else None,
+            sum(lags_ms) / len(lags_ms) if lags_ms else None
+        ))
         
         conn.commit()
         conn.close()
-        print("✅ Code processing complete")
     
-    def create_project_knowledge_graph(self):
+    def create_project_knowledge_graph(self, project_dir: Optional[str] = None):
         """Create relationships between features, specs, and code"""
         print("\n🔗 Building knowledge graph...")
         
@@ -260,34 +814,145 @@ class ScryptoVectorDB:
         ]
         
         for domain, group, item, status in features:
+            # Upsert keeps the feature id stable for rows that reference it
             cursor.execute("""
-                INSERT OR REPLACE INTO project_features 
+                INSERT INTO project_features 
                 (domain, group_name, item, implementation_status)
                 VALUES (?, ?, ?, ?)
+                ON CONFLICT(domain, group_name, item) DO UPDATE SET
+                    implementation_status = excluded.implementation_status,
+                    discovered_by_scanner = FALSE,
+                    updated_at = CURRENT_TIMESTAMP
             """, (domain, group, item, status))
         
         conn.commit()
         conn.close()
         print("✅ Knowledge graph seeded")
+        
+        # Discover the rest of the features and link code, endpoints and tests to them
+        if project_dir:
+            stats = ScryptoCodeScanner(self.db_path, project_dir).scan()
+            print(f"✅ Code scan: {stats['parsed']} files parsed, {stats['unchanged']} unchanged, {stats['removed']} removed")
+    
+    def export_bundle(self, out_dir: str, dtype: str = 'float32', ann: bool = True,
+                      nlist: Optional[int] = None, versioned: bool = True) -> Dict[str, Any]:
+        """Write the active model's vectors as a memory-mappable bundle (see index_bundle)"""
+        return write_bundle(self.db_path, out_dir, model_id=self.embedding_provider.model_id,
+                            dtype=dtype, ann=ann, nlist=nlist, versioned=versioned)
+    
+    def import_bundle(self, bundle_dir: str, verify: bool = True) -> int:
+        """Load a bundle's vectors, dedup signatures and provider state into this database"""
+        bundle = IndexBundle(bundle_dir, verify=verify)
+        count = import_bundle(bundle, self.db_path)
+        
+        self.embedding_provider = bundle.embedding_provider()
+        self._lsh = None
+        return count
+    
+    def build_filter_clause(self, filters: Optional[Dict[str, Any]], include_sources: bool = False,
+                            model_id: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Translate a facet filter dict into a WHERE clause over the indexed columns
+        
+        Values may be a scalar (equality), a list/tuple/set (IN) or None (IS NULL),
+        e.g. {'source_type': 'code', 'component_type': ['api_route', 'page']}.
+        With include_sources, a row also matches through any of its deduplicated
+        locations in chunk_sources. With model_id, only that model's rows match.
+        """
+        conditions = []
+        params: List[Any] = []
+        
+        for column, value in (filters or {}).items():
+            if column not in self.FILTER_COLUMNS:
+                raise ValueError(f"Unsupported filter column: {column}")
+            
+            if value is None:
+                conditions.append(f"{column} IS NULL")
+            elif isinstance(value, (list, tuple, set)):
+                values = list(value)
+                if not values:
+                    conditions.append("0")
+                    continue
+                placeholders = ", ".join("?" for _ in values)
+                conditions.append(f"{column} IN ({placeholders})")
+                params.extend(values)
+            else:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        
+        clauses = []
+        clause_params: List[Any] = []
+        if model_id is not None:
+            clauses.append("embedding_model = ?")
+            clause_params.append(model_id)
+        
+        if conditions:
+            condition = " AND ".join(conditions)
+            if include_sources:
+                clauses.append(f"(({condition}) OR id IN (SELECT embedding_id FROM chunk_sources WHERE {condition}))")
+                clause_params.extend(params + params)
+            else:
+                clauses.append(f"({condition})")
+                clause_params.extend(params)
+        
+        if not clauses:
+            return "", []
+        return "WHERE " + " AND ".join(clauses), clause_params
+    
+    def facet_counts(self, facet: str, filters: Optional[Dict[str, Any]] = None) -> Dict[Any, int]:
+        """Count the active model's chunks per value of an indexed column (e.g. component_type)"""
+        if facet not in self.FILTER_COLUMNS:
+            raise ValueError(f"Unsupported facet column: {facet}")
+        
+        where_clause, params = self.build_filter_clause(filters, model_id=self.embedding_provider.model_id)
+        where_clause = f"{where_clause} AND {facet} IS NOT NULL"
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        # Grouping on an indexed column is answered by an index scan, not a table scan
+        cursor.execute(f"""
+            SELECT {facet}, COUNT(*)
+            FROM document_embeddings
+            {where_clause}
+            GROUP BY {facet}
+            ORDER BY COUNT(*) DESC
+        """, params)
+        
+        counts = {value: count for value, count in cursor.fetchall()}
+        conn.close()
+        
+        return counts
     
-    def semantic_search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search for relevant content using semantic similarity"""
+    def semantic_search(self, query: str, limit: int = 5,
+                        filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search for relevant content using semantic similarity
+        
+        `filters` restricts the candidate rows (see build_filter_clause) before any
+        vector is decoded or scored.
+        """
+        # Only vectors produced by the active model are comparable with the query
+        where_clause, params = self.build_filter_clause(filters, include_sources=True,
+                                                        model_id=self.embedding_provider.model_id)
+        
         query_embedding = self.create_embedding(query)
-        if not query_embedding:
-            return []
+        
+        where_clause += " AND embedding_dim = ?"
+        params.append(len(query_embedding))
         
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Get all embeddings and calculate cosine similarity
-        cursor.execute("""
-            SELECT id, content_chunk, embedding_vector, tags, metadata
+        # Get candidate embeddings and calculate cosine similarity
+        cursor.execute(f"""
+            SELECT id, content_chunk, embedding_vector, tags, metadata, minhash
             FROM document_embeddings
-        """)
+            {where_clause}
+        """, params)
         
         results = []
+        signatures = {}
         for row in cursor.fetchall():
-            doc_id, content, embedding_json, tags, metadata = row
+            doc_id, content, embedding_json, tags, metadata, minhash = row
             
             try:
                 doc_embedding = json.loads(embedding_json)
@@ -302,14 +967,200 @@ class ScryptoVectorDB:
                     'tags': json.loads(tags),
                     'metadata': json.loads(metadata)
                 })
+                if minhash:
+                    signatures[doc_id] = MinHasher.from_bytes(minhash)
             except:
                 continue
         
         # Sort by similarity and return top results
         results.sort(key=lambda x: x['similarity'], reverse=True)
+        results = self.collapse_duplicates(results, signatures, limit)
+        self.attach_duplicate_sources(cursor, results)
+        conn.close()
+        
+        return results
+    
+    def keyword_search(self, query: str, limit: int = 5,
+                       filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """BM25 full-text search over chunk text and paths (document_fts), no embeddings needed"""
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return []
+        
+        where_clause, params = self.build_filter_clause(filters, include_sources=True,
+                                                        model_id=self.embedding_provider.model_id)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        # Any term may match; bm25 ranks chunks matching more (and rarer) terms first
+        cursor.execute(f"""
+            SELECT e.id, e.content_chunk, e.tags, e.metadata, m.score
+            FROM (
+                SELECT rowid AS match_id, bm25(document_fts) AS score
+                FROM document_fts
+                WHERE document_fts MATCH ?
+            ) m
+            JOIN (
+                SELECT id, content_chunk, tags, metadata FROM document_embeddings
+                {where_clause}
+            ) e ON e.id = m.match_id
+            ORDER BY m.score
+            LIMIT ?
+        """, [" OR ".join(f'"{term}"' for term in terms)] + params + [limit])
+        
+        results = [{
+            'id': doc_id,
+            'content': content,
+            'score': -score,
+            'tags': json.loads(tags),
+            'metadata': json.loads(metadata),
+            'duplicates': []
+        } for doc_id, content, tags, metadata, score in cursor.fetchall()]
+        
+        self.attach_duplicate_sources(cursor, results)
         conn.close()
         
-        return results[:limit]
+        return results
+    
+    def hybrid_search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None,
+                      rrf_k: int = 60) -> List[Dict[str, Any]]:
+        """Reciprocal rank fusion of semantic and keyword results
+        
+        Each list contributes 1 / (rrf_k + rank) per chunk, so chunks ranked well by
+        both methods rise to the top without calibrating cosine against bm25 scores.
+        """
+        candidates = limit * 4
+        fused: Dict[int, Dict[str, Any]] = {}
+        
+        for ranked in (self.semantic_search(query, candidates, filters),
+                       self.keyword_search(query, candidates, filters)):
+            for rank, result in enumerate(ranked, start=1):
+                entry = fused.setdefault(result['id'], dict(result, score=0.0))
+                entry['score'] += 1.0 / (rrf_k + rank)
+        
+        return sorted(fused.values(), key=lambda result: result['score'], reverse=True)[:limit]
+    
+    def corpus_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Row-normalized float32 vectors of the active model and their row ids
+        
+        Exported next to the database the first time and re-exported whenever the stored
+        vectors change, then memory-mapped, so batch search never parses JSON vectors.
+        """
+        header = ensure_shard_matrix(self.db_path, self.embedding_provider.model_id)
+        if self._corpus is None or self._corpus[0] != header:
+            self._corpus = (header, *open_matrix(self.db_path, header))
+        return self._corpus[1], self._corpus[2]
+    
+    def search_many(self, queries: List[str], k: int = 5, filters: Optional[Dict[str, Any]] = None,
+                    block_rows: int = 16384, query_block: int = 256) -> List[List[Dict[str, Any]]]:
+        """Top-k semantic results for each query in one pass
+        
+        All queries are embedded in one batched call and scored against the corpus matrix
+        with blocked matrix-matrix products (see top_k_many). Results have the same shape
+        as semantic_search, including near-duplicate collapsing and `filters`.
+        """
+        if not queries:
+            return []
+        
+        query_vectors = np.asarray(self.create_embeddings(queries), dtype=np.float32)
+        norms = np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        query_vectors /= norms
+        
+        vectors, ids = self.corpus_matrix()
+        if vectors.shape[1] != query_vectors.shape[1]:
+            return [[] for _ in queries]
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        valid = None
+        if filters:
+            where_clause, params = self.build_filter_clause(filters, include_sources=True,
+                                                            model_id=self.embedding_provider.model_id)
+            cursor.execute(f"SELECT id FROM document_embeddings {where_clause}", params)
+            valid = np.isin(ids, np.fromiter((row[0] for row in cursor), dtype=np.int64))
+        
+        # Over-fetch so near-duplicates folded into a higher hit do not leave a page short
+        candidates = k * self.CANDIDATE_FACTOR if self.dedup_threshold is not None else k
+        hits = top_k_many(vectors, query_vectors, candidates, block_rows, query_block, valid)
+        
+        hit_ids = sorted({int(ids[row]) for _, rows in hits for row in rows})
+        rows = {}
+        signatures = {}
+        cursor.execute("""
+            SELECT id, content_chunk, tags, metadata, minhash FROM document_embeddings
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(hit_ids),))
+        for doc_id, content, tags, metadata, minhash in cursor.fetchall():
+            rows[doc_id] = (content, json.loads(tags), json.loads(metadata))
+            if minhash:
+                signatures[doc_id] = MinHasher.from_bytes(minhash)
+        
+        results = []
+        for scores, row_indexes in hits:
+            ranked = []
+            for score, row in zip(scores, row_indexes):
+                doc_id = int(ids[row])
+                if doc_id not in rows:
+                    continue  # Deleted since the matrix was exported
+                content, tags, metadata = rows[doc_id]
+                ranked.append({
+                    'id': doc_id,
+                    'content': content,
+                    'similarity': float(score),
+                    'tags': tags,
+                    'metadata': metadata
+                })
+            results.append(self.collapse_duplicates(ranked, signatures, k))
+            self.attach_duplicate_sources(cursor, results[-1])
+        
+        conn.close()
+        return results
+    
+    def collapse_duplicates(self, ranked: List[Dict[str, Any]], signatures: Dict[Any, Any],
+                            limit: int, key: Callable[[Dict[str, Any]], Any] = None) -> List[Dict[str, Any]]:
+        """Take the top results, folding near-duplicates of a higher-ranked hit into it
+        
+        `signatures` is keyed by `key(result)`, the row id unless given otherwise.
+        """
+        key = key or (lambda result: result['id'])
+        kept = []
+        
+        for result in ranked:
+            result['duplicates'] = []
+            signature = signatures.get(key(result))
+            
+            if self.dedup_threshold is not None and signature is not None:
+                match = next((hit for hit in kept
+                              if key(hit) in signatures
+                              and MinHasher.similarity(signature, signatures[key(hit)]) >= self.dedup_threshold), None)
+                if match:
+                    match['duplicates'].append(result['metadata'])
+                    continue
+            
+            kept.append(result)
+            if len(kept) == limit:
+                break
+        
+        return kept
+    
+    def attach_duplicate_sources(self, cursor: sqlite3.Cursor, results: List[Dict[str, Any]]):
+        """Add the deduplicated locations recorded at ingest to each result's duplicates"""
+        if not results:
+            return
+        
+        by_id = {result['id']: result for result in results}
+        placeholders = ", ".join("?" for _ in by_id)
+        cursor.execute(f"""
+            SELECT embedding_id, metadata FROM chunk_sources
+            WHERE embedding_id IN ({placeholders})
+            ORDER BY id
+        """, list(by_id))
+        
+        for embedding_id, metadata in cursor.fetchall():
+            by_id[embedding_id]['duplicates'].append(json.loads(metadata))
     
     def cosine_similarity(self, a: List[float], b: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
@@ -327,37 +1178,435 @@ class ScryptoVectorDB:
         
         return dot_product / (magnitude_a * magnitude_b)
 
+class ShardedVectorDB:
+    """Vector store split across several SQLite files
+    
+    Chunks are routed to a shard by source type, project or a hash of their file path;
+    each shard is a full ScryptoVectorDB file with its own dedup index. The catalog
+    database keeps the knowledge graph, specifications and fitted provider state.
+    Searches fan out over a process pool (see sharded_index.ShardPool).
+    """
+    
+    SHARD_STRATEGIES = ('source_type', 'project', 'hash')
+    
+    def __init__(self, shard_dir: str, catalog: ScryptoVectorDB, shard_by: str = 'source_type',
+                 hash_shards: int = 4, workers: Optional[int] = None):
+        if shard_by not in self.SHARD_STRATEGIES:
+            raise ValueError(f"Unknown shard strategy: {shard_by}")
+        
+        self.shard_dir = Path(shard_dir)
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self.catalog = catalog
+        self.shard_by = shard_by
+        self.hash_shards = hash_shards
+        self.workers = workers
+        self.pool = None
+        self.stamp_connections: Dict[str, sqlite3.Connection] = {}
+        
+        # Existing shard files are picked up so searches work without re-indexing
+        self.shards: Dict[str, ScryptoVectorDB] = {}
+        for shard_file in sorted(self.shard_dir.glob("shard-*.db")):
+            self.open_shard(shard_file.stem[len("shard-"):])
+    
+    @property
+    def embedding_provider(self) -> EmbeddingProvider:
+        return self.catalog.embedding_provider
+    
+    @property
+    def dedup_stats(self) -> Dict[str, int]:
+        totals = dict.fromkeys(self.catalog.dedup_stats, 0)
+        for shard in self.shards.values():
+            for name, value in shard.dedup_stats.items():
+                totals[name] += value
+        return totals
+    
+    def shard_key(self, record: Dict[str, Any], project: str) -> str:
+        """Shard a chunk belongs to; all chunks of one file land in the same shard"""
+        if self.shard_by == 'source_type':
+            return record['source_type']
+        if self.shard_by == 'project':
+            return re.sub(r"[^A-Za-z0-9_-]+", "_", project)
+        
+        bucket = zlib.crc32(record['metadata']['file_path'].encode('utf-8')) % self.hash_shards
+        return f"hash{bucket:02d}"
+    
+    def open_shard(self, key: str) -> ScryptoVectorDB:
+        if key not in self.shards:
+            self.shards[key] = ScryptoVectorDB(
+                str(self.shard_dir / f"shard-{key}.db"),
+                embedding_provider=self.catalog.embedding_provider,
+                dedup_threshold=self.catalog.dedup_threshold
+            )
+        
+        # Shards share the catalog's provider object, which may be swapped after a refit
+        shard = self.shards[key]
+        shard.embedding_provider = self.catalog.embedding_provider
+        return shard
+    
+    def store_records(self, connections: Dict[str, sqlite3.Connection],
+                      records: List[Dict[str, Any]], project: str):
+        """Route records to their shards, keeping one open connection per shard"""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            grouped.setdefault(self.shard_key(record, project), []).append(record)
+        
+        for key, shard_records in grouped.items():
+            shard = self.open_shard(key)
+            if key not in connections:
+                connections[key] = sqlite3.connect(shard.db_path)
+            shard.store_chunks(connections[key].cursor(), shard_records)
+    
+    def process_project(self, specs_dir: str, project_dir: str, project: Optional[str] = None):
+        """Index a project's specs and code into the shards"""
+        project = project or Path(project_dir).resolve().name
+        print(f"\n🧩 Indexing {project} into {self.shard_by} shards under {self.shard_dir}...")
+        
+        connections: Dict[str, sqlite3.Connection] = {}
+        catalog_conn = sqlite3.connect(self.catalog.db_path)
+        catalog_cursor = catalog_conn.cursor()
+        specs_path = Path(specs_dir)
+        project_path = Path(project_dir)
+        
+        try:
+            for spec_file, content in self.catalog.iter_spec_files(specs_dir):
+                try:
+                    self.store_records(connections, self.catalog.build_spec_chunks(spec_file, specs_path, content), project)
+                    self.catalog.store_specification(catalog_cursor, spec_file, specs_path, content)
+                except Exception as e:
+                    print(f"❌ Error processing {spec_file}: {e}")
+            
+            for code_file, dir_name, content in self.catalog.iter_code_files(project_dir):
+                try:
+                    self.store_records(connections, self.catalog.build_code_chunks(code_file, project_path, dir_name, content), project)
+                except Exception as e:
+                    print(f"❌ Error processing {code_file}: {e}")
+        finally:
+            for conn in connections.values():
+                conn.commit()
+                conn.close()
+            catalog_conn.commit()
+            catalog_conn.close()
+        
+        for key, shard in sorted(self.shards.items()):
+            conn = sqlite3.connect(shard.db_path)
+            count = conn.execute("SELECT COUNT(*) FROM document_embeddings WHERE embedding_model = ?",
+                                 (self.embedding_provider.model_id,)).fetchone()[0]
+            conn.close()
+            print(f"   shard {key}: {count} vectors")
+    
+    def drop_other_models(self) -> int:
+        """Drop superseded models' vectors from every shard and the catalog"""
+        return self.catalog.drop_other_models() + sum(
+            self.open_shard(key).drop_other_models() for key in sorted(self.shards)
+        )
+    
+    def query_pool(self) -> ShardPool:
+        """Worker pool over the current shard matrices, restarted when any shard changed"""
+        model_id = self.embedding_provider.model_id
+        shard_paths = {key: shard.db_path for key, shard in self.shards.items()}
+        
+        if self.pool is not None:
+            stale = (self.pool.model_id != model_id
+                     or set(self.pool.headers) != set(shard_paths)
+                     or any(self.pool.headers[key]['stamp'] != shard_stamp(self.stamp_connection(key))
+                            for key in shard_paths))
+            if not stale:
+                return self.pool
+            self.pool.close()
+        
+        self.pool = ShardPool(shard_paths, model_id, workers=self.workers)
+        return self.pool
+    
+    def stamp_connection(self, key: str) -> sqlite3.Connection:
+        """Long-lived read connection per shard, so checking a stamp does not reopen the file"""
+        if key not in self.stamp_connections:
+            self.stamp_connections[key] = sqlite3.connect(self.shards[key].db_path, check_same_thread=False)
+        return self.stamp_connections[key]
+    
+    def semantic_search(self, query: str, limit: int = 5,
+                        filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search every shard in parallel and merge the per-shard top results"""
+        return self.semantic_search_many([query], limit, filters)[0]
+    
+    def semantic_search_many(self, queries: List[str], limit: int = 5,
+                             filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Search several queries at once; all (query, shard block) tasks run concurrently
+        
+        `filters` (see ScryptoVectorDB.build_filter_clause) is resolved to row ids per shard
+        and applied by the workers before ranking.
+        """
+        if not queries or not self.shards:
+            return [[] for _ in queries]
+        
+        allowed = self.filtered_ids(filters) if filters else None
+        query_embeddings = self.catalog.create_embeddings(queries)
+        
+        # Over-fetch so near-duplicates folded into a higher hit do not leave the page short
+        candidates = limit * self.catalog.CANDIDATE_FACTOR if self.catalog.dedup_threshold is not None else limit
+        hits = self.query_pool().search_batch(query_embeddings, candidates, allowed)
+        
+        results = []
+        for query_hits in hits:
+            ranked, signatures = self.hydrate(query_hits)
+            results.append(self.catalog.collapse_duplicates(ranked, signatures, limit,
+                                                            key=lambda result: (result['shard'], result['id'])))
+            self.attach_duplicate_sources(results[-1])
+        return results
+    
+    def search_many(self, queries: List[str], k: int = 5,
+                    filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """Same interface as ScryptoVectorDB.search_many"""
+        return self.semantic_search_many(queries, k, filters)
+    
+    def filtered_ids(self, filters: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """Row ids matching the filters in each shard that has any"""
+        model_id = self.embedding_provider.model_id
+        allowed = {}
+        for key, shard in self.shards.items():
+            where_clause, params = shard.build_filter_clause(filters, include_sources=True, model_id=model_id)
+            conn = sqlite3.connect(shard.db_path)
+            ids = np.fromiter((row[0] for row in conn.execute(f"SELECT id FROM document_embeddings {where_clause}", params)),
+                              dtype=np.int64)
+            conn.close()
+            if len(ids):
+                allowed[key] = ids
+        return allowed
+    
+    def hydrate(self, hits: List[Tuple[float, str, int]]) -> Tuple[List[Dict[str, Any]], Dict[Tuple[str, int], Any]]:
+        """Load merged (score, shard, row id) hits in rank order, with their MinHash signatures"""
+        by_shard: Dict[str, List[int]] = {}
+        for _, key, embedding_id in hits:
+            by_shard.setdefault(key, []).append(embedding_id)
+        
+        rows = {}
+        signatures = {}
+        for key, embedding_ids in by_shard.items():
+            conn = sqlite3.connect(self.shards[key].db_path)
+            placeholders = ", ".join("?" for _ in embedding_ids)
+            
+            for doc_id, content, tags, metadata, minhash in conn.execute(f"""
+                SELECT id, content_chunk, tags, metadata, minhash FROM document_embeddings
+                WHERE id IN ({placeholders})
+            """, embedding_ids):
+                rows[(key, doc_id)] = {
+                    'id': doc_id,
+                    'shard': key,
+                    'content': content,
+                    'tags': json.loads(tags),
+                    'metadata': json.loads(metadata)
+                }
+                if minhash:
+                    signatures[(key, doc_id)] = MinHasher.from_bytes(minhash)
+            
+            conn.close()
+        
+        ranked = []
+        for similarity, key, embedding_id in hits:
+            result = rows.get((key, embedding_id))
+            if result:  # Row deleted since the shard matrix was written
+                result['similarity'] = similarity
+                ranked.append(result)
+        return ranked, signatures
+    
+    def attach_duplicate_sources(self, results: List[Dict[str, Any]]):
+        by_shard: Dict[str, List[Dict[str, Any]]] = {}
+        for result in results:
+            by_shard.setdefault(result['shard'], []).append(result)
+        
+        for key, shard_results in by_shard.items():
+            conn = sqlite3.connect(self.shards[key].db_path)
+            self.shards[key].attach_duplicate_sources(conn.cursor(), shard_results)
+            conn.close()
+    
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        for conn in self.stamp_connections.values():
+            conn.close()
+        self.stamp_connections = {}
+
+def run_bundle_command(args: argparse.Namespace):
+    """export / import / query subcommands"""
+    if args.command == 'query':
+        started = time.perf_counter()
+        bundle = IndexBundle(args.bundle)
+        provider = bundle.embedding_provider()
+        loaded = time.perf_counter()
+        
+        results = bundle.search(provider.embed_query(args.query), k=args.k, nprobe=args.nprobe, exact=args.exact)
+        finished = time.perf_counter()
+        
+        print(f"⚡ Opened bundle in {(loaded - started) * 1000:.1f} ms, "
+              f"first query in {(finished - loaded) * 1000:.1f} ms ({bundle.count} vectors, {bundle.model_id})")
+        for i, result in enumerate(results):
+            print(f"\n{i+1}. Similarity: {result['similarity']:.3f}")
+            print(f"   Tags: {result['tags']}")
+            print(f"   Content preview: {result['content'][:150]}...")
+        return
+    
+    if args.command == 'export':
+        vector_db = ScryptoVectorDB(args.db, embedding_provider=args.provider)
+        manifest = vector_db.export_bundle(args.bundle, dtype='int8' if args.int8 else 'float32',
+                                           ann=not args.no_ann, nlist=args.nlist, versioned=not args.plain)
+        size = sum(info['bytes'] for info in manifest['files'].values())
+        print(f"📦 Exported {manifest['count']} {manifest['dtype']} vectors ({manifest['model_id']}) "
+              f"to {args.bundle} [{size / 1024 / 1024:.1f} MiB, ann: {manifest['ann']['type'] if manifest['ann'] else 'none'}]")
+        return
+    
+    if args.command == 'import':
+        bundle = IndexBundle(args.bundle)
+        vector_db = ScryptoVectorDB(args.db, embedding_provider=bundle.embedding_provider())
+        count = vector_db.import_bundle(args.bundle)
+        print(f"📥 Imported {count} vectors ({bundle.model_id}) into {args.db}")
+
+def run_watch_command(args: argparse.Namespace, specs_dir: Path, project_dir: Path):
+    """Keep --db current as specs and code change (Ctrl+C to stop)"""
+    if args.shard_dir:
+        print("❌ watch updates a single --db; rebuild sharded stores with --shard-dir instead")
+        sys.exit(1)
+    
+    vector_db = ScryptoVectorDB(args.db, embedding_provider=args.provider,
+                                dedup_threshold=None if args.no_dedup else 0.85)
+    if not vector_db.embedding_provider.is_ready:
+        print("❌ The local provider has not been fitted for this database; build it once without 'watch' first")
+        sys.exit(1)
+    
+    # Readers keep querying the last committed index while a batch is being written
+    conn = sqlite3.connect(vector_db.db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+    
+    totals = watch(vector_db, str(specs_dir), str(project_dir), debounce=args.debounce, max_delay=args.max_delay,
+                   force_polling=args.poll, poll_interval=args.poll_interval, catch_up=not args.no_catch_up)
+    print(f"\n👋 Stopped after {totals['batches']} refreshes of {totals['files']} files "
+          f"(max index lag {totals['lag_ms_max']:.0f}ms)")
+
 def main():
-    print("🤖 Scrypto Vector Database Setup")
-    print("=" * 50)
+    parser = argparse.ArgumentParser(description="Build the Scrypto vector database")
+    parser.add_argument('--db', default="scrypto-intelligence.db", help="SQLite database path")
+    parser.add_argument('--provider', choices=['openai', 'local'],
+                        default=os.environ.get('SCRYPTO_EMBEDDING_PROVIDER', 'openai'),
+                        help="Embedding backend (local runs offline on CPU)")
+    parser.add_argument('--dimension', type=int, default=256,
+                        help="Vector size when fitting the local provider")
+    parser.add_argument('--refit', action='store_true',
+                        help="Re-fit the local provider even if a fitted model exists")
+    parser.add_argument('--no-dedup', action='store_true',
+                        help="Embed near-duplicate chunks separately instead of sharing one vector")
+    parser.add_argument('--shard-dir',
+                        help="Store vectors in shard files under this directory instead of --db")
+    parser.add_argument('--shard-by', choices=ShardedVectorDB.SHARD_STRATEGIES, default='source_type',
+                        help="How chunks are assigned to shards")
+    parser.add_argument('--hash-shards', type=int, default=4,
+                        help="Number of shards for --shard-by hash")
+    parser.add_argument('--project', help="Project label for --shard-by project (default: directory name)")
+    parser.add_argument('--workers', type=int, help="Query worker processes (default: CPU count)")
     
-    # Initialize vector database
-    vector_db = ScryptoVectorDB()
+    subparsers = parser.add_subparsers(dest='command', help="Commands (default: build the database)")
+    export_parser = subparsers.add_parser('export', help="Write the vectors of --db as a portable bundle")
+    export_parser.add_argument('bundle', help="Output bundle directory")
+    export_parser.add_argument('--int8', action='store_true', help="Store int8-quantized vectors (4x smaller)")
+    export_parser.add_argument('--no-ann', action='store_true', help="Skip building the IVF index")
+    export_parser.add_argument('--nlist', type=int, help="IVF list count (default: sqrt of the row count)")
+    export_parser.add_argument('--plain', action='store_true',
+                               help="Write a plain directory to copy to another host instead of a versioned "
+                                    "symlink (which cp -r, tar and scp ship as a dangling link)")
+    import_parser = subparsers.add_parser('import', help="Load a bundle into --db")
+    import_parser.add_argument('bundle', help="Bundle directory")
+    query_parser = subparsers.add_parser('query', help="Search a bundle directly from its memory-mapped files")
+    query_parser.add_argument('bundle', help="Bundle directory")
+    query_parser.add_argument('query', help="Search text")
+    query_parser.add_argument('--k', type=int, default=5, help="Number of results")
+    query_parser.add_argument('--exact', action='store_true', help="Scan every vector instead of probing the IVF index")
+    query_parser.add_argument('--nprobe', type=int, help="IVF lists to probe (default: stored in the manifest)")
+    watch_parser = subparsers.add_parser('watch', help="Re-index changed specs and code as they are edited")
+    watch_parser.add_argument('--debounce', type=float, default=0.5, help="Quiet seconds before a batch is indexed")
+    watch_parser.add_argument('--max-delay', type=float, default=5.0,
+                              help="Index a batch at most this many seconds after its first change")
+    watch_parser.add_argument('--poll', action='store_true', help="Poll mtimes instead of using inotify")
+    watch_parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls")
+    watch_parser.add_argument('--no-catch-up', action='store_true',
+                              help="Skip re-indexing files changed while nothing was watching")
+    args = parser.parse_args()
     
     # Get project paths
     script_dir = Path(__file__).parent
     project_dir = script_dir.parent.parent
     specs_dir = script_dir.parent / "specs"
     
+    if args.command == 'watch':
+        run_watch_command(args, specs_dir, project_dir)
+        return
+    
+    if args.command:
+        run_bundle_command(args)
+        return
+    
+    print("🤖 Scrypto Vector Database Setup")
+    print("=" * 50)
+    
+    # Initialize vector database
+    vector_db = ScryptoVectorDB(args.db, embedding_provider=args.provider,
+                                dedup_threshold=None if args.no_dedup else 0.85)
+    
     print(f"📁 Project directory: {project_dir}")
     print(f"📋 Specs directory: {specs_dir}")
+    print(f"🧠 Embedding provider: {vector_db.embedding_provider.name}")
+    
+    # Corpus-trained providers learn their vocabulary and projection before indexing
+    provider = vector_db.embedding_provider
+    if provider.requires_fit and (args.refit or not provider.is_ready):
+        vector_db.embedding_provider = LocalEmbeddingProvider(dimension=args.dimension)
+        corpus = vector_db.collect_chunks(str(specs_dir), str(project_dir))
+        vector_db.fit_embedding_provider([record['content'] for record in corpus])
     
     # Process all content
-    vector_db.create_project_knowledge_graph()
-    vector_db.process_specifications(str(specs_dir))
-    vector_db.process_code_files(str(project_dir))
+    vector_db.create_project_knowledge_graph(str(project_dir))
+    
+    if args.shard_dir:
+        sharded_db = ShardedVectorDB(args.shard_dir, vector_db, shard_by=args.shard_by,
+                                     hash_shards=args.hash_shards, workers=args.workers)
+        sharded_db.process_project(str(specs_dir), str(project_dir), project=args.project)
+    else:
+        vector_db.process_specifications(str(specs_dir))
+        vector_db.process_code_files(str(project_dir))
+    
+    # The new model's rows are committed, so rows of a previous fit or provider can go
+    removed = (sharded_db if args.shard_dir else vector_db).drop_other_models()
+    if removed:
+        print(f"\n🧹 Removed {removed} vectors of superseded embedding models")
+    
+    stats = sharded_db.dedup_stats if args.shard_dir else vector_db.dedup_stats
+    print(f"\n♻️ Deduplication: {stats['embeddings_saved']} of {stats['chunks']} chunks reused an existing embedding "
+          f"(that many embedding inputs and vector rows skipped; {stats['embedding_requests_saved']} embedding "
+          f"requests avoided entirely)")
     
     # Test semantic search
     print("\n🔍 Testing semantic search...")
-    results = vector_db.semantic_search("How do I implement authentication in Scrypto?")
+    query = "How do I implement authentication in Scrypto?"
+    try:
+        if args.shard_dir:
+            results = sharded_db.semantic_search(query)
+            sharded_db.close()
+        else:
+            results = vector_db.semantic_search(query)
+    except EmbeddingError as e:
+        print(f"❌ Search failed: {e}")
+        results = []
     
     for i, result in enumerate(results[:3]):
         print(f"\n{i+1}. Similarity: {result['similarity']:.3f}")
         print(f"   Tags: {result['tags']}")
         print(f"   Content preview: {result['content'][:150]}...")
     
+    if not args.shard_dir:
+        print("\n📊 Code chunks by component type:")
+        for component_type, count in vector_db.facet_counts('component_type').items():
+            print(f"   {component_type}: {count}")
+    
     print(f"\n✅ Vector database setup complete!")
-    print(f"📊 Database location: {vector_db.db_path}")
+    print(f"📊 Database location: {args.shard_dir or vector_db.db_path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
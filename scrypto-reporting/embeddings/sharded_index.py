@@ -0,0 +1,269 @@
+"""
+Scrypto Sharded Vector Index
+Per-shard float32 vector matrices written next to each shard's SQLite file and memory-mapped
+by a pool of worker processes. Queries fan out as (shard, row range) tasks that carry only
+the query vector; per-shard top-k lists come back and are k-way merged. A filter is written
+once per batch as a row mask file that the workers memory-map as well.
+"""
+
+import os
+import json
+import heapq
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Worker-process state: shard name -> (memmapped vectors, memmapped row ids)
+_WORKER_SHARDS: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+# Worker-process state: the row mask file of the current filtered batch, (path, memmap)
+_WORKER_MASK: List[Any] = [None, None]
+
+def matrix_paths(db_path: str) -> Dict[str, str]:
+    base = str(Path(db_path).with_suffix(''))
+    return {
+        'vectors': f"{base}.vectors.f32",
+        'ids': f"{base}.ids.i64",
+        'header': f"{base}.vectors.json"
+    }
+
+def shard_stamp(db: Union[str, sqlite3.Connection]) -> List[Any]:
+    """Change marker for a shard's vectors: the epoch and generation kept by the schema triggers
+    
+    A single-row lookup, cheap enough to check on every query.
+    """
+    conn = sqlite3.connect(db) if isinstance(db, str) else db
+    epoch, generation = conn.execute("SELECT epoch, generation FROM embedding_generation WHERE id = 1").fetchone()
+    if conn is not db:
+        conn.close()
+    return [epoch, generation]
+
+def read_header(db_path: str) -> Optional[Dict[str, Any]]:
+    header_path = matrix_paths(db_path)['header']
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path, 'r') as f:
+        return json.load(f)
+
+def write_shard_matrix(db_path: str, model_id: str) -> Dict[str, Any]:
+    """Export a shard's vectors for one model as a row-normalized float32 matrix"""
+    paths = matrix_paths(db_path)
+    
+    # Read the stamp and the rows in one transaction so the stamp describes exactly these rows
+    conn = sqlite3.connect(db_path)
+    conn.execute("BEGIN")
+    stamp = shard_stamp(conn)
+    rows = conn.execute("""
+        SELECT id, embedding_vector FROM document_embeddings
+        WHERE embedding_model = ?
+        ORDER BY id
+    """, (model_id,)).fetchall()
+    conn.rollback()
+    conn.close()
+    
+    ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+    vectors = np.asarray([json.loads(row[1]) for row in rows], dtype=np.float32)
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(len(rows), 0)
+    
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    
+    # Write to temporary names and rename so live readers never see a torn file
+    for key, array in (('vectors', vectors), ('ids', ids)):
+        array.tofile(paths[key] + '.tmp')
+        os.replace(paths[key] + '.tmp', paths[key])
+    
+    header = {
+        'model_id': model_id,
+        'dimension': int(vectors.shape[1]),
+        'count': int(len(ids)),
+        'stamp': stamp
+    }
+    with open(paths['header'] + '.tmp', 'w') as f:
+        json.dump(header, f)
+    os.replace(paths['header'] + '.tmp', paths['header'])
+    
+    return header
+
+def ensure_shard_matrix(db_path: str, model_id: str) -> Dict[str, Any]:
+    """Reuse the exported matrix unless the shard changed since it was written"""
+    header = read_header(db_path)
+    if header and header['model_id'] == model_id and header['stamp'] == shard_stamp(db_path):
+        return header
+    return write_shard_matrix(db_path, model_id)
+
+def open_matrix(db_path: str, header: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    paths = matrix_paths(db_path)
+    if header['count'] == 0:
+        return np.zeros((0, header['dimension']), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    vectors = np.memmap(paths['vectors'], dtype=np.float32, mode='r', shape=(header['count'], header['dimension']))
+    ids = np.memmap(paths['ids'], dtype=np.int64, mode='r', shape=(header['count'],))
+    return vectors, ids
+
+def init_worker(shards: Dict[str, Tuple[str, Dict[str, Any]]]):
+    """Pool initializer: map every shard once per worker process"""
+    _WORKER_SHARDS.clear()
+    for name, (db_path, header) in shards.items():
+        _WORKER_SHARDS[name] = open_matrix(db_path, header)
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def top_k_many(vectors: np.ndarray, queries: np.ndarray, k: int, block_rows: int = 16384,
+               query_block: int = 256, valid: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Per-query top-k (scores, row indices) of queries x vectors, best first
+    
+    Rows are scored a block at a time against a block of queries with one matrix-matrix
+    product, so at most query_block x block_rows scores are alive at once. `valid` is an
+    optional boolean row mask; masked rows never appear in the results.
+    """
+    results = []
+    for q_start in range(0, len(queries), query_block):
+        query_batch = queries[q_start:q_start + query_block]
+        best_scores = np.empty((len(query_batch), 0), dtype=np.float32)
+        best_rows = np.empty((len(query_batch), 0), dtype=np.int64)
+        
+        for start in range(0, len(vectors), block_rows):
+            block = np.asarray(vectors[start:start + block_rows])
+            scores = query_batch @ block.T
+            if valid is not None:
+                scores[:, ~valid[start:start + len(block)]] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            
+            # Keep this block's k best per query, then fold them into the running best
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        for scores, rows in zip(best_scores, best_rows):
+            found = np.isfinite(scores)
+            results.append((scores[found], rows[found]))
+    
+    return results
+
+def worker_mask(path: str) -> np.ndarray:
+    """Memory-map a batch's row mask file once per worker, not once per task"""
+    if _WORKER_MASK[0] != path:
+        _WORKER_MASK[:] = [path, np.memmap(path, dtype=np.bool_, mode='r')]
+    return _WORKER_MASK[1]
+
+def score_block(name: str, start: int, end: int, query: bytes, k: int,
+                mask: Optional[Tuple[str, int]] = None) -> List[Tuple[float, str, int]]:
+    """Cosine top-k of one row range of one shard (runs in a worker process)
+    
+    `mask` is (mask file, offset of this shard's rows in it); rows whose mask byte is
+    false, e.g. rows not matching a filter, are never returned.
+    """
+    vectors, ids = _WORKER_SHARDS[name]
+    query_vector = np.frombuffer(query, dtype=np.float32)
+    
+    scores = vectors[start:end] @ query_vector
+    if mask is not None:
+        path, offset = mask
+        scores[~worker_mask(path)[offset + start:offset + end]] = -np.inf
+    return [(float(scores[i]), name, int(ids[start + i])) for i in top_k(scores, k) if np.isfinite(scores[i])]
+
+class ShardPool:
+    """Process pool holding memory-mapped shard matrices for query fan-out"""
+    
+    def __init__(self, shards: Dict[str, str], model_id: str, workers: Optional[int] = None,
+                 block_rows: int = 50000):
+        self.model_id = model_id
+        self.block_rows = block_rows
+        self.workers = workers or os.cpu_count() or 1
+        
+        self.headers = {name: ensure_shard_matrix(db_path, model_id) for name, db_path in shards.items()}
+        self.row_ids = {name: open_matrix(shards[name], header)[1] for name, header in self.headers.items()}
+        self.batches = 0
+        self.blocks = [
+            (name, start, min(start + block_rows, header['count']))
+            for name, header in self.headers.items()
+            for start in range(0, header['count'], block_rows)
+        ]
+        
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=({name: (shards[name], header) for name, header in self.headers.items()},)
+        )
+    
+    def search(self, query_vector: List[float], k: int) -> List[Tuple[float, str, int]]:
+        return self.search_batch([query_vector], k)[0]
+    
+    def search_batch(self, query_vectors: List[List[float]], k: int,
+                     allowed: Optional[Dict[str, np.ndarray]] = None) -> List[List[Tuple[float, str, int]]]:
+        """Fan every query out over all shard blocks, then k-way merge the partial top-k lists
+        
+        With `allowed` (shard name -> row ids), only those rows are scored. The ids are
+        turned into one row mask file for the whole batch, so each task carries just the
+        file name and an offset; blocks without an allowed row are not submitted at all.
+        """
+        if allowed is None:
+            return self._search_blocks(query_vectors, k, self.blocks, None)
+        
+        masks = {name: np.isin(self.row_ids[name], allowed[name]) if name in allowed
+                 else np.zeros(header['count'], dtype=np.bool_)
+                 for name, header in self.headers.items()}
+        offsets = {}
+        position = 0
+        for name, mask in masks.items():
+            offsets[name] = position
+            position += len(mask)
+        blocks = [(name, start, end) for name, start, end in self.blocks if masks[name][start:end].any()]
+        
+        # Workers cache the mapped file by name, so every batch gets a name never used before
+        self.batches += 1
+        fd, path = tempfile.mkstemp(prefix=f'scrypto-filter-{os.getpid()}-{self.batches}-', suffix='.mask')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for mask in masks.values():
+                    f.write(mask.tobytes())
+            return self._search_blocks(query_vectors, k, blocks, (path, offsets))
+        finally:
+            os.remove(path)
+    
+    def _search_blocks(self, query_vectors: List[List[float]], k: int, blocks: List[Tuple[str, int, int]],
+                       mask: Optional[Tuple[str, Dict[str, int]]]) -> List[List[Tuple[float, str, int]]]:
+        futures = []
+        for query_vector in query_vectors:
+            query = np.asarray(query_vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            query_bytes = (query / norm if norm else query).tobytes()
+            futures.append([
+                self.executor.submit(score_block, name, start, end, query_bytes, k,
+                                     None if mask is None else (mask[0], mask[1][name]))
+                for name, start, end in blocks
+            ])
+        
+        results = []
+        for query_futures in futures:
+            partials = [future.result() for future in query_futures]
+            merged = heapq.merge(*partials, key=lambda hit: -hit[0])
+            results.append(list(islice(merged, k)))
+        
+        return results
+    
+    def close(self):
+        self.executor.shutdown()
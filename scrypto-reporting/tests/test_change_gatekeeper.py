@@ -0,0 +1,92 @@
+"""Keyset pagination of the pending change queue across statuses and risk levels"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "embeddings"))
+
+from openai_client import FaultInjectingOpenAI, ResilientOpenAIClient
+
+spec = importlib.util.spec_from_file_location("change_gatekeeper", ROOT / "agents" / "change-gatekeeper.py")
+change_gatekeeper = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(change_gatekeeper)
+
+RISK_LEVELS = ['low', 'critical', None, 'medium', 'high']
+STATUSES = ['submitted', 'ai_reviewed', 'approved']
+
+class PendingPageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "changes.db")
+
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript((ROOT / "database" / "schema.sql").read_text())
+
+        # Several requests share a timestamp so the id has to break ties between pages
+        for i in range(30):
+            conn.execute("""
+                INSERT INTO change_requests (requested_by, request_type, description, risk_level, status, created_at)
+                VALUES ('dev', 'feature', ?, ?, ?, ?)
+            """, (f"change {i}", RISK_LEVELS[i % 5], STATUSES[i % 3], f"2026-01-{1 + i // 4:02d} 09:00:00"))
+        conn.commit()
+        conn.close()
+
+        self.gatekeeper = change_gatekeeper.ScryptoChangeGatekeeper(
+            self.db_path, openai_client=ResilientOpenAIClient(FaultInjectingOpenAI()))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def queue_order(self):
+        conn = sqlite3.connect(self.db_path)
+        ids = [row[0] for row in conn.execute("""
+            SELECT id FROM change_requests WHERE status IN ('submitted', 'ai_reviewed')
+            ORDER BY risk_rank, created_at DESC, id DESC
+        """)]
+        conn.close()
+        return ids
+
+    def paged_ids(self, limit: int):
+        ids, after = [], None
+        while True:
+            page = self.gatekeeper.get_pending_page(limit=limit, after=after)
+            self.assertLessEqual(len(page['changes']), limit)
+            ids.extend(change['id'] for change in page['changes'])
+            after = page['next_after']
+            if after is None:
+                return ids
+
+    def test_pages_walk_the_queue_without_gaps_or_repeats(self):
+        expected = self.queue_order()
+        self.assertEqual(len(expected), 20)
+        for limit in (1, 3, 4, 7, 20):
+            self.assertEqual(self.paged_ids(limit), expected)
+
+    def test_riskiest_first_and_unrated_last(self):
+        levels = [change['risk_level'] for change in self.gatekeeper.get_pending_changes()]
+        ranked = [level for level in ['critical', 'high', 'medium', 'low', None] for _ in range(levels.count(level))]
+        self.assertEqual(levels, ranked)
+
+    def test_single_page_has_no_next_key(self):
+        page = self.gatekeeper.get_pending_page(limit=50)
+        self.assertEqual(len(page['changes']), 20)
+        self.assertIsNone(page['next_after'])
+
+    def test_rerated_request_moves_in_the_queue(self):
+        last = self.queue_order()[-1]
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE change_requests SET risk_level = 'critical' WHERE id = ?", (last,))
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self.paged_ids(4), self.queue_order())
+        self.assertEqual(self.gatekeeper.get_pending_page(limit=1)['changes'][0]['risk_level'], 'critical')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Near-duplicate chunks share one embedding and survive removal of their primary file"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "tests"))
+
+from test_index_watcher import HashingProvider, setup_vector_db
+from test_vector_search import source
+
+class CountingProvider(HashingProvider):
+    """Hashing provider that records every text it is asked to embed"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+class ChunkDedupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.specs = root / "specs"
+        self.project = root / "project"
+
+        # The same card copied into two domains with a small edit, plus an unrelated form
+        self.primary = self.write("components/admin/AllergyCard.tsx", source("AllergyCard"))
+        self.copy = self.write("components/patient/AllergyCard.tsx", source("AllergyCard") + "// patient copy\n")
+        self.other = self.write("components/patient/ConditionForm.tsx", source("ConditionForm"))
+
+        self.provider = CountingProvider()
+        self.vector_db = setup_vector_db.ScryptoVectorDB(str(root / "vectors.db"), embedding_provider=self.provider)
+        self.reindex(self.primary, self.copy, self.other)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, relative_path: str, content: str) -> Path:
+        path = self.project / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return path
+
+    def reindex(self, *paths: Path):
+        self.vector_db.reindex_paths(list(paths), str(self.specs), str(self.project))
+
+    def rows(self):
+        conn = sqlite3.connect(self.vector_db.db_path)
+        embeddings = dict(conn.execute("SELECT id, relative_path FROM document_embeddings ORDER BY id"))
+        sources = conn.execute("SELECT embedding_id, relative_path FROM chunk_sources ORDER BY id").fetchall()
+        conn.close()
+        return embeddings, sources
+
+    def test_duplicate_is_recorded_as_a_source_without_embedding(self):
+        embeddings, sources = self.rows()
+        card_id = next(id for id, path in embeddings.items() if path == "components/admin/AllergyCard.tsx")
+
+        self.assertEqual(len(embeddings), 2)
+        self.assertEqual(sources, [(card_id, "components/patient/AllergyCard.tsx")])
+        self.assertEqual(len(self.provider.embedded), 2)
+        self.assertEqual(self.vector_db.dedup_stats,
+                         {'chunks': 3, 'embeddings_saved': 1, 'embedding_requests_saved': 1})
+
+    def test_search_lists_the_duplicate_location_once(self):
+        results = self.vector_db.semantic_search("allergy card", limit=5)
+        self.assertEqual(len(results), 2)
+
+        card = next(result for result in results if result['metadata']['relative_path'].endswith("AllergyCard.tsx"))
+        self.assertEqual([duplicate['relative_path'] for duplicate in card['duplicates']],
+                         ["components/patient/AllergyCard.tsx"])
+
+    def test_removing_the_primary_file_hands_the_embedding_over(self):
+        embeddings_before, _ = self.rows()
+        os.remove(self.primary)
+        self.reindex(self.primary)
+
+        embeddings, sources = self.rows()
+        self.assertEqual(set(embeddings), set(embeddings_before))
+        self.assertIn("components/patient/AllergyCard.tsx", embeddings.values())
+        self.assertEqual(sources, [])
+        self.assertEqual(len(self.provider.embedded), 2)
+
+        results = self.vector_db.semantic_search("allergy card", limit=5)
+        self.assertEqual({result['metadata']['relative_path'] for result in results},
+                         {"components/patient/AllergyCard.tsx", "components/patient/ConditionForm.tsx"})
+
+    def test_removing_the_last_location_deletes_the_embedding(self):
+        os.remove(self.primary)
+        os.remove(self.copy)
+        self.reindex(self.primary, self.copy)
+
+        embeddings, sources = self.rows()
+        self.assertEqual(list(embeddings.values()), ["components/patient/ConditionForm.tsx"])
+        self.assertEqual(sources, [])
+
+    def test_query_time_collapse_folds_near_duplicates_into_the_higher_hit(self):
+        signature = self.vector_db.minhasher.signature
+        text = source("AllergyCard")
+        ranked = [{'id': 1, 'metadata': {'relative_path': "a.tsx"}},
+                  {'id': 2, 'metadata': {'relative_path': "b.tsx"}},
+                  {'id': 3, 'metadata': {'relative_path': "c.tsx"}}]
+        signatures = {1: signature(text), 2: signature(text + "// edited\n"), 3: signature(source("ConditionForm"))}
+
+        kept = self.vector_db.collapse_duplicates(ranked, signatures, limit=5)
+        self.assertEqual([result['id'] for result in kept], [1, 3])
+        self.assertEqual(kept[0]['duplicates'], [{'relative_path': "b.tsx"}])
+
+        self.assertEqual([result['id'] for result in self.vector_db.collapse_duplicates(ranked, signatures, limit=1)], [1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Incremental code scans must leave the same feature links as a full scan"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "embeddings"))
+
+from code_scanner import ScryptoCodeScanner
+
+PAGE = "export default function Page() {\n  return null\n}\n"
+COMPONENT = "export function Component() {\n  return null\n}\n"
+TEST = "describe('feature', () => {\n  it('renders', () => {})\n})\n"
+
+class CodeScannerLinkTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.project = Path(self.tmp.name) / "project"
+        self.write("app/patient/medhist/allergies/page.tsx", PAGE)
+        self.write("components/patient/AllergyCard.tsx", COMPONENT)
+        self.write("components/patient/ConditionsList.tsx", COMPONENT)
+        self.write("__tests__/patient/conditions.test.tsx", TEST)
+        self.db_path = self.new_db("incremental.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, relative_path: str, content: str):
+        path = self.project / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    def new_db(self, name: str) -> str:
+        db_path = os.path.join(self.tmp.name, name)
+        conn = sqlite3.connect(db_path)
+        with open(ROOT / "database" / "schema.sql", 'r') as f:
+            conn.executescript(f.read())
+        conn.close()
+        return db_path
+
+    def links(self, db_path: str):
+        conn = sqlite3.connect(db_path)
+        components = conn.execute("""
+            SELECT c.file_path, f.domain, f.group_name, f.item
+            FROM code_components c LEFT JOIN project_features f ON f.id = c.feature_id
+            ORDER BY c.file_path
+        """).fetchall()
+        tests = conn.execute("""
+            SELECT t.test_file, f.item
+            FROM test_coverage t LEFT JOIN project_features f ON f.id = t.feature_id
+            ORDER BY t.test_file
+        """).fetchall()
+        features = conn.execute("""
+            SELECT domain, group_name, item, has_page, has_tests FROM project_features ORDER BY 1, 2, 3
+        """).fetchall()
+        conn.close()
+        return components, tests, features
+
+    def assert_matches_full_scan(self, name: str):
+        full_db = self.new_db(name)
+        ScryptoCodeScanner(full_db, str(self.project)).scan(full=True)
+        self.assertEqual(self.links(self.db_path), self.links(full_db))
+
+    def test_new_route_links_unchanged_files(self):
+        scanner = ScryptoCodeScanner(self.db_path, str(self.project))
+        scanner.scan()
+
+        self.write("app/patient/medhist/conditions/page.tsx", PAGE)
+        stats = scanner.scan()
+
+        self.assertEqual(stats['parsed'], 1)
+        self.assertGreater(stats['relinked'], 0)
+        components = dict((row[0], row[3]) for row in self.links(self.db_path)[0])
+        self.assertEqual(components["components/patient/ConditionsList.tsx"], 'conditions')
+        self.assert_matches_full_scan("full-added.db")
+
+    def test_removed_route_drops_its_feature(self):
+        scanner = ScryptoCodeScanner(self.db_path, str(self.project))
+        self.write("app/patient/medhist/conditions/page.tsx", PAGE)
+        scanner.scan()
+
+        os.remove(self.project / "app/patient/medhist/conditions/page.tsx")
+        stats = scanner.scan()
+
+        self.assertEqual(stats['features_removed'], 1)
+        features = [row[2] for row in self.links(self.db_path)[2]]
+        self.assertNotIn('conditions', features)
+        self.assert_matches_full_scan("full-removed.db")
+
+    def test_removed_route_keeps_a_seeded_feature(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            INSERT INTO project_features (domain, group_name, item, implementation_status)
+            VALUES ('patient', 'medhist', 'allergies', 'completed')
+        """)
+        conn.commit()
+        conn.close()
+
+        scanner = ScryptoCodeScanner(self.db_path, str(self.project))
+        scanner.scan()
+        os.remove(self.project / "app/patient/medhist/allergies/page.tsx")
+        stats = scanner.scan()
+
+        self.assertEqual((stats['features_removed'], stats['features_orphaned']), (0, 1))
+        conn = sqlite3.connect(self.db_path)
+        feature = conn.execute("""
+            SELECT implementation_status, has_page FROM project_features WHERE item = 'allergies'
+        """).fetchone()
+        conn.close()
+        self.assertEqual(feature, ('completed', 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Compacting old interactions into daily aggregates and per-session archives"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+spec = importlib.util.spec_from_file_location("compact_interactions", ROOT / "tools" / "compact-interactions.py")
+compact_interactions = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(compact_interactions)
+
+class CompactDayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "interactions.db")
+        self.retention = compact_interactions.ScryptoInteractionRetention(self.db_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add(self, session_id: str, created_at: str, user_level: str = 'developer'):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            INSERT INTO ai_interactions (session_id, user_level, question, response, tokens_used, model_used, created_at)
+            VALUES (?, ?, 'How do allergies sync?', 'Through the patient API', 10, 'gpt-4', ?)
+        """, (session_id, user_level, created_at))
+        conn.commit()
+        conn.close()
+
+    def daily(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("""
+            SELECT day, user_level, interactions, sessions, tokens_used FROM ai_interaction_daily ORDER BY 1, 2
+        """).fetchall()
+        conn.close()
+        return rows
+
+    def test_late_rows_of_a_counted_session_are_not_double_counted(self):
+        self.add('s1', '2026-01-05 09:00:00')
+        self.add('s2', '2026-01-05 10:00:00')
+        self.retention.compact('2026-01-10')
+
+        # Late rows for that day: one from an already counted session, one from a new one
+        self.add('s1', '2026-01-05 11:00:00')
+        self.add('s3', '2026-01-05 12:00:00')
+        self.retention.compact('2026-01-10')
+
+        self.assertEqual(self.daily(), [('2026-01-05', 'developer', 4, 3, 40)])
+
+    def archives(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("""
+            SELECT day, session_id, interaction_count, first_interaction_id, last_interaction_id
+            FROM ai_interactions_archive ORDER BY 1, 2
+        """).fetchall()
+        conn.close()
+        return rows
+
+    def test_compacting_again_changes_nothing(self):
+        self.add('s1', '2026-01-05 09:00:00')
+        self.add('s1', '2026-01-05 09:30:00')
+        self.add('s2', '2026-01-05 10:00:00', user_level='stakeholder')
+        self.add('s3', '2026-01-06 10:00:00')
+        self.assertEqual(self.retention.compact('2026-01-10')['interactions'], 4)
+        daily, archives = self.daily(), self.archives()
+
+        self.assertEqual(self.retention.compact('2026-01-10')['days'], 0)
+
+        # Re-running a day that has no raw rows left only recounts from the archives
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            self.assertEqual(self.retention.compact_day(conn, '2026-01-05'), (0, 0, 0))
+        conn.close()
+
+        self.assertEqual(self.daily(), daily)
+        self.assertEqual(self.archives(), archives)
+        self.assertEqual(daily, [('2026-01-05', 'developer', 2, 1, 20), ('2026-01-05', 'stakeholder', 1, 1, 10),
+                                 ('2026-01-06', 'developer', 1, 1, 10)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""Offline local embeddings and isolation between the vectors of different models"""
+
+import sys
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "tests"))
+sys.path.insert(0, str(ROOT / "embeddings"))
+
+from embedding_providers import LocalEmbeddingProvider
+from test_index_watcher import HashingProvider, setup_vector_db
+from test_vector_search import FILES, source
+
+CORPUS = [
+    "Patients record allergies with the reaction and its severity",
+    "Allergy records list the reaction, severity and onset date",
+    "Pharmacists validate prescriptions before they are dispensed",
+    "Prescription validation checks dose, interactions and refills",
+    "The admin dashboard lists clinics, staff accounts and audit logs",
+    "Staff accounts are created by clinic administrators",
+]
+
+class LocalProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.provider = LocalEmbeddingProvider(dimension=4, n_features=2 ** 12)
+        self.provider.fit(CORPUS)
+
+    def test_embeddings_are_unit_vectors_of_the_fitted_dimension(self):
+        vectors = np.asarray(self.provider.embed(CORPUS))
+        self.assertEqual(vectors.shape, (len(CORPUS), 4))
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+
+    def test_related_texts_are_closer(self):
+        allergy, related, unrelated = np.asarray(self.provider.embed(
+            ["allergy reaction severity", CORPUS[0], CORPUS[4]]))
+        self.assertGreater(allergy @ related, allergy @ unrelated)
+
+    def test_state_round_trip_reproduces_model_and_vectors(self):
+        restored = LocalEmbeddingProvider.from_state(self.provider.save_state())
+        self.assertEqual(restored.model_id, self.provider.model_id)
+        np.testing.assert_allclose(restored.embed(CORPUS), self.provider.embed(CORPUS), atol=1e-6)
+
+    def test_single_query_path_matches_batched_embedding(self):
+        for text in CORPUS[:3]:
+            np.testing.assert_allclose(self.provider.embed_query(text), self.provider.embed([text])[0], atol=1e-5)
+
+    def test_unfitted_provider_refuses_to_embed(self):
+        with self.assertRaises(RuntimeError):
+            LocalEmbeddingProvider().embed(["text"])
+
+class ModelIsolationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.specs = root / "specs"
+        self.project = root / "project"
+        self.db_path = str(root / "vectors.db")
+
+        self.paths = []
+        for relative_path, name in FILES.items():
+            path = self.project / relative_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(source(name))
+            self.paths.append(path)
+
+        hashing_db = setup_vector_db.ScryptoVectorDB(self.db_path, embedding_provider=HashingProvider())
+        hashing_db.reindex_paths(self.paths, str(self.specs), str(self.project))
+
+        self.vector_db = setup_vector_db.ScryptoVectorDB(
+            self.db_path, embedding_provider=LocalEmbeddingProvider(dimension=4, n_features=2 ** 12))
+        self.vector_db.fit_embedding_provider([source(name) for name in FILES.values()])
+        self.vector_db.reindex_paths(self.paths, str(self.specs), str(self.project))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def rows_per_model(self, table: str):
+        column = 'model_id' if table == 'embedding_models' else 'embedding_model'
+        conn = sqlite3.connect(self.db_path)
+        counts = dict(conn.execute(f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column}"))
+        conn.close()
+        return counts
+
+    def test_searches_only_see_the_active_model(self):
+        local_id = self.vector_db.embedding_provider.model_id
+        self.assertEqual(self.rows_per_model('document_embeddings'), {'hashing-8': 4, local_id: 4})
+
+        self.assertEqual(self.vector_db.facet_counts('component_type'),
+                         {'page': 1, 'api_route': 1, 'component': 1, 'hook': 1})
+        self.assertEqual(len(self.vector_db.semantic_search("allergy card", limit=10)), 4)
+
+    def test_drop_other_models_keeps_only_the_active_one(self):
+        local_id = self.vector_db.embedding_provider.model_id
+        self.assertEqual(self.vector_db.drop_other_models(), 4)
+
+        self.assertEqual(self.rows_per_model('document_embeddings'), {local_id: 4})
+        self.assertEqual(self.rows_per_model('indexed_files'), {local_id: 4})
+        self.assertEqual(list(self.rows_per_model('embedding_models')), [local_id])
+
+    def test_fitted_state_is_restored_from_the_database(self):
+        reopened = setup_vector_db.ScryptoVectorDB(self.db_path, embedding_provider='local')
+        self.assertEqual(reopened.embedding_provider.model_id, self.vector_db.embedding_provider.model_id)
+
+if __name__ == "__main__":
+    unittest.main()
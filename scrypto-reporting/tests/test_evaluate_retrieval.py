@@ -0,0 +1,57 @@
+"""The evaluator scores the assistant's and the gatekeeper's own context retrieval"""
+
+import sys
+import json
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "tests"))
+sys.path.insert(0, str(ROOT / "embeddings"))
+
+from test_index_watcher import HashingProvider, setup_vector_db
+
+spec = importlib.util.spec_from_file_location("evaluate_retrieval", ROOT / "embeddings" / "evaluate-retrieval.py")
+evaluate_retrieval = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(evaluate_retrieval)
+
+class ComponentModesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        specs = root / "specs"
+        allergies = specs / "core" / "allergies.md"
+        billing = specs / "business" / "billing.md"
+        for path, content in ((allergies, "# Allergies\n\n" + "Clinicians record patient allergies and reactions.\n" * 3),
+                              (billing, "# Billing\n\n" + "Invoices are issued for every clinic visit.\n" * 3)):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+
+        vector_db = setup_vector_db.ScryptoVectorDB(str(root / "vectors.db"), embedding_provider=HashingProvider())
+        vector_db.reindex_paths([allergies, billing], str(specs), str(root / "project"))
+
+        golden = root / "golden.json"
+        golden.write_text(json.dumps({'questions': [
+            {'id': 'allergies', 'question': 'patient allergies', 'expected_specs': ["core/allergies.md"]},
+            {'id': 'billing', 'question': 'invoices', 'expected_specs': ["business/billing.md"]}
+        ]}))
+        self.evaluator = evaluate_retrieval.ScryptoRetrievalEvaluator(vector_db, str(golden), k_values=(1,))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_assistant_results_map_to_spec_paths(self):
+        search = self.evaluator.retriever('assistant')
+        files = [file_key for result in search("patient allergies", 5)
+                 for file_key in self.evaluator.result_files(result)]
+        self.assertEqual(files, [('spec', "core/allergies.md")])
+
+    def test_gatekeeper_context_is_scored_by_title(self):
+        report = self.evaluator.evaluate_mode('gatekeeper', repeat=1)
+        self.assertEqual(report['recall'][1], 1.0)
+        self.assertEqual(report['mrr'], 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Bundle exports are swapped in atomically and old versions are pruned"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "tests"))
+sys.path.insert(0, str(ROOT / "embeddings"))
+
+from index_bundle import IndexBundle, bundle_versions, write_bundle
+from test_index_watcher import CODE, HashingProvider, setup_vector_db
+
+class BundleSwapTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        page = root / "project" / "app" / "patient" / "allergies" / "page.tsx"
+        page.parent.mkdir(parents=True)
+        page.write_text(CODE)
+        self.db_path = str(root / "vectors.db")
+        vector_db = setup_vector_db.ScryptoVectorDB(self.db_path, embedding_provider=HashingProvider())
+        vector_db.reindex_paths([page], str(root / "specs"), str(root / "project"))
+        self.out = root / "bundle"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_out_dir_is_a_link_to_the_latest_version(self):
+        first = write_bundle(self.db_path, str(self.out), ann=False)
+        self.assertTrue(self.out.is_symlink())
+        self.assertEqual(IndexBundle(str(self.out), verify=True).count, first['count'])
+
+        write_bundle(self.db_path, str(self.out), ann=False)
+        write_bundle(self.db_path, str(self.out), ann=False)
+        versions = bundle_versions(self.out)
+        self.assertEqual(len(versions), 2)
+        self.assertEqual(Path(os.readlink(self.out)), Path(versions[-1].name))
+
+    def test_open_bundle_survives_the_next_export(self):
+        write_bundle(self.db_path, str(self.out), ann=False)
+        bundle = IndexBundle(str(self.out))
+
+        write_bundle(self.db_path, str(self.out), ann=False)
+        self.assertEqual(len(bundle.search([1.0] * 8, k=1)), 1)
+        self.assertNotEqual(bundle.path, IndexBundle(str(self.out)).path)
+
+    def test_pre_versioning_directory_is_replaced_by_a_link(self):
+        write_bundle(self.db_path, str(self.out), ann=False)
+        version = self.out.resolve()
+        self.out.unlink()
+        os.replace(version, self.out)
+
+        write_bundle(self.db_path, str(self.out), ann=False)
+        self.assertTrue(self.out.is_symlink())
+        self.assertEqual([path.name for path in bundle_versions(self.out)][0], ".bundle.v0")
+
+    def test_published_bundle_copies_to_another_host(self):
+        manifest = write_bundle(self.db_path, str(self.out), ann=False)
+        shipped = Path(self.tmp.name) / "host" / "bundle"
+        shutil.copytree(self.out, shipped, symlinks=True)
+        self.assertEqual(IndexBundle(str(shipped), verify=True).count, manifest['count'])
+
+    def test_plain_export_is_a_self_contained_directory(self):
+        manifest = write_bundle(self.db_path, str(self.out), ann=False, versioned=False)
+        self.assertFalse(self.out.is_symlink())
+        self.assertEqual(bundle_versions(self.out), [])
+
+        shipped = Path(self.tmp.name) / "host" / "bundle"
+        shutil.copytree(self.out, shipped, symlinks=True)
+        self.assertFalse(any(path.is_symlink() for path in shipped.rglob('*')))
+        self.assertEqual(IndexBundle(str(shipped), verify=True).count, manifest['count'])
+
+        with self.assertRaises(FileExistsError):
+            write_bundle(self.db_path, str(self.out), ann=False, versioned=False)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""Watch-mode catch-up detection and retries of files that failed to re-index"""
+
+import os
+import sys
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import unittest
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "embeddings"))
+
+from embedding_providers import EmbeddingProvider
+from index_watcher import ChangeBatcher, watch
+
+spec = importlib.util.spec_from_file_location("setup_vector_db", ROOT / "embeddings" / "setup-vector-db.py")
+setup_vector_db = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(setup_vector_db)
+
+CODE = "export function AllergyForm() {\n" + "  // renders the allergy form fields\n" * 6 + "}\n"
+
+class HashingProvider(EmbeddingProvider):
+    """Deterministic 8-dimensional vectors, enough to store and compare chunks"""
+
+    name = 'hashing'
+
+    @property
+    def model_id(self) -> str:
+        return 'hashing-8'
+
+    @property
+    def dimension(self) -> int:
+        return 8
+
+    def embed(self, texts):
+        return [[byte / 255 + 0.01 for byte in hashlib.sha256(text.encode('utf-8')).digest()[:8]] for text in texts]
+
+class StalePathsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.specs = root / "specs"
+        self.project = root / "project"
+        self.page = self.write(self.project / "app/patient/allergies/page.tsx", CODE)
+        self.stub = self.write(self.project / "app/patient/allergies/index.ts", "export {}\n")
+        self.spec = self.write(self.specs / "core/allergies.md", "# Allergies\n\nRecord patient allergies.\n")
+        self.vector_db = setup_vector_db.ScryptoVectorDB(str(root / "vectors.db"), embedding_provider=HashingProvider())
+        self.vector_db.reindex_paths([self.page, self.stub, self.spec], str(self.specs), str(self.project))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path: Path, content: str) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return path
+
+    def stale(self):
+        return set(self.vector_db.stale_paths(str(self.specs), str(self.project)))
+
+    def test_indexed_files_are_current(self):
+        # index.ts is too small to produce chunks but must not be reported forever
+        self.assertEqual(self.stale(), set())
+
+    def test_edit_within_the_same_second_is_stale(self):
+        mtime_ns = self.page.stat().st_mtime_ns
+        self.page.write_text(CODE.replace("allergy", "allergen"))
+        os.utime(self.page, ns=(mtime_ns + 1000, mtime_ns + 1000))
+        self.assertEqual(self.stale(), {self.page})
+
+    def test_touch_without_edit_is_current(self):
+        os.utime(self.spec, ns=(0, self.spec.stat().st_mtime_ns + 5 * 10 ** 9))
+        self.assertEqual(self.stale(), set())
+
+    def test_deleted_file_is_stale(self):
+        os.remove(self.page)
+        self.assertEqual(self.stale(), {self.page})
+
+    def test_reindexing_a_spec_keeps_one_specifications_row(self):
+        self.spec.write_text("# Allergies\n\nRecord patient allergies and reactions.\n")
+        self.vector_db.reindex_paths([self.spec], str(self.specs), str(self.project))
+        self.vector_db.reindex_paths([self.spec], str(self.specs), str(self.project))
+
+        conn = sqlite3.connect(self.vector_db.db_path)
+        rows = conn.execute("SELECT content FROM specifications WHERE file_path = ?", (str(self.spec),)).fetchall()
+        conn.close()
+        self.assertEqual(rows, [("# Allergies\n\nRecord patient allergies and reactions.\n",)])
+
+class FlakyIndex:
+    """Stands in for ScryptoVectorDB in watch(): fails a path a set number of times"""
+
+    CODE_DIRS = ['app']
+
+    def __init__(self, path: Path, failures: int):
+        self.path = path
+        self.failures = failures
+        self.calls = 0
+        self.done = threading.Event()
+
+    def stale_paths(self, specs_dir, project_dir):
+        return [self.path]
+
+    def classify_path(self, path, specs_path, project_path):
+        return 'code', 'app'
+
+    def reindex_paths(self, paths, specs_dir, project_dir):
+        self.calls += 1
+        failed = [str(self.path)] if self.calls <= self.failures else []
+        if not failed:
+            self.done.set()
+        return {'changed': 1 - len(failed), 'removed': 0, 'chunks': 0, 'failed': failed}
+
+    def log_refresh(self, stats, reindex_ms, lags_ms):
+        pass
+
+class WatchRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.project = Path(self.tmp.name)
+        (self.project / "app").mkdir()
+        self.path = self.project / "app" / "page.tsx"
+        self.path.write_text(CODE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_watch(self, index: FlakyIndex, max_retries: int, timeout: float):
+        stop = threading.Event()
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(watch(
+            index, self.tmp.name, self.tmp.name, debounce=0.01, max_delay=0.05, force_polling=True,
+            poll_interval=0.01, stop=stop, max_retries=max_retries, retry_backoff=0.02)))
+        thread.start()
+        index.done.wait(timeout)
+        stop.set()
+        thread.join()
+        return result
+
+    def test_failed_file_is_retried_until_it_succeeds(self):
+        index = FlakyIndex(self.path, failures=2)
+        totals = self.run_watch(index, max_retries=3, timeout=5)
+        self.assertEqual(index.calls, 3)
+        self.assertEqual(totals['abandoned'], 0)
+
+    def test_retries_stop_at_the_limit(self):
+        index = FlakyIndex(self.path, failures=10)
+        totals = self.run_watch(index, max_retries=2, timeout=0.5)
+        self.assertEqual(index.calls, 3)
+        self.assertEqual(totals['abandoned'], 1)
+
+class ChangeBatcherTest(unittest.TestCase):
+    def test_new_change_supersedes_deferred_retry(self):
+        batcher = ChangeBatcher(debounce=0.0)
+        path = Path("app/page.tsx")
+        batcher.defer({path: 123.0}, delay=60)
+        self.assertGreater(batcher.time_until_due(), 50)
+
+        batcher.add({path})
+        self.assertEqual(batcher.time_until_due(), 0.0)
+        self.assertEqual(batcher.take(), {path: 123.0})
+        self.assertIsNone(batcher.time_until_due())
+
+if __name__ == "__main__":
+    unittest.main()
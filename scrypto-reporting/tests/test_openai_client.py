@@ -0,0 +1,206 @@
+"""Rate limiting, retries, AIMD concurrency and the circuit breaker, on a simulated clock"""
+
+import sys
+import random
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "embeddings"))
+
+from openai_client import (CircuitBreaker, CircuitOpenError, FaultInjectingOpenAI, ResilientOpenAIClient,
+                           RetryPolicy, StubAPIError, TokenBucket)
+
+class FakeClock:
+    """Monotonic clock that only moves when something sleeps"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def embed(client: ResilientOpenAIClient, text: str = "chunk"):
+    return client.embeddings.create(model="text-embedding-3-small", input=[text])
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_waits_for_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(per_minute=60, burst_seconds=2, clock=clock, sleep=clock.sleep)
+
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual(clock.sleeps, [])
+
+        bucket.acquire()
+        self.assertEqual(clock.sleeps, [1.0])
+
+    def test_refills_with_elapsed_time_up_to_capacity(self):
+        clock = FakeClock()
+        bucket = TokenBucket(per_minute=60, burst_seconds=2, clock=clock, sleep=clock.sleep)
+        bucket.acquire(2)
+
+        clock.now += 60
+        bucket.acquire(2)
+        bucket.acquire(0.5)
+        self.assertEqual(clock.sleeps, [0.5])
+
+    def test_oversized_request_waits_for_a_full_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(per_minute=60, burst_seconds=2, clock=clock, sleep=clock.sleep)
+        bucket.acquire(1)
+
+        bucket.acquire(50)
+        self.assertEqual(clock.sleeps, [1.0])
+        self.assertEqual(bucket.tokens, 0)
+
+    def test_adjust_charges_actual_usage(self):
+        clock = FakeClock()
+        bucket = TokenBucket(per_minute=60, burst_seconds=2, clock=clock, sleep=clock.sleep)
+        bucket.acquire(1)
+        bucket.adjust(1)
+
+        bucket.acquire(1)
+        self.assertEqual(clock.sleeps, [1.0])
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_full_jitter_within_exponential_cap(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=4.0, rng=random.Random(7))
+        for attempt in range(8):
+            for _ in range(50):
+                self.assertLessEqual(policy.delay(attempt), min(4.0, 0.5 * 2 ** attempt))
+
+    def test_retry_after_is_honoured(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=4.0, rng=random.Random(7))
+        self.assertGreaterEqual(policy.delay(0, retry_after=3.0), 3.0)
+        self.assertLessEqual(policy.delay(0, retry_after=3.0), 3.5)
+        self.assertLessEqual(policy.delay(0, retry_after=60.0), 4.5)
+
+class ResilientClientTest(unittest.TestCase):
+    def make_client(self, stub, max_attempts: int = 4, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.clock = FakeClock()
+        return ResilientOpenAIClient(
+            stub, requests_per_minute=60000, tokens_per_minute=1000000,
+            retry=RetryPolicy(max_attempts=max_attempts, base_delay=0.5, max_delay=8.0, rng=random.Random(1)),
+            breaker=CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout, clock=self.clock),
+            clock=self.clock, sleep=self.clock.sleep
+        )
+
+    def test_transient_errors_are_retried_with_backoff(self):
+        client = self.make_client(FaultInjectingOpenAI())
+        responses = iter([StubAPIError(500, "boom"), StubAPIError(502, "bad gateway")])
+
+        def flaky(**kwargs):
+            error = next(responses, None)
+            if error:
+                raise error
+            return client.client.embeddings.create(**kwargs)
+
+        response = client.request(flaky, {'model': 'text-embedding-3-small', 'input': ['chunk']})
+
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(client.stats['retries'], 2)
+        self.assertEqual(client.stats['transient_errors'], 2)
+        self.assertEqual(len(self.clock.sleeps), 2)
+        self.assertLessEqual(self.clock.sleeps[1], 0.5 * 2 ** 1)
+
+    def test_fatal_errors_are_not_retried(self):
+        client = self.make_client(FaultInjectingOpenAI())
+
+        def bad_request(**kwargs):
+            raise StubAPIError(400, "invalid input")
+
+        with self.assertRaises(StubAPIError):
+            client.request(bad_request, {'input': ['chunk']})
+        self.assertEqual(client.stats['calls'], 1)
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_throttling_halves_concurrency_and_honours_retry_after(self):
+        stub = FaultInjectingOpenAI(rate_limit_rate=1.0)
+        client = self.make_client(stub, max_attempts=3)
+        self.assertEqual(client.concurrency.limit, 4)
+
+        with self.assertRaises(StubAPIError) as raised:
+            embed(client)
+
+        self.assertEqual(raised.exception.status_code, 429)
+        self.assertEqual(stub.calls, 3)
+        self.assertEqual(client.stats['throttled'], 3)
+        self.assertEqual(client.concurrency.limit, 1)
+        # Retry-After from the stub (0.01s) plus at most base_delay of jitter
+        self.assertTrue(all(0.01 <= delay <= 0.51 for delay in self.clock.sleeps))
+        # A 429 is an answer from the API, so it never opens the breaker
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_successes_grow_concurrency_additively(self):
+        client = self.make_client(FaultInjectingOpenAI())
+        for i in range(4):
+            embed(client, f"chunk {i}")
+        self.assertEqual(client.concurrency.limit, 5)
+        for i in range(5):
+            embed(client, f"more {i}")
+        self.assertEqual(client.concurrency.limit, 6)
+
+    def test_breaker_opens_fails_fast_and_recovers_through_one_probe(self):
+        stub = FaultInjectingOpenAI()
+        stub.outage = True
+        client = self.make_client(stub, max_attempts=1, failure_threshold=3, reset_timeout=30.0)
+
+        for _ in range(3):
+            with self.assertRaises(StubAPIError):
+                embed(client)
+        self.assertEqual(client.breaker.state, 'open')
+
+        # Open: fails fast without reaching the API
+        with self.assertRaises(CircuitOpenError) as raised:
+            embed(client)
+        self.assertEqual(stub.calls, 3)
+        self.assertEqual(raised.exception.retry_in, 30.0)
+        self.assertEqual(client.stats['short_circuited'], 1)
+
+        # Half-open after the cool-down: the failed probe re-opens it
+        self.clock.now += 30
+        with self.assertRaises(StubAPIError):
+            embed(client)
+        self.assertEqual(stub.calls, 4)
+        self.assertEqual(client.breaker.state, 'open')
+
+        # A successful probe closes it again
+        self.clock.now += 30
+        stub.outage = False
+        embed(client)
+        self.assertEqual(client.breaker.state, 'closed')
+        embed(client)
+        self.assertEqual(stub.calls, 6)
+
+    def test_half_open_lets_a_single_probe_through(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+        breaker.record_failure()
+
+        clock.now += 10
+        breaker.before_call()
+        self.assertEqual(breaker.state, 'half_open')
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        breaker.before_call()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_retries_stop_once_the_breaker_opens(self):
+        stub = FaultInjectingOpenAI()
+        stub.outage = True
+        client = self.make_client(stub, max_attempts=10, failure_threshold=3)
+
+        with self.assertRaises(StubAPIError):
+            embed(client)
+        self.assertEqual(stub.calls, 3)
+        self.assertEqual(client.stats['retries'], 2)
+
+if __name__ == "__main__":
+    unittest.main()
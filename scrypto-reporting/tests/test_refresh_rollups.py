@@ -0,0 +1,92 @@
+"""The trigger-maintained rollups must always agree with the views they materialize"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+SCRIPT = ROOT / "tools" / "refresh-rollups.py"
+
+spec = importlib.util.spec_from_file_location("refresh_rollups", SCRIPT)
+refresh_rollups = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(refresh_rollups)
+
+class RollupTriggerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "rollups.db")
+        self.rollups = refresh_rollups.ScryptoProgressRollups(self.db_path)
+        self.conn = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def execute(self, sql: str, params=()) -> int:
+        cursor = self.conn.execute(sql, params)
+        self.conn.commit()
+        return cursor.lastrowid
+
+    def feature(self, domain: str, item: str, status: str = 'not_started') -> int:
+        return self.execute("""
+            INSERT INTO project_features (domain, group_name, item, implementation_status) VALUES (?, 'medhist', ?, ?)
+        """, (domain, item, status))
+
+    def assert_in_step(self):
+        self.assertEqual(self.rollups.check_consistency(), [])
+
+    def test_feature_inserts_updates_and_deletes(self):
+        allergies = self.feature('patient', 'allergies', 'completed')
+        conditions = self.feature('patient', 'conditions')
+        prescriptions = self.feature('pharmacy', 'prescriptions', 'tested')
+        self.assert_in_step()
+
+        self.execute("UPDATE project_features SET implementation_status = 'production' WHERE id = ?", (conditions,))
+        self.assert_in_step()
+
+        # Moving the last feature out of a domain removes that domain's row
+        self.execute("UPDATE project_features SET domain = 'admin' WHERE id = ?", (prescriptions,))
+        self.assert_in_step()
+        self.assertEqual([row['domain'] for row in self.rollups.get_progress()], ['admin', 'patient'])
+
+        self.execute("DELETE FROM project_features WHERE id = ?", (allergies,))
+        self.assert_in_step()
+
+    def test_child_rows_count_towards_their_feature(self):
+        allergies = self.feature('patient', 'allergies')
+        conditions = self.feature('patient', 'conditions')
+
+        self.execute("INSERT INTO specifications (feature_id, spec_type, title, content, file_path) "
+                     "VALUES (?, 'core', 'Allergies', '...', 'specs/core/allergies.md')", (allergies,))
+        component = self.execute("INSERT INTO code_components (feature_id, component_type, file_path) "
+                                 "VALUES (?, 'page', 'app/patient/allergies/page.tsx')", (allergies,))
+        self.execute("INSERT INTO api_endpoints (feature_id, path, method) VALUES (?, '/patient/allergies', 'GET')",
+                     (allergies,))
+        self.execute("INSERT INTO test_coverage (feature_id, test_type, test_file) "
+                     "VALUES (?, 'unit', '__tests__/allergies.test.ts')", (allergies,))
+        self.assert_in_step()
+
+        self.execute("UPDATE code_components SET feature_id = ? WHERE id = ?", (conditions, component))
+        self.assert_in_step()
+
+        self.execute("DELETE FROM specifications")
+        self.execute("DELETE FROM api_endpoints")
+        self.assert_in_step()
+
+    def test_check_exits_non_zero_on_drift_until_repaired(self):
+        self.feature('patient', 'allergies')
+        self.execute("UPDATE feature_status_rollup SET spec_count = 7")
+
+        check = [sys.executable, str(SCRIPT), '--db', self.db_path, '--check']
+        self.assertEqual(subprocess.run(check, capture_output=True).returncode, 1)
+
+        self.assertEqual(self.rollups.refresh(), 1)
+        self.assertEqual(subprocess.run(check, capture_output=True).returncode, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Chat sessions must not share memory across user levels"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+spec = importlib.util.spec_from_file_location("scrypto_assistant", ROOT / "chatbot" / "scrypto-assistant.py")
+scrypto_assistant = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(scrypto_assistant)
+
+class SessionStoreLevelTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "sessions.db")
+        conn = sqlite3.connect(self.db_path)
+        with open(ROOT / "database" / "schema.sql", 'r') as f:
+            conn.executescript(f.read())
+        conn.execute("""
+            INSERT INTO ai_interactions (session_id, user_level, question, response)
+            VALUES ('shared-id', 'developer', 'Where is the service role key?', 'In the server env config')
+        """)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_same_id_at_another_level_starts_empty(self):
+        store = scrypto_assistant.SessionStore(self.db_path)
+
+        developer = store.get('shared-id', 'developer')
+        client = store.get('shared-id', 'client')
+
+        self.assertEqual(developer.turn_count, 1)
+        self.assertIsNot(client, developer)
+        self.assertEqual(client.turn_count, 0)
+        self.assertEqual(client.history_messages(), [])
+
+    def test_live_memory_is_not_shared(self):
+        store = scrypto_assistant.SessionStore(self.db_path)
+
+        store.get('live-id', 'developer').add_turn('How is RLS configured?', 'Policies per table')
+        self.assertEqual(store.get('live-id', 'client').turn_count, 0)
+        self.assertEqual(store.get('live-id', 'developer').turn_count, 1)
+
+class RetrievalCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.memory = scrypto_assistant.SessionMemory('cache-id', 'developer')
+        self.memory.remember_context('How does authentication work?', [{'title': 'Authentication'}])
+        self.memory.remember_context('How are payments processed?', [{'title': 'Payments'}])
+
+    def test_query_covered_by_one_retrieval_reuses_it(self):
+        self.assertEqual(self.memory.cached_context('authentication'), [{'title': 'Authentication'}])
+
+    def test_query_spanning_two_retrievals_is_a_miss(self):
+        self.assertIsNone(self.memory.cached_context('authentication payments'))
+
+    def test_empty_results_are_not_cached(self):
+        self.memory.remember_context('What about telehealth?', [])
+        self.assertIsNone(self.memory.cached_context('telehealth'))
+
+if __name__ == "__main__":
+    unittest.main()
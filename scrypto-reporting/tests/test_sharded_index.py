@@ -0,0 +1,76 @@
+"""Merging the per-shard top results must give the same ranking as one unsharded database"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "tests"))
+
+from test_index_watcher import HashingProvider, setup_vector_db
+from test_vector_search import source
+
+FILES = {
+    f"{directory}/{domain}/{name}{suffix}": f"{name}{domain.title()}"
+    for directory, suffix, names in [
+        ("app", "/page.tsx", ["allergies", "conditions", "prescriptions"]),
+        ("components", ".tsx", ["AllergyCard", "ConditionForm", "DoseTable"]),
+        ("hooks", ".ts", ["useAllergies", "useConditions", "useRefills"]),
+    ]
+    for domain in ["patient", "pharmacy"]
+    for name in names
+}
+
+QUERIES = ["patient allergy card", "pharmacy refills hook", "condition form"]
+
+class ShardedSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        specs = root / "specs"
+        project = root / "project"
+
+        paths = []
+        for relative_path, name in FILES.items():
+            path = project / relative_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(source(name))
+            paths.append(path)
+
+        self.single = setup_vector_db.ScryptoVectorDB(str(root / "single.db"), embedding_provider=HashingProvider())
+        self.single.reindex_paths(paths, str(specs), str(project))
+
+        catalog = setup_vector_db.ScryptoVectorDB(str(root / "catalog.db"), embedding_provider=HashingProvider())
+        self.sharded = setup_vector_db.ShardedVectorDB(str(root / "shards"), catalog, shard_by='hash', workers=2)
+        self.sharded.process_project(str(specs), str(project))
+
+    def tearDown(self):
+        self.sharded.close()
+        self.tmp.cleanup()
+
+    def ranking(self, results):
+        return [(result['metadata']['relative_path'], round(result['similarity'], 5)) for result in results]
+
+    def assert_same_rankings(self, filters=None, k: int = 5):
+        expected = self.single.search_many(QUERIES, k, filters)
+        merged = self.sharded.search_many(QUERIES, k, filters)
+        for single_results, sharded_results in zip(expected, merged):
+            self.assertEqual(self.ranking(sharded_results), self.ranking(single_results))
+
+    def test_rows_are_spread_over_several_shards(self):
+        self.assertGreater(len(self.sharded.shards), 1)
+
+    def test_merged_top_k_matches_the_single_database(self):
+        self.assert_same_rankings()
+        self.assert_same_rankings(k=len(FILES))
+
+    def test_filtered_top_k_matches_the_single_database(self):
+        self.assert_same_rankings({'component_type': ['page', 'hook']})
+        self.assert_same_rankings({'directory': 'components'}, k=len(FILES))
+
+    def test_filter_matching_nothing_returns_empty_pages(self):
+        self.assertEqual(self.sharded.search_many(QUERIES, 5, {'component_type': []}), [[], [], []])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Filtered and faceted search over the generated metadata columns of document_embeddings"""
+
+import sys
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "tests"))
+
+from test_index_watcher import HashingProvider, setup_vector_db
+
+FILES = {
+    "app/patient/allergies/page.tsx": "AllergiesPage",
+    "app/api/patient/allergies/route.ts": "GET",
+    "components/patient/AllergyCard.tsx": "AllergyCard",
+    "hooks/useAllergies.ts": "useAllergies",
+}
+
+def source(name: str) -> str:
+    """A distinct code file per name, long enough to be indexed as one chunk"""
+    lines = [f"  const {name.lower()}Field{i} = read{name}Value({i}, '{name}-{i}')" for i in range(4)]
+    return f"export function {name}() {{\n" + "\n".join(lines) + "\n}\n"
+
+class IndexedProjectTest(unittest.TestCase):
+    """A small indexed project: one page, route, component and hook, plus one spec"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.specs = root / "specs"
+        self.project = root / "project"
+
+        paths = []
+        for relative_path, name in FILES.items():
+            paths.append(self.write(self.project / relative_path, source(name)))
+        paths.append(self.write(self.specs / "core" / "allergies.md",
+                                "# Allergies\n\nClinicians record every patient allergy with its reaction and severity.\n"))
+
+        self.vector_db = setup_vector_db.ScryptoVectorDB(str(root / "vectors.db"), embedding_provider=HashingProvider())
+        self.vector_db.reindex_paths(paths, str(self.specs), str(self.project))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path: Path, content: str) -> Path:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return path
+
+    def matching_paths(self, filters, include_sources: bool = False):
+        where_clause, params = self.vector_db.build_filter_clause(
+            filters, include_sources=include_sources, model_id=self.vector_db.embedding_provider.model_id)
+        conn = sqlite3.connect(self.vector_db.db_path)
+        paths = {row[0] for row in conn.execute(f"SELECT relative_path FROM document_embeddings {where_clause}", params)}
+        conn.close()
+        return paths
+
+class FilterClauseTest(IndexedProjectTest):
+    def test_list_filter_is_an_in_over_the_generated_column(self):
+        self.assertEqual(self.matching_paths({'component_type': ['page', 'api_route']}),
+                         {"app/patient/allergies/page.tsx", "app/api/patient/allergies/route.ts"})
+
+    def test_scalar_and_null_filters_combine(self):
+        self.assertEqual(self.matching_paths({'source_type': 'code', 'directory': 'hooks'}), {"hooks/useAllergies.ts"})
+        self.assertEqual(self.matching_paths({'component_type': None}), {"core/allergies.md"})
+
+    def test_empty_list_matches_nothing(self):
+        self.assertEqual(self.matching_paths({'component_type': []}), set())
+
+    def test_unknown_column_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.vector_db.build_filter_clause({'content_chunk': 'x'})
+
+    def test_other_models_never_match(self):
+        where_clause, params = self.vector_db.build_filter_clause({'source_type': 'code'}, model_id='other-model')
+        conn = sqlite3.connect(self.vector_db.db_path)
+        count = conn.execute(f"SELECT COUNT(*) FROM document_embeddings {where_clause}", params).fetchone()[0]
+        conn.close()
+        self.assertEqual(count, 0)
+
+class FacetCountsTest(IndexedProjectTest):
+    def test_counts_per_component_type(self):
+        self.assertEqual(self.vector_db.facet_counts('component_type'),
+                         {'page': 1, 'api_route': 1, 'component': 1, 'hook': 1})
+
+    def test_counts_respect_filters(self):
+        self.assertEqual(self.vector_db.facet_counts('component_type', {'directory': 'app'}),
+                         {'page': 1, 'api_route': 1})
+        self.assertEqual(self.vector_db.facet_counts('spec_type'), {'core': 1})
+
+class SearchManyTest(IndexedProjectTest):
+    QUERIES = ["allergy card component", "patient allergies page", "allergy reaction severity"]
+
+    def ranking(self, results):
+        return [(result['metadata']['relative_path'], round(result['similarity'], 5)) for result in results]
+
+    def assert_matches_semantic_search(self, filters=None, k: int = 3):
+        batched = self.vector_db.search_many(self.QUERIES, k, filters)
+        self.assertEqual(len(batched), len(self.QUERIES))
+        for query, results in zip(self.QUERIES, batched):
+            self.assertEqual(self.ranking(results), self.ranking(self.vector_db.semantic_search(query, k, filters)))
+
+    def test_same_ranking_as_one_query_at_a_time(self):
+        self.assert_matches_semantic_search()
+        self.assert_matches_semantic_search(k=10)
+
+    def test_same_ranking_with_filters(self):
+        self.assert_matches_semantic_search({'component_type': ['page', 'hook']})
+        self.assert_matches_semantic_search({'source_type': 'code', 'directory': 'components'})
+        self.assert_matches_semantic_search({'component_type': None}, k=10)
+
+    def test_blocked_scoring_does_not_change_the_ranking(self):
+        expected = [self.ranking(results) for results in self.vector_db.search_many(self.QUERIES, 5)]
+        blocked = self.vector_db.search_many(self.QUERIES, 5, block_rows=2, query_block=1)
+        self.assertEqual([self.ranking(results) for results in blocked], expected)
+
+    def test_filter_matching_nothing_gives_empty_pages(self):
+        self.assertEqual(self.vector_db.search_many(self.QUERIES, 3, {'component_type': []}), [[], [], []])
+
+if __name__ == "__main__":
+    unittest.main()
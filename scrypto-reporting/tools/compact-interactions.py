@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+"""
+Scrypto Interaction Retention
+Rolls ai_interactions older than the retention window into per-day usage aggregates,
+moves their full text into compressed per-session archives and returns the freed pages
+to the OS with incremental VACUUM, so the database stops growing with chat history
+"""
+
+import os
+import json
+import zlib
+import sqlite3
+import argparse
+from typing import List, Dict, Any, Optional, Set, Tuple
+from pathlib import Path
+from datetime import date, datetime, timedelta, timezone
+
+class ScryptoInteractionRetention:
+    ARCHIVED_COLUMNS = ('id', 'session_id', 'user_level', 'question', 'response', 'context_used',
+                        'response_time_ms', 'tokens_used', 'model_used', 'created_at')
+    
+    def __init__(self, db_path: str = "scrypto-intelligence.db", retain_days: int = 30):
+        self.db_path = db_path
+        self.retain_days = retain_days
+        self.init_database()
+    
+    def init_database(self):
+        """Apply the schema, which creates the aggregate and archive tables"""
+        conn = sqlite3.connect(self.db_path)
+        
+        schema_path = Path(__file__).parent.parent / "database" / "schema.sql"
+        with open(schema_path, 'r') as f:
+            conn.executescript(f.read())
+        
+        conn.close()
+    
+    def cutoff(self, today: Optional[date] = None) -> str:
+        """First day kept in ai_interactions; created_at is UTC, so is the default today"""
+        today = today or datetime.now(timezone.utc).date()
+        return (today - timedelta(days=self.retain_days)).isoformat()
+    
+    def compact(self, cutoff: Optional[str] = None) -> Dict[str, Any]:
+        """Aggregate, archive and delete every interaction from days before the cutoff
+        
+        Each day is moved in its own transaction so an interrupted run leaves whole days
+        either compacted or untouched, and memory stays bounded by one day of history.
+        """
+        cutoff = cutoff or self.cutoff()
+        stats = {'cutoff': cutoff, 'days': 0, 'interactions': 0, 'raw_bytes': 0, 'archived_bytes': 0}
+        
+        conn = sqlite3.connect(self.db_path)
+        
+        days = [row[0] for row in conn.execute("""
+            SELECT DISTINCT DATE(created_at) FROM ai_interactions
+            WHERE created_at < ?
+            ORDER BY 1
+        """, (cutoff,))]
+        
+        for day in days:
+            with conn:
+                moved, raw_bytes, archived_bytes = self.compact_day(conn, day)
+            stats['days'] += 1
+            stats['interactions'] += moved
+            stats['raw_bytes'] += raw_bytes
+            stats['archived_bytes'] += archived_bytes
+        
+        conn.close()
+        return stats
+    
+    def compact_day(self, conn: sqlite3.Connection, day: str):
+        """Move one day of interactions; runs inside the caller's transaction"""
+        next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+        day_range = (day, next_day)
+        compacted_before = conn.execute(
+            "SELECT 1 FROM ai_interactions_archive WHERE day = ? LIMIT 1", (day,)
+        ).fetchone() is not None
+        
+        conn.execute("""
+            INSERT INTO ai_interaction_daily
+            (day, user_level, model_used, interactions, sessions, tokens_used,
+             response_time_ms_total, response_time_count, response_time_ms_max,
+             question_chars, response_chars)
+            SELECT DATE(created_at), user_level, COALESCE(model_used, ''), COUNT(*),
+                   COUNT(DISTINCT session_id), COALESCE(SUM(tokens_used), 0),
+                   COALESCE(SUM(response_time_ms), 0), COUNT(response_time_ms), MAX(response_time_ms),
+                   SUM(LENGTH(question)), SUM(LENGTH(response))
+            FROM ai_interactions
+            WHERE created_at >= ? AND created_at < ?
+            GROUP BY DATE(created_at), user_level, COALESCE(model_used, '')
+            ON CONFLICT(day, user_level, model_used) DO UPDATE SET
+                interactions = interactions + excluded.interactions,
+                tokens_used = tokens_used + excluded.tokens_used,
+                response_time_ms_total = response_time_ms_total + excluded.response_time_ms_total,
+                response_time_count = response_time_count + excluded.response_time_count,
+                response_time_ms_max = MAX(COALESCE(response_time_ms_max, 0), COALESCE(excluded.response_time_ms_max, 0)),
+                question_chars = question_chars + excluded.question_chars,
+                response_chars = response_chars + excluded.response_chars
+        """, day_range)
+        
+        sessions: Dict[str, List[Dict[str, Any]]] = {}
+        for row in conn.execute(f"""
+            SELECT {", ".join(self.ARCHIVED_COLUMNS)} FROM ai_interactions
+            WHERE created_at >= ? AND created_at < ?
+            ORDER BY session_id, id
+        """, day_range):
+            sessions.setdefault(row[1], []).append(dict(zip(self.ARCHIVED_COLUMNS, row)))
+        
+        moved = raw_total = archived_total = 0
+        for session_id, interactions in sessions.items():
+            # A day compacted before (late rows with old timestamps) gets its archive extended
+            existing = conn.execute("""
+                SELECT payload FROM ai_interactions_archive WHERE day = ? AND session_id = ?
+            """, (day, session_id)).fetchone()
+            if existing:
+                interactions = json.loads(zlib.decompress(existing[0])) + interactions
+            
+            raw = json.dumps(interactions).encode('utf-8')
+            payload = zlib.compress(raw, 9)
+            
+            conn.execute("""
+                INSERT OR REPLACE INTO ai_interactions_archive
+                (day, session_id, interaction_count, first_interaction_id, last_interaction_id, raw_bytes, payload)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (day, session_id, len(interactions), min(item['id'] for item in interactions),
+                  max(item['id'] for item in interactions), len(raw), payload))
+            
+            moved += len(sessions[session_id])
+            raw_total += len(raw)
+            archived_total += len(payload)
+        
+        if compacted_before:
+            # A late row may belong to a session already counted for the day, so the
+            # distinct count cannot be added up; recount it from the merged archives
+            self.recount_sessions(conn, day)
+        
+        conn.execute("DELETE FROM ai_interactions WHERE created_at >= ? AND created_at < ?", day_range)
+        return moved, raw_total, archived_total
+    
+    def recount_sessions(self, conn: sqlite3.Connection, day: str):
+        """Distinct sessions per user level and model of one day, from all of its archives"""
+        groups: Dict[Tuple[str, str], Set[str]] = {}
+        for (payload,) in conn.execute("SELECT payload FROM ai_interactions_archive WHERE day = ?", (day,)):
+            for item in json.loads(zlib.decompress(payload)):
+                groups.setdefault((item['user_level'], item['model_used'] or ''), set()).add(item['session_id'])
+        
+        for (user_level, model_used), sessions in groups.items():
+            conn.execute("""
+                UPDATE ai_interaction_daily SET sessions = ?
+                WHERE day = ? AND user_level = ? AND model_used = ?
+            """, (len(sessions), day, user_level, model_used))
+    
+    def vacuum(self) -> Dict[str, Any]:
+        """Return free pages to the OS
+        
+        A database created before auto_vacuum=INCREMENTAL was in the schema needs one full
+        VACUUM to switch modes; after that each run only truncates the freelist.
+        """
+        conn = sqlite3.connect(self.db_path)
+        size_before = os.path.getsize(self.db_path)
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            mode = 'full (converted to incremental)'
+        else:
+            # Each step of the pragma frees one page and execute() only steps a row-less
+            # statement once; executescript runs it to completion
+            conn.executescript("PRAGMA incremental_vacuum;")
+            mode = 'incremental'
+        
+        conn.close()
+        return {
+            'mode': mode,
+            'free_pages': free_pages,
+            'size_before': size_before,
+            'size_after': os.path.getsize(self.db_path)
+        }
+    
+    def get_daily_usage(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Most recent compacted days, totalled across user levels and models"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        
+        rows = conn.execute("""
+            SELECT day, SUM(interactions) AS interactions, SUM(sessions) AS sessions,
+                   SUM(tokens_used) AS tokens_used,
+                   ROUND(SUM(response_time_ms_total) * 1.0 / NULLIF(SUM(response_time_count), 0), 1)
+                       AS avg_response_time_ms
+            FROM ai_interaction_daily
+            GROUP BY day
+            ORDER BY day DESC
+            LIMIT ?
+        """, (days,)).fetchall()
+        
+        conn.close()
+        return [dict(row) for row in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact old Scrypto AI interactions into aggregates and archives")
+    parser.add_argument('--db', default="scrypto-intelligence.db", help="SQLite database path")
+    parser.add_argument('--retain-days', type=int, default=30, help="Days of full interactions kept live")
+    parser.add_argument('--no-vacuum', action='store_true', help="Skip returning free pages to the OS")
+    args = parser.parse_args()
+    
+    retention = ScryptoInteractionRetention(args.db, retain_days=args.retain_days)
+    
+    stats = retention.compact()
+    if stats['interactions']:
+        ratio = stats['raw_bytes'] / max(stats['archived_bytes'], 1)
+        print(f"🗜️ Compacted {stats['interactions']} interactions from {stats['days']} days before {stats['cutoff']} "
+              f"({stats['raw_bytes'] / 1024:.0f} KB -> {stats['archived_bytes'] / 1024:.0f} KB archived, {ratio:.1f}x)")
+    else:
+        print(f"✅ Nothing to compact before {stats['cutoff']}")
+    
+    if not args.no_vacuum:
+        vacuum = retention.vacuum()
+        print(f"🧹 {vacuum['mode'].capitalize()} vacuum: {vacuum['free_pages']} free pages, "
+              f"{vacuum['size_before'] / 1048576:.1f} MB -> {vacuum['size_after'] / 1048576:.1f} MB")
+    
+    for row in retention.get_daily_usage():
+        print(f"   {row['day']}: {row['interactions']} interactions, {row['sessions']} sessions, "
+              f"{row['tokens_used']} tokens, avg {row['avg_response_time_ms']} ms")
+
+if __name__ == "__main__":
+    main()
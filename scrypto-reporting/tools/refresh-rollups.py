@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+"""
+Scrypto Progress Rollups
+Verifies the trigger-maintained rollup tables against the live views, repairs them
+when they drift, and writes the daily project_metrics snapshot for trend charts
+"""
+
+import sys
+import sqlite3
+import argparse
+from typing import List, Dict, Any, Optional
+from pathlib import Path
+from datetime import date
+
+class ScryptoProgressRollups:
+    FEATURE_COUNTS = ('spec_count', 'component_count', 'api_count', 'test_count')
+    PROGRESS_COLUMNS = ('total_features', 'completed', 'tested', 'production_ready', 'completion_percentage')
+    
+    def __init__(self, db_path: str = "scrypto-intelligence.db"):
+        self.db_path = db_path
+        self.init_database()
+    
+    def init_database(self):
+        """Apply the schema, which creates the rollups and their triggers"""
+        conn = sqlite3.connect(self.db_path)
+        
+        schema_path = Path(__file__).parent.parent / "database" / "schema.sql"
+        with open(schema_path, 'r') as f:
+            conn.executescript(f.read())
+        
+        conn.close()
+    
+    def check_consistency(self) -> List[Dict[str, Any]]:
+        """Rows where a rollup disagrees with the live view it materializes"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        mismatches = []
+        
+        counts = ", ".join(self.FEATURE_COUNTS)
+        live = {row[0]: row[1:] for row in cursor.execute(f"SELECT id, {counts} FROM v_feature_status")}
+        stored = {row[0]: row[1:] for row in cursor.execute(f"SELECT feature_id, {counts} FROM feature_status_rollup")}
+        
+        for feature_id in live.keys() | stored.keys():
+            if live.get(feature_id) != stored.get(feature_id):
+                mismatches.append({'rollup': 'feature_status', 'key': feature_id,
+                                   'live': live.get(feature_id), 'stored': stored.get(feature_id)})
+        
+        columns = ", ".join(self.PROGRESS_COLUMNS)
+        live = {row[0]: row[1:] for row in cursor.execute(f"SELECT domain, {columns} FROM v_implementation_progress")}
+        stored = {row[0]: row[1:] for row in cursor.execute(f"SELECT domain, {columns} FROM implementation_progress_rollup")}
+        
+        for domain in live.keys() | stored.keys():
+            if live.get(domain) != stored.get(domain):
+                mismatches.append({'rollup': 'implementation_progress', 'key': domain,
+                                   'live': live.get(domain), 'stored': stored.get(domain)})
+        
+        conn.close()
+        return mismatches
+    
+    def rebuild(self):
+        """Recompute both rollups from the live views in one transaction"""
+        conn = sqlite3.connect(self.db_path)
+        
+        with conn:
+            conn.execute("DELETE FROM feature_status_rollup")
+            conn.execute(f"""
+                INSERT INTO feature_status_rollup (feature_id, {", ".join(self.FEATURE_COUNTS)})
+                SELECT id, {", ".join(self.FEATURE_COUNTS)} FROM v_feature_status
+            """)
+            conn.execute("DELETE FROM implementation_progress_rollup")
+            conn.execute(f"""
+                INSERT INTO implementation_progress_rollup (domain, {", ".join(self.PROGRESS_COLUMNS)})
+                SELECT domain, {", ".join(self.PROGRESS_COLUMNS)} FROM v_implementation_progress
+            """)
+        
+        conn.close()
+    
+    def refresh(self) -> int:
+        """Repair the rollups if they drifted from the views; returns the number of bad rows"""
+        mismatches = self.check_consistency()
+        
+        if mismatches:
+            self.report(mismatches)
+            self.rebuild()
+        
+        return len(mismatches)
+    
+    def report(self, mismatches: List[Dict[str, Any]], limit: int = 10):
+        for mismatch in mismatches[:limit]:
+            print(f"⚠️ {mismatch['rollup']} {mismatch['key']}: stored {mismatch['stored']} != live {mismatch['live']}")
+    
+    def get_progress(self) -> List[Dict[str, Any]]:
+        """Per-domain progress, read from the rollup"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        
+        rows = conn.execute("SELECT * FROM implementation_progress_rollup ORDER BY domain").fetchall()
+        
+        conn.close()
+        return [dict(row) for row in rows]
+    
+    def snapshot_metrics(self, metric_date: Optional[str] = None) -> Dict[str, Any]:
+        """Write (or overwrite) the project_metrics row for a day from the rollups"""
+        metric_date = metric_date or date.today().isoformat()
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        total, completed, tested, production = cursor.execute("""
+            SELECT COALESCE(SUM(total_features), 0), COALESCE(SUM(completed), 0),
+                   COALESCE(SUM(tested), 0), COALESCE(SUM(production_ready), 0)
+            FROM implementation_progress_rollup
+        """).fetchone()
+        
+        test_coverage = cursor.execute("""
+            SELECT COALESCE(ROUND(SUM(test_count > 0) * 100.0 / COUNT(*), 2), 0)
+            FROM feature_status_rollup
+        """).fetchone()[0]
+        
+        auth_coverage = cursor.execute("""
+            SELECT COALESCE(ROUND(SUM(has_auth) * 100.0 / COUNT(*), 2), 0)
+            FROM api_endpoints
+        """).fetchone()[0]
+        
+        cursor.execute("""
+            INSERT INTO project_metrics
+            (metric_date, total_features, completed_features, tested_features, production_ready,
+             test_coverage_percentage, auth_coverage_percentage)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(metric_date) DO UPDATE SET
+                total_features = excluded.total_features,
+                completed_features = excluded.completed_features,
+                tested_features = excluded.tested_features,
+                production_ready = excluded.production_ready,
+                test_coverage_percentage = excluded.test_coverage_percentage,
+                auth_coverage_percentage = excluded.auth_coverage_percentage
+        """, (metric_date, total, completed, tested, production, test_coverage, auth_coverage))
+        
+        conn.commit()
+        conn.close()
+        
+        return {
+            'metric_date': metric_date,
+            'total_features': total,
+            'completed_features': completed,
+            'tested_features': tested,
+            'production_ready': production,
+            'test_coverage_percentage': test_coverage,
+            'auth_coverage_percentage': auth_coverage
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh Scrypto progress rollups and snapshot metrics")
+    parser.add_argument('--db', default="scrypto-intelligence.db", help="SQLite database path")
+    parser.add_argument('--check', action='store_true', help="Only report drift, do not repair or snapshot")
+    args = parser.parse_args()
+    
+    rollups = ScryptoProgressRollups(args.db)
+    
+    if args.check:
+        mismatches = rollups.check_consistency()
+        rollups.report(mismatches)
+        print(f"{'❌' if mismatches else '✅'} {len(mismatches)} rollup rows out of sync with the live views")
+        # Non-zero so cron and CI notice drift
+        sys.exit(1 if mismatches else 0)
+    
+    repaired = rollups.refresh()
+    print(f"✅ Rollups consistent{f' (repaired {repaired} rows)' if repaired else ''}")
+    
+    snapshot = rollups.snapshot_metrics()
+    print(f"📈 Metrics snapshot {snapshot['metric_date']}: "
+          f"{snapshot['completed_features']}/{snapshot['total_features']} completed, "
+          f"{snapshot['test_coverage_percentage']}% features tested")
+    
+    for row in rollups.get_progress():
+        print(f"   {row['domain']}: {row['completion_percentage']}% of {row['total_features']} features")
+
+if __name__ == "__main__":
+    main()